@@ -6,6 +6,7 @@ import sys
 
 from gtamp_problem_environments.mover_env import PaPMoverEnv
 from gtamp_utils import utils
+from gtamp_utils.key_config_occupancy import KeyConfigOccupancy
 
 hostname = socket.gethostname()
 if hostname == 'dell-XPS-15-9560' or hostname == 'phaedra' or hostname == 'shakey' or hostname == 'lab':
@@ -41,7 +42,8 @@ def process_single_data(fname, problem_env, key_configs, save_file):
     place_labels = []
     place_collisions = []
 
-    collision_vector = utils.compute_occ_vec(key_configs)
+    occupancy = KeyConfigOccupancy(problem_env, key_configs)
+    collision_vector = occupancy.compute_occ_vec()
     for mp_result in mp_results:
         object_poses = mp_result['object_poses']
         assert object_poses == first_obj_poses
@@ -55,7 +57,7 @@ def process_single_data(fname, problem_env, key_configs, save_file):
             place_qgs.append(mp_result['qg'])
             place_labels.append(mp_result['label'])
             utils.two_arm_pick_object(mp_result['held_obj'], {'q_goal': mp_result['q0']})
-            place_collision = utils.compute_occ_vec(key_configs)
+            place_collision = occupancy.compute_occ_vec()
             utils.two_arm_place_object({'q_goal': mp_result['q0']})
             place_collisions.append(place_collision)
 
@@ -1,6 +1,9 @@
+import time
+
 from generator import Generator
 from gtamp_utils.utils import get_pick_domain, get_place_domain
 from feasibility_checkers.two_arm_pap_feasiblity_checker import TwoArmPaPFeasibilityChecker
+from feasibility_checkers.parallel_feasibility_checker import get_parallel_feasibility_checker
 
 
 class TwoArmPaPGenerator(Generator):
@@ -15,4 +18,70 @@ class TwoArmPaPGenerator(Generator):
         return TwoArmPaPFeasibilityChecker(self.problem_env, pick_action_mode=self.pick_action_mode,
                                            place_action_mode=self.place_action_mode)
 
+    def get_n_samples_per_batch(self, n_parameters_to_find):
+        parallel_feasibility_checker = get_parallel_feasibility_checker()
+        if parallel_feasibility_checker is None:
+            return Generator.get_n_samples_per_batch(self, n_parameters_to_find)
+        else:
+            # keeps all the workers busy; the samples left over when enough are found are kept in pending_samples
+            return max(self.n_samples_per_prefilter_batch, parallel_feasibility_checker.n_workers)
+
+    def check_feasibility_of_batch(self, sampled_op_parameters_batch):
+        parallel_feasibility_checker = get_parallel_feasibility_checker()
+        if parallel_feasibility_checker is None:
+            for result in Generator.check_feasibility_of_batch(self, sampled_op_parameters_batch):
+                yield result
+            return
+
+        # Samples are checked independently of each other in the workers, so none of them reuses a pick and the
+        # prefilter applies to all of them
+        prefilter_mask = self.prefilter_picks(sampled_op_parameters_batch)
+        samples_to_check = [p for p, may_have_feasible_pick in zip(sampled_op_parameters_batch, prefilter_mask)
+                            if may_have_feasible_pick]
+        results = parallel_feasibility_checker.check_feasibility(self.abstract_action, samples_to_check,
+                                                                 self.pick_action_mode, self.place_action_mode)
+        for may_have_feasible_pick in prefilter_mask:
+            if may_have_feasible_pick:
+                yield next(results)
+            else:
+                yield None, 'PickFailed'
+
+    def get_param_with_feasible_motion_plan(self, candidate_parameters):
+        parallel_feasibility_checker = get_parallel_feasibility_checker()
+        if parallel_feasibility_checker is None or not parallel_feasibility_checker.plan_motions_in_parallel:
+            return Generator.get_param_with_feasible_motion_plan(self, candidate_parameters)
+
+        stime = time.time()
+        obj_name = self.abstract_action.discrete_parameters['object']
+        results = parallel_feasibility_checker.plan_pick_and_place_motions(obj_name, candidate_parameters,
+                                                                           n_iterations=[20, 50, 100, 500, 1000])
+        chosen_pap_param = {'is_feasible': False}
+        for candidate_idx, result in results:
+            if result['pick_status'] == 'Cancelled':
+                continue  # keeps its tentative label
+            self.n_mp_checks += 1
+            op = candidate_parameters[candidate_idx]
+            idx = self.get_tried_sample_idx(op)
+            if result['pick_status'] != 'HasSolution':
+                print "Pick motion does not exist"
+                self.tried_sample_labels[idx] = -1
+                self.n_mp_infeasible += 1
+            elif result['place_status'] != 'HasSolution':
+                print "Place motion does not exist"
+                self.tried_sample_labels[idx] = 0
+                self.n_mp_infeasible += 1
+            else:
+                print 'Motion plan exists'
+                self.tried_sample_labels[idx] = 1
+                op['pick']['motion'] = result['pick_motion']
+                op['pick']['is_feasible'] = True
+                op['place']['motion'] = result['place_motion']
+                op['place']['is_feasible'] = True
+                chosen_pap_param = {'pick': op['pick'], 'place': op['place'], 'is_feasible': True}
+                parallel_feasibility_checker.cancel_motion_plans(results)
+                break
+        print "Motion planning time {:.5f}".format(time.time() - stime)
 
+        if not chosen_pap_param['is_feasible']:
+            print "Motion plan does not exist"
+        return chosen_pap_param
@@ -0,0 +1,179 @@
+import multiprocessing
+import random
+import numpy as np
+import openravepy
+
+from generators.feasibility_checkers.two_arm_pap_feasiblity_checker import TwoArmPaPFeasibilityChecker
+from trajectory_representation.operator import Operator
+from gtamp_utils.motion_planner import collision_fn, CollisionMemo
+from gtamp_utils import utils
+
+parallel_feasibility_checker = None
+
+
+def get_parallel_feasibility_checker():
+    return parallel_feasibility_checker
+
+
+def set_parallel_feasibility_checker(checker):
+    global parallel_feasibility_checker
+    parallel_feasibility_checker = checker
+
+
+# Each worker process owns one problem environment, a feasibility checker for each pair of action modes, and an
+# RRT motion planner. last_cancelled_request is shared by all workers and the main process.
+worker_problem_env = None
+worker_feasibility_checkers = {}
+worker_motion_planner = None
+worker_last_cancelled_request = None
+
+
+def init_worker(problem_idx, last_cancelled_request):
+    global worker_problem_env, worker_motion_planner, worker_last_cancelled_request
+    from gtamp_problem_environments.mover_env import PaPMoverEnv
+    from planners.subplanners.motion_planner import BaseMotionPlanner
+    # drop the environments inherited from the parent over fork; gtamp_utils.utils assumes a single environment
+    openravepy.RaveDestroy()
+    worker_problem_env = PaPMoverEnv(problem_idx)
+    worker_motion_planner = BaseMotionPlanner(worker_problem_env, 'rrt')
+    worker_last_cancelled_request = last_cancelled_request
+
+
+def set_worker_env_state(env_state):
+    robot = worker_problem_env.robot
+    robot.SetTransform(env_state['robot_transform'])
+    robot.SetDOFValues(env_state['robot_dof_values'])
+    for obj_name, (obj_transform, is_enabled) in env_state['objects'].items():
+        obj = worker_problem_env.env.GetKinBody(obj_name)
+        obj.SetTransform(obj_transform)
+        obj.Enable(is_enabled)
+
+
+def get_worker_feasibility_checker(pick_action_mode, place_action_mode):
+    key = (pick_action_mode, place_action_mode)
+    if key not in worker_feasibility_checkers:
+        worker_feasibility_checkers[key] = TwoArmPaPFeasibilityChecker(worker_problem_env,
+                                                                       pick_action_mode=pick_action_mode,
+                                                                       place_action_mode=place_action_mode)
+    return worker_feasibility_checkers[key]
+
+
+def check_feasibility_in_worker(task):
+    env_state, discrete_parameters, action_modes, parameters = task
+    set_worker_env_state(env_state)
+    feasibility_checker = get_worker_feasibility_checker(*action_modes)
+    feasibility_checker.feasible_pick = []
+    operator_skeleton = Operator('two_arm_pick_two_arm_place', discrete_parameters)
+    return feasibility_checker.check_feasibility(operator_skeleton, parameters)
+
+
+def is_request_cancelled(request_id):
+    return worker_last_cancelled_request.value >= request_id
+
+
+class MotionPlanCancelled(Exception):
+    pass
+
+
+def plan_motion_in_worker(goal, n_iterations, request_id):
+    # Same restarts as BaseMotionPlanner.get_motion_plan, sharing one collision memo. The collision function checks
+    # for cancellation, so that a cancelled request is abandoned in the middle of an RRT rather than at its end.
+    collision = collision_fn(worker_problem_env.env, worker_problem_env.robot)
+
+    def collision_unless_cancelled(q):
+        if is_request_cancelled(request_id):
+            raise MotionPlanCancelled
+        return collision(q)
+
+    collision_memo = CollisionMemo(collision_unless_cancelled)
+    try:
+        for n_iter in n_iterations:
+            if is_request_cancelled(request_id):
+                return None, 'Cancelled'
+            motion, status = worker_motion_planner.get_motion_plan(goal, source='sampler', n_iterations=[n_iter],
+                                                                   collision_memo=collision_memo)
+            if status == 'HasSolution':
+                return motion, status
+    except MotionPlanCancelled:
+        return None, 'Cancelled'
+    return None, 'NoSolution'
+
+
+def plan_pick_and_place_motions_in_worker(task):
+    env_state, obj_name, candidate_idx, op, n_iterations, seed, request_id = task
+    result = {'pick_motion': None, 'pick_status': 'Cancelled', 'place_motion': None, 'place_status': None}
+    if is_request_cancelled(request_id):
+        return candidate_idx, result
+
+    set_worker_env_state(env_state)
+    np.random.seed(seed)
+    random.seed(seed)
+    result['pick_motion'], result['pick_status'] = plan_motion_in_worker(op['pick']['q_goal'], n_iterations,
+                                                                         request_id)
+    if result['pick_status'] != 'HasSolution':
+        return candidate_idx, result
+
+    original_config = utils.get_body_xytheta(worker_problem_env.robot).squeeze()
+    utils.two_arm_pick_object(obj_name, op['pick'])
+    result['place_motion'], result['place_status'] = plan_motion_in_worker(op['place']['q_goal'], n_iterations,
+                                                                           request_id)
+    utils.two_arm_place_object(op['pick'])
+    utils.set_robot_config(original_config)
+    return candidate_idx, result
+
+
+class ParallelPaPFeasibilityChecker:
+    """
+    Checks the pick-and-place feasibility of a batch of samples in a pool of worker processes, each with its own copy
+    of the problem environment. The robot and object poses of the main environment are copied into the worker before
+    every check. Every sample is checked with its own pick, as in TwoArmPaPFeasibilityCheckerWithoutSavingFeasiblePick,
+    so that the result of a sample does not depend on which worker checked the samples before it.
+
+    With plan_motions_in_parallel, the workers also run the pick and place RRTs of the feasible candidates concurrently.
+    A request for motion plans is cancelled once one of its candidates has both plans; the workers abandon its
+    remaining candidates at their next collision check, and their results are drained before the request returns, so
+    that none of its tasks is still running when the next batch is submitted.
+    """
+
+    def __init__(self, problem_env, n_workers=multiprocessing.cpu_count(), plan_motions_in_parallel=False):
+        self.problem_env = problem_env
+        self.n_workers = n_workers
+        self.plan_motions_in_parallel = plan_motions_in_parallel
+        self.last_motion_plan_request = 0
+        self.last_cancelled_request = multiprocessing.Value('i', 0)
+        self.pool = multiprocessing.Pool(n_workers, initializer=init_worker,
+                                         initargs=(problem_env.problem_idx, self.last_cancelled_request))
+
+    def get_env_state(self):
+        robot = self.problem_env.robot
+        return {'robot_transform': robot.GetTransform(),
+                'robot_dof_values': robot.GetDOFValues(),
+                'objects': {obj.GetName(): (obj.GetTransform(), obj.IsEnabled()) for obj in self.problem_env.objects}}
+
+    def check_feasibility(self, operator_skeleton, parameters_batch, pick_action_mode, place_action_mode):
+        # Returns an iterator over (op_parameters, status) of the samples, in the order of parameters_batch.
+        # Results are yielded as soon as they and all the ones before them are available.
+        env_state = self.get_env_state()
+        tasks = [(env_state, operator_skeleton.discrete_parameters, (pick_action_mode, place_action_mode), parameters)
+                 for parameters in parameters_batch]
+        return self.pool.imap(check_feasibility_in_worker, tasks)
+
+    def plan_pick_and_place_motions(self, obj_name, candidate_parameters, n_iterations):
+        # Returns an iterator over (candidate index, result) in the order in which the candidates finish.
+        # Candidates are started in the order of candidate_parameters, n_workers at a time.
+        self.last_motion_plan_request += 1
+        env_state = self.get_env_state()
+        seeds = np.random.randint(np.iinfo(np.int32).max, size=len(candidate_parameters))
+        tasks = [(env_state, obj_name, candidate_idx, op, n_iterations, seed, self.last_motion_plan_request)
+                 for candidate_idx, (op, seed) in enumerate(zip(candidate_parameters, seeds))]
+        return self.pool.imap_unordered(plan_pick_and_place_motions_in_worker, tasks)
+
+    def cancel_motion_plans(self, results):
+        # results is the iterator returned by plan_pick_and_place_motions
+        self.last_cancelled_request.value = self.last_motion_plan_request
+        for _ in results:
+            pass
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -10,12 +10,13 @@ class PickFeasibilityChecker(object):
         self.objects_to_check_collision = []
         self.action_mode = action_mode
 
-    def check_feasibility(self, operator_skeleton, pick_parameters, swept_volume_to_avoid=None):
-        # This function checks if the base pose is not in collision and if there is a feasible pick
+    def get_target_object(self, operator_skeleton):
         obj = operator_skeleton.discrete_parameters['object']
         if type(obj) == str or type(obj) == unicode:
             obj = self.problem_env.env.GetKinBody(obj)
+        return obj
 
+    def get_grasp_params_and_base_pose(self, obj, pick_parameters):
         if self.action_mode == 'ir_parameters':
             grasp_params, pick_base_pose = get_pick_base_pose_and_grasp_from_pick_parameters(obj, pick_parameters)
         elif self.action_mode == 'robot_base_pose':
@@ -23,6 +24,12 @@ class PickFeasibilityChecker(object):
             pick_base_pose = pick_parameters[3:]
         else:
             raise NotImplementedError
+        return grasp_params, pick_base_pose
+
+    def check_feasibility(self, operator_skeleton, pick_parameters, swept_volume_to_avoid=None):
+        # This function checks if the base pose is not in collision and if there is a feasible pick
+        obj = self.get_target_object(operator_skeleton)
+        grasp_params, pick_base_pose = self.get_grasp_params_and_base_pose(obj, pick_parameters)
         g_config = self.compute_feasible_grasp_config(obj, pick_base_pose, grasp_params)
 
         if g_config is not None:
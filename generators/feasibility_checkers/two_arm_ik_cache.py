@@ -0,0 +1,94 @@
+import os
+import fcntl
+import pickle
+import collections
+import numpy as np
+
+two_arm_ik_cache = None
+
+
+def get_two_arm_ik_cache():
+    return two_arm_ik_cache
+
+
+def set_two_arm_ik_cache(cache):
+    global two_arm_ik_cache
+    two_arm_ik_cache = cache
+
+
+class TwoArmIKCache:
+    """
+    Memory of FindIKSolution results for the two-arm grasps, including the failures. An IK query is determined by the
+    target tool transform relative to the robot base, which is what the relative object-robot pose, the object shape
+    and the grasp parameters produce, and by the joints that are not solved for. The relative transform is quantized
+    into the key, so the same query made from different states, nodes or problem instances is answered from memory.
+    The environment collision checks of solveTwoArmIKs are not cached; they are always run on the returned config.
+
+    At most max_entries solutions are kept, evicting the least recently used ones. Runs that share cache_file merge
+    their solutions into it when they save.
+    """
+
+    def __init__(self, cache_file='./two_arm_ikcache.pkl', xyz_resolution=1e-3, rot_resolution=1e-3,
+                 max_entries=200000):
+        self.cache_file = cache_file
+        self.xyz_resolution = xyz_resolution
+        self.rot_resolution = rot_resolution
+        self.max_entries = max_entries
+        self.n_hits = 0
+        self.n_misses = 0
+        self.iksolutions = collections.OrderedDict()  # key -> solution, least recently used first
+        if cache_file is not None and os.path.isfile(cache_file):
+            self.iksolutions.update(self.load())
+            self.evict()
+
+    def make_key(self, manip, target_transform):
+        robot = manip.GetRobot()
+        target_wrt_base = np.dot(np.linalg.inv(robot.GetTransform()), target_transform)
+        xyz = np.round(target_wrt_base[0:3, 3] / self.xyz_resolution).astype(int)
+        rot = np.round(target_wrt_base[0:3, 0:3] / self.rot_resolution).astype(int)
+        other_dof_values = np.delete(robot.GetDOFValues(), manip.GetArmIndices()).round(6)
+        return manip.GetName(), tuple(xyz), tuple(rot.ravel()), tuple(other_dof_values)
+
+    def find_ik_solution(self, manip, target_transform):
+        key = self.make_key(manip, target_transform)
+        if key in self.iksolutions:
+            self.n_hits += 1
+            g_config = self.iksolutions.pop(key)
+            self.iksolutions[key] = g_config
+            return g_config
+        self.n_misses += 1
+        g_config = manip.FindIKSolution(target_transform, 0)
+        self.iksolutions[key] = g_config
+        self.evict()
+        return g_config
+
+    def evict(self):
+        while len(self.iksolutions) > self.max_entries:
+            self.iksolutions.popitem(last=False)
+
+    def load(self):
+        return pickle.load(open(self.cache_file, 'rb'))
+
+    def print_stats(self):
+        n_queries = self.n_hits + self.n_misses
+        print "Two-arm IK cache hits %d / %d, %d entries" % (self.n_hits, n_queries, len(self.iksolutions))
+
+    def save(self):
+        # The solutions other runs saved since this one loaded the file are merged in under a lock, so concurrent runs
+        # do not drop each other's entries. The file is written to a temporary file first, so that runs loading it
+        # concurrently never see a partial file.
+        with open(self.cache_file + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.isfile(self.cache_file):
+                    saved = self.load()
+                    merged = collections.OrderedDict((key, value) for key, value in saved.items()
+                                                     if key not in self.iksolutions)
+                    merged.update(self.iksolutions)
+                    self.iksolutions = merged
+                    self.evict()
+                tmp_file = self.cache_file + '.tmp%d' % os.getpid()
+                pickle.dump(self.iksolutions, open(tmp_file, 'wb'))
+                os.rename(tmp_file, self.cache_file)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -36,6 +36,11 @@ class TwoArmPaPFeasibilityChecker:
         params, status = self.pick_feasibility_checker.check_feasibility(pick_op, pick_parameters)
         return params, status
 
+    def prefilter_picks(self, operator_skeleton, parameters_batch):
+        # does not account for self.feasible_pick; a pick that is already known to be feasible is not re-checked
+        pick_op = Operator('two_arm_pick', operator_skeleton.discrete_parameters)
+        return self.pick_feasibility_checker.prefilter(pick_op, [parameters[:6] for parameters in parameters_batch])
+
     def check_feasibility(self, operator_skeleton, parameters, swept_volume_to_avoid=None):
         # todo make this parameter mode explicit in the constructor
         pick_parameters = parameters[:6]
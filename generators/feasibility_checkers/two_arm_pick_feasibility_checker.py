@@ -1,13 +1,27 @@
+import numpy as np
+
 from mover_library.utils import set_robot_config,\
     two_arm_pick_object, two_arm_place_object,get_robot_xytheta
-from mover_library.operator_utils.grasp_utils import solveTwoArmIKs, compute_two_arm_grasp
+from mover_library.operator_utils.grasp_utils import solveTwoArmIKs, compute_two_arm_grasp, \
+    filter_two_arm_grasps_batch
 from generators.feasibility_checkers.pick_feasibility_checker import PickFeasibilityChecker
+from generators.feasibility_checkers.two_arm_ik_cache import get_two_arm_ik_cache
 
 
 class TwoArmPickFeasibilityChecker(PickFeasibilityChecker):
     def __init__(self, problem_env, action_mode):
         PickFeasibilityChecker.__init__(self, problem_env, action_mode)
 
+    def prefilter(self, operator_skeleton, pick_parameters_batch):
+        # False for the pick samples that cannot have a two-arm IK solution, screened all at once without the IK solver
+        obj = self.get_target_object(operator_skeleton)
+        grasp_params_and_base_poses = [self.get_grasp_params_and_base_pose(obj, pick_parameters)
+                                       for pick_parameters in pick_parameters_batch]
+        grasp_params = [grasp_params for grasp_params, _ in grasp_params_and_base_poses]
+        pick_base_poses = [pick_base_pose for _, pick_base_pose in grasp_params_and_base_poses]
+        passing_grasps = filter_two_arm_grasps_batch(grasp_params, pick_base_poses, obj, self.robot)
+        return np.any(passing_grasps, axis=-1)
+
     def compute_grasp_config(self, obj, pick_base_pose, grasp_params):
         orig_config = get_robot_xytheta(self.robot)
         set_robot_config(pick_base_pose, self.robot)
@@ -27,7 +41,7 @@ class TwoArmPickFeasibilityChecker(PickFeasibilityChecker):
                                        obj=obj,
                                        robot=self.robot)
 
-        g_config = solveTwoArmIKs(self.env, self.robot, obj, grasps)
+        g_config = solveTwoArmIKs(self.env, self.robot, obj, grasps, ik_cache=get_two_arm_ik_cache())
         for enabled, o in zip(were_objects_enabled, self.problem_env.objects):
             if enabled:
                 o.Enable(True)
@@ -30,6 +30,8 @@ class Generator:
         self.n_mp_checks = 0
         self.n_mp_infeasible = 0
         self.n_ik_infeasible = 0
+        self.n_samples_per_prefilter_batch = 10
+        self.pending_samples = []  # samples drawn for a batch but not checked yet, which the next batch checks first
 
     def get_feasibility_checker(self):
         raise NotImplementedError
@@ -50,35 +52,70 @@ class Generator:
             chosen_op_param = self.get_param_with_feasible_motion_plan(feasible_op_parameters)
         return chosen_op_param
 
+    def prefilter_picks(self, sampled_op_parameters_batch):
+        if hasattr(self.feasibility_checker, 'prefilter_picks'):
+            return self.feasibility_checker.prefilter_picks(self.abstract_action, sampled_op_parameters_batch)
+        else:
+            return [True] * len(sampled_op_parameters_batch)
+
+    def check_feasibility_of_batch(self, sampled_op_parameters_batch):
+        # yields (op_parameters, status) of the samples in order; a sample is checked only when its result is asked for
+        prefilter_mask = self.prefilter_picks(sampled_op_parameters_batch)
+        for sampled_op_parameters, may_have_feasible_pick in zip(sampled_op_parameters_batch, prefilter_mask):
+            # the prefilter only screens picks; it does not apply when the pick is reused from an earlier sample
+            if not may_have_feasible_pick and len(self.feasibility_checker.feasible_pick) == 0:
+                yield None, 'PickFailed'
+            else:
+                yield self.feasibility_checker.check_feasibility(self.abstract_action, sampled_op_parameters)
+
+    def get_n_samples_per_batch(self, n_parameters_to_find):
+        # Each sample gives at most one feasible parameter, so a batch of at most n_parameters_to_find samples is
+        # used up before enough are found. No sample is then drawn without being tried, and the sampler is called as
+        # many times as when the samples were drawn one at a time.
+        return min(self.n_samples_per_prefilter_batch, n_parameters_to_find)
+
+    def get_batch_of_samples(self, n_samples):
+        sampled_op_parameters_batch = self.pending_samples[:n_samples]
+        self.pending_samples = self.pending_samples[n_samples:]
+        while len(sampled_op_parameters_batch) < n_samples:
+            sampled_op_parameters_batch.append(self.sampler.sample())
+        return sampled_op_parameters_batch
+
     def sample_feasible_op_parameters(self):
         assert self.n_iter_limit > 0
         feasible_op_parameters = []
         feasibility_check_time = 0
         stime = time.time()
-        while True:
-            self.n_ik_checks += 1
-            sampled_op_parameters = self.sampler.sample()
-
-            stime2 = time.time()
-            op_parameters, status = self.feasibility_checker.check_feasibility(self.abstract_action,
-                                                                               sampled_op_parameters)
-            feasibility_check_time += time.time() - stime2
-
-            if status == 'HasSolution':
-                self.tried_samples.append(np.hstack([op_parameters['pick']['action_parameters'],
-                                                     op_parameters['place']['action_parameters']]))
-                self.tried_sample_labels.append(-1)  # tentative label
-                feasible_op_parameters.append(op_parameters)
-
-                if len(feasible_op_parameters) >= self.n_parameters_to_try_motion_planning:
-                    break
-            else:
-                self.tried_samples.append(sampled_op_parameters)
-                # Why did it fail? Is it because of pick or place?
-                if status == 'PickFailed':
-                    self.tried_sample_labels.append(-3)
-                elif status == 'PlaceFailed':
-                    self.tried_sample_labels.append(-2)
+        found_enough_feasible_parameters = False
+        while not found_enough_feasible_parameters:
+            n_parameters_to_find = self.n_parameters_to_try_motion_planning - len(feasible_op_parameters)
+            sampled_op_parameters_batch = self.get_batch_of_samples(self.get_n_samples_per_batch(n_parameters_to_find))
+            feasibility_check_results = self.check_feasibility_of_batch(sampled_op_parameters_batch)
+
+            for sample_idx, sampled_op_parameters in enumerate(sampled_op_parameters_batch):
+                self.n_ik_checks += 1
+                stime2 = time.time()
+                op_parameters, status = next(feasibility_check_results)
+                feasibility_check_time += time.time() - stime2
+
+                if status == 'HasSolution':
+                    self.tried_samples.append(np.hstack([op_parameters['pick']['action_parameters'],
+                                                         op_parameters['place']['action_parameters']]))
+                    self.tried_sample_labels.append(-1)  # tentative label
+                    feasible_op_parameters.append(op_parameters)
+
+                    if len(feasible_op_parameters) >= self.n_parameters_to_try_motion_planning:
+                        found_enough_feasible_parameters = True
+                        # the rest of the batch is tried first the next time, so that no sample is lost
+                        self.pending_samples = sampled_op_parameters_batch[sample_idx + 1:] + self.pending_samples
+                        break
+                else:
+                    self.tried_samples.append(sampled_op_parameters)
+                    # Why did it fail? Is it because of pick or place?
+                    if status == 'PickFailed':
+                        self.tried_sample_labels.append(-3)
+                    elif status == 'PlaceFailed':
+                        self.tried_sample_labels.append(-2)
         smpling_time = time.time() - stime
         print "IK time {:.5f}".format(smpling_time)
         if len(feasible_op_parameters) == 0:
@@ -101,6 +138,10 @@ class Generator:
 
         return chosen_op_param
 
+    def get_tried_sample_idx(self, op):
+        param = np.hstack([op['pick']['action_parameters'], op['place']['action_parameters']])
+        return np.where([np.all(np.isclose(param, p)) for p in self.tried_samples])[0][0]
+
     def get_param_with_feasible_motion_plan(self, candidate_parameters):
         n_feasible = len(candidate_parameters)
         n_mp_tried = 0
@@ -108,8 +149,7 @@ class Generator:
         for op in candidate_parameters:
             stime = time.time()
             self.n_mp_checks += 1
-            param = np.hstack([op['pick']['action_parameters'], op['place']['action_parameters']])
-            idx = np.where([np.all(np.isclose(param, p)) for p in self.tried_samples])[0][0]
+            idx = self.get_tried_sample_idx(op)
 
             # todo why is there a mismatch betwen pick and place samples?
             print "n_mp_tried / n_feasible_params = %d / %d" % (n_mp_tried, n_feasible)
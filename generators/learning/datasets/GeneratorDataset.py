@@ -3,6 +3,7 @@ from torch.utils.data import Dataset
 import pickle
 import numpy as np
 import torch
+from gtamp_utils.prm_graph import get_prm_graph
 from generators.learning.data_load_utils import get_data
 from generators.learning.utils.data_processing_utils import action_data_mode
 
@@ -56,17 +57,10 @@ class StandardDataset(GeneratorDataset):
 class GNNDataset(GeneratorDataset):
     def __init__(self, action_type, desired_region, use_filter):
         super(GNNDataset, self).__init__(action_type, desired_region, use_filter)
-        self.prm_vertices, self.prm_edges = pickle.load(open('prm.pkl', 'r'))
+        prm_graph = get_prm_graph()
+        self.prm_vertices = prm_graph.vertices
         self.gnn_vertices = self.prm_vertices
-
-        edges = [[], []]
-        for src_idx, _ in enumerate(self.prm_vertices):
-            neighbors = list(self.prm_edges[src_idx])
-            n_edges = len(neighbors)
-            edges[0] += [src_idx] * n_edges
-            edges[1] += neighbors
-            # How to make sure it is bidrectional?
-        self.edges = np.array(edges)
+        self.edges = prm_graph.get_edge_index()
 
     def __getitem__(self, idx):
         if type(idx) is int:
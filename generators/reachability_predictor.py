@@ -1,4 +1,6 @@
 from gtamp_utils import utils
+from gtamp_utils.key_config_occupancy import get_key_config_occupancy
+from gtamp_utils.model_server import get_model_class_name
 import numpy as np
 import torch
 
@@ -28,7 +30,7 @@ class ReachabilityPredictor:
 
     def make_vertices(self, qg, key_configs, collisions):
         q0 = utils.get_robot_xytheta().squeeze()
-        if 'Relative' in self.pick_net.__class__.__name__:
+        if 'Relative' in get_model_class_name(self.pick_net):
             rel_qg = compute_relative_config(q0[None, :], qg[None, :])
             rel_qk = compute_relative_config(q0[None, :], key_configs)
             repeat_qg = np.repeat(np.array(rel_qg), 618, axis=0)
@@ -55,7 +57,7 @@ class ReachabilityPredictor:
             orig_config = utils.get_robot_xytheta()
             target_obj = abstract_action.discrete_parameters['object']
             utils.two_arm_pick_object(target_obj, {'q_goal': pick_qg})
-            collisions = utils.compute_occ_vec(key_configs)
+            collisions = get_key_config_occupancy(abstract_state.problem_env, key_configs).compute_occ_vec()
             collisions = utils.convert_binary_vec_to_one_hot(collisions)
             utils.two_arm_place_object({'q_goal': pick_qg})
             utils.set_robot_config(orig_config)
@@ -3,6 +3,7 @@ import time
 
 from gtamp_utils.utils import get_pick_domain, get_place_domain
 from gtamp_utils import utils
+from gtamp_utils.key_config_occupancy import get_key_config_occupancy
 from trajectory_representation.concrete_node_state import ConcreteNodeState
 from generators.learning.utils import data_processing_utils
 
@@ -43,8 +44,10 @@ class LearnedSampler(Sampler):
 
         goal_entities = self.abstract_state.goal_entities
         stime = time.time()
+        occupancy = get_key_config_occupancy(abstract_state.problem_env, self.key_configs)
+        collision_vector = occupancy.compute_occ_vec(getattr(abstract_state, 'current_collides', None))
         self.smpler_state = ConcreteNodeState(abstract_state.problem_env, self.obj, self.region, goal_entities,
-                                              key_configs=self.key_configs)
+                                              key_configs=self.key_configs, collision_vector=collision_vector)
         print "Concre node creation time", time.time() - stime
 
     def sample_new_points(self, n_smpls):
@@ -6,6 +6,7 @@ import random
 from openravepy import DOFAffine, Environment
 from gtamp_utils.utils import grab_obj, release_obj, set_robot_config, check_collision_except, set_active_config
 from gtamp_utils import utils
+from gtamp_utils.swept_footprint import BaseSweptFootprint
 
 
 class ProblemEnvironment:
@@ -170,7 +171,7 @@ class ProblemEnvironment:
     def is_region_contains_all_objects(self, region, objects):
         return np.all([region.contains(obj.ComputeAABB()) for obj in objects])
 
-    def get_objs_in_collision(self, path, region_name):
+    def get_objs_in_collision(self, path, region_name, objs=None):
         if path is None:
             return []
         if len(path) == 0:
@@ -184,14 +185,30 @@ class ProblemEnvironment:
             self.robot.SetActiveDOFs(manip.GetArmIndices(), DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis,
                                      [0, 0, 1])
         assert len(path[0]) == self.robot.GetActiveDOF(), 'Robot active dof should match the path'
-        objs = self.get_objs_in_region(region_name)
+        if objs is None:
+            objs = self.get_objs_in_region(region_name)
+
+        # objects are only checked at the configs where they overlap the footprint of the robot; the held objects
+        # move with the robot, so they are checked everywhere
+        if len(path[0]) == 3:
+            footprint = BaseSweptFootprint(self.robot, path)
+            held = self.robot.GetGrabbed()
+            may_collide = {obj: np.ones((len(path),), dtype=bool) if obj in held
+                           else footprint.get_configs_overlapping(obj) for obj in objs}
+            objs = [obj for obj in objs if np.any(may_collide[obj])]
+        else:
+            may_collide = {obj: np.ones((len(path),), dtype=bool) for obj in objs}
+
         in_collision = []
         with self.robot:
-            for conf in path:
+            for idx, conf in enumerate(path):
+                objs_to_check = [obj for obj in objs if may_collide[obj][idx] and obj not in in_collision]
+                if len(objs_to_check) == 0:
+                    continue
                 set_active_config(conf, self.robot)
                 if self.env.CheckCollision(self.robot):
-                    for obj in objs:
-                        if self.env.CheckCollision(self.robot, obj) and obj not in in_collision:
+                    for obj in objs_to_check:
+                        if self.env.CheckCollision(self.robot, obj):
                             in_collision.append(obj)
         return in_collision
 
@@ -0,0 +1,141 @@
+import hashlib
+import sqlite3
+import time
+import numpy as np
+
+collision_cache = None
+
+
+def get_collision_cache():
+    return collision_cache
+
+
+def set_collision_cache(cache):
+    global collision_cache
+    collision_cache = cache
+
+
+def compute_file_hash(fname):
+    md5 = hashlib.md5()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def compute_body_geometry_hash(body):
+    # hash of the body's shape, independent of where it is placed
+    md5 = hashlib.md5()
+    body_transform_inv = np.linalg.inv(body.GetTransform())
+    for link in body.GetLinks():
+        link_transform = np.dot(body_transform_inv, link.GetTransform())
+        md5.update(str(link_transform.round(6).tolist()))
+        for geom in link.GetGeometries():
+            md5.update(str(geom.GetType()))
+            md5.update(str(np.asarray(geom.GetBoxExtents()).round(6).tolist()))
+            md5.update(str(round(geom.GetCylinderRadius(), 6)))
+            md5.update(str(round(geom.GetCylinderHeight(), 6)))
+            md5.update(str(np.asarray(geom.GetTransform()).round(6).tolist()))
+    return md5.hexdigest()
+
+
+def compute_holding_state_hash(robot):
+    # robot joint values and whatever it holds, expressed relative to the robot
+    md5 = hashlib.md5()
+    md5.update(str(robot.GetDOFValues().round(6).tolist()))
+    robot_transform_inv = np.linalg.inv(robot.GetTransform())
+    for held in robot.GetGrabbed():
+        md5.update(compute_body_geometry_hash(held))
+        md5.update(str(np.dot(robot_transform_inv, held.GetTransform()).round(6).tolist()))
+    return md5.hexdigest()
+
+
+class PersistentCollisionCache:
+    """
+    On-disk map from (object geometry, object pose, PRM, holding state) to the packed bitset of PRM vertices in
+    collision with the object. Backed by sqlite in WAL mode, so that every planner process on a machine can read and
+    append to the same file concurrently; reads go through sqlite's memory-mapped I/O. The number of stored entries is
+    bounded by evicting the least recently used ones. So that reads do not write, the keys read are kept in memory and
+    their last_used times written in one transaction every eviction_period reads, before an eviction, and on close.
+    """
+
+    def __init__(self, db_path='./collision_cache.db', prm_file='./prm.pkl', max_entries=200000,
+                 pose_decimals=6, eviction_period=1000):
+        self.db_path = db_path
+        self.prm_hash = compute_file_hash(prm_file)
+        self.max_entries = max_entries
+        self.pose_decimals = pose_decimals
+        self.eviction_period = eviction_period
+        self.n_puts_since_eviction = 0
+        self.n_gets_since_flush = 0
+        self.last_used = {}  # key -> time it was last read, not yet written
+        self.geometry_hashes = {}
+
+        self.n_hits = 0
+        self.n_misses = 0
+
+        self.connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA mmap_size=268435456')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS collisions '
+                                '(key TEXT PRIMARY KEY, bitset BLOB, last_used REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS collisions_last_used ON collisions (last_used)')
+
+    def get_geometry_hash(self, body):
+        name = body.GetName()
+        if name not in self.geometry_hashes:
+            self.geometry_hashes[name] = compute_body_geometry_hash(body)
+        return self.geometry_hashes[name]
+
+    def make_key(self, obj, obj_pose, holding_state_hash):
+        rounded_pose = np.asarray(obj_pose).squeeze().round(self.pose_decimals).tolist()
+        key = '%s|%s|%s|%s' % (self.get_geometry_hash(obj), rounded_pose, self.prm_hash, holding_state_hash)
+        return hashlib.sha1(key).hexdigest()
+
+    def get(self, key):
+        row = self.connection.execute('SELECT bitset FROM collisions WHERE key=?', (key,)).fetchone()
+        self.n_gets_since_flush += 1
+        if self.n_gets_since_flush >= self.eviction_period:
+            self.flush_last_used()
+        if row is None:
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        self.last_used[key] = time.time()
+        return np.frombuffer(bytes(row[0]), dtype=np.uint8)
+
+    def put(self, key, bitset):
+        self.connection.execute('INSERT OR REPLACE INTO collisions (key, bitset, last_used) VALUES (?, ?, ?)',
+                                (key, sqlite3.Binary(np.asarray(bitset, dtype=np.uint8).tostring()), time.time()))
+        self.last_used.pop(key, None)
+        self.n_puts_since_eviction += 1
+        if self.n_puts_since_eviction >= self.eviction_period:
+            self.evict()
+
+    def flush_last_used(self):
+        self.n_gets_since_flush = 0
+        if len(self.last_used) == 0:
+            return
+        self.connection.execute('BEGIN')
+        try:
+            self.connection.executemany('UPDATE collisions SET last_used=? WHERE key=?',
+                                        [(last_used, key) for key, last_used in self.last_used.iteritems()])
+        except sqlite3.Error:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        self.last_used = {}
+
+    def evict(self):
+        self.n_puts_since_eviction = 0
+        self.flush_last_used()
+        n_entries = self.connection.execute('SELECT COUNT(*) FROM collisions').fetchone()[0]
+        n_to_evict = n_entries - self.max_entries
+        if n_to_evict > 0:
+            self.connection.execute('DELETE FROM collisions WHERE key IN '
+                                    '(SELECT key FROM collisions ORDER BY last_used ASC LIMIT ?)', (n_to_evict,))
+
+    def close(self):
+        self.flush_last_used()
+        self.connection.close()
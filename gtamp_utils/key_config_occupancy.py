@@ -0,0 +1,113 @@
+import numpy as np
+
+from gtamp_utils.utils import set_robot_config
+from gtamp_utils.swept_footprint import BaseSweptFootprint
+from gtamp_utils.prm_collision_map import PRMCollisionMap
+from gtamp_utils.collision_cache import get_collision_cache, compute_holding_state_hash
+
+
+def get_key_config_occupancy(problem_env, key_configs):
+    # one occupancy per problem environment and set of key configs, so that the static occupancies are shared
+    occupancy = getattr(problem_env, 'key_config_occupancy', None)
+    if occupancy is None or occupancy.key_configs is not key_configs:
+        occupancy = KeyConfigOccupancy(problem_env, key_configs)
+        problem_env.key_config_occupancy = occupancy
+    return occupancy
+
+
+class KeyConfigOccupancy:
+    """
+    Computes the same vector as utils.compute_occ_vec, whether the robot in its current arm configuration is in collision
+    at each key config, without checking every key config.
+
+    When the robot is not holding anything, the vector is the union of the per-object collision sets of the movable
+    objects (the states' current_collides, or PRMCollisionMap otherwise) and the occupancy due to the other bodies of
+    the environment. The latter does not change during planning, so it is computed once per arm configuration.
+
+    When the robot is holding an object, the key configs at which the footprint of the robot and the held object does
+    not overlap any other body are free, and only the rest are checked.
+    """
+
+    def __init__(self, problem_env, key_configs):
+        self.problem_env = problem_env
+        self.key_configs = key_configs
+        self.static_occs = {}  # holding state hash -> occupancy due to the non-movable bodies
+
+        self.n_checks = 0
+        self.n_saved_checks = 0
+
+    def check_key_configs(self, key_config_idxs):
+        robot = self.problem_env.robot
+        in_collision = np.zeros((len(self.key_configs),), dtype=bool)
+        with robot:
+            for idx in key_config_idxs:
+                set_robot_config(self.key_configs[idx], robot)
+                in_collision[idx] = self.problem_env.env.CheckCollision(robot)
+        self.n_checks += len(key_config_idxs)
+        self.n_saved_checks += len(self.key_configs) - len(key_config_idxs)
+        return in_collision
+
+    def get_key_configs_near(self, bodies):
+        # indices of the key configs at which the robot may touch one of the enabled bodies
+        robot = self.problem_env.robot
+        footprint = BaseSweptFootprint(robot, self.key_configs)
+        robot_aabbs = [body.ComputeAABB() for body in [robot] + list(robot.GetGrabbed())]
+        robot_zmin = min(aabb.pos()[2] - aabb.extents()[2] for aabb in robot_aabbs)
+        robot_zmax = max(aabb.pos()[2] + aabb.extents()[2] for aabb in robot_aabbs)
+
+        is_near = np.zeros((len(self.key_configs),), dtype=bool)
+        for body in bodies:
+            if not body.IsEnabled():
+                continue
+            aabb = body.ComputeAABB()
+            # the base moves in the plane, so the robot's vertical extent is the same at every key config
+            if aabb.pos()[2] + aabb.extents()[2] < robot_zmin or robot_zmax < aabb.pos()[2] - aabb.extents()[2]:
+                continue
+            is_near |= footprint.get_configs_overlapping(body)
+        return np.nonzero(is_near)[0]
+
+    def get_other_bodies(self, exclude_movable_objects):
+        robot = self.problem_env.robot
+        excluded = [robot] + list(robot.GetGrabbed())
+        if exclude_movable_objects:
+            excluded += self.problem_env.objects
+        return [body for body in self.problem_env.env.GetBodies() if body not in excluded]
+
+    def get_static_occ(self):
+        key = compute_holding_state_hash(self.problem_env.robot)
+        if key not in self.static_occs:
+            were_objects_enabled = [obj.IsEnabled() for obj in self.problem_env.objects]
+            [obj.Enable(False) for obj in self.problem_env.objects]
+            static_bodies = self.get_other_bodies(exclude_movable_objects=True)
+            self.static_occs[key] = self.check_key_configs(self.get_key_configs_near(static_bodies))
+            for enabled, obj in zip(were_objects_enabled, self.problem_env.objects):
+                obj.Enable(enabled)
+        return self.static_occs[key]
+
+    def compute_occ_vec(self, collides=None):
+        """
+        collides: obj_name -> set of key config indices in collision with the object at its current pose, computed for
+        the current arm configuration; ignored when the robot is holding an object.
+        """
+        if len(self.problem_env.robot.GetGrabbed()) > 0:
+            return self.compute_occ_vec_while_holding()
+
+        if collides is None:
+            collision_map = PRMCollisionMap(self.problem_env, self.key_configs, cache=get_collision_cache())
+            _, collides = collision_map.compute_collisions(self.problem_env.objects)
+        occ_vec = self.get_static_occ().copy()
+        for obj in self.problem_env.objects:
+            if obj.IsEnabled():
+                occ_vec[list(collides[obj.GetName()])] = True
+        return occ_vec * 1
+
+    def compute_occ_vec_while_holding(self):
+        other_bodies = self.get_other_bodies(exclude_movable_objects=False)
+        return self.check_key_configs(self.get_key_configs_near(other_bodies)) * 1
+
+    def validate(self, collides=None):
+        # compares against the loop over all of the key configs
+        from gtamp_utils import utils
+        occ_vec = self.compute_occ_vec(collides)
+        assert np.all(occ_vec == utils.compute_occ_vec(self.key_configs)), 'Occupancy differs from compute_occ_vec'
+        return occ_vec
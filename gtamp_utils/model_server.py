@@ -0,0 +1,201 @@
+import os
+import time
+import threading
+import Queue
+import collections
+import traceback
+import numpy as np
+from multiprocessing.connection import Listener, Client
+
+DEFAULT_ADDRESS = './model_server.sock'
+
+
+def is_torch_tensor(x):
+    return type(x).__module__.startswith('torch') and hasattr(x, 'detach')
+
+
+def get_batch_signature(args):
+    # requests can be put in one batch if all of their args are arrays that only differ in the first dimension, and
+    # that dimension is the same for all of the args of a request
+    if len(args) == 0:
+        return None
+    signature = []
+    for arg in args:
+        if not (isinstance(arg, np.ndarray) or is_torch_tensor(arg)) or len(arg.shape) == 0 \
+                or arg.shape[0] != args[0].shape[0]:
+            return None
+        signature.append((type(arg).__name__, tuple(arg.shape[1:]), str(arg.dtype)))
+    return tuple(signature)
+
+
+def concatenate(arrays):
+    if is_torch_tensor(arrays[0]):
+        import torch
+        return torch.cat(arrays, 0)
+    return np.concatenate(arrays, axis=0)
+
+
+class ModelServer:
+    """
+    Serves the predictions of models that are loaded once to the planner processes, over a Unix socket.
+
+    Each client connection is read by its own thread, and all of the models are run by the thread that calls
+    serve_forever, which should be the one that built them, so that the TF graph and session are the default ones.
+    Requests for the same method of the same model that arrive within max_batch_wait seconds of each other are
+    coalesced into one call when their args are arrays that only differ in the batch dimension, which must be the same
+    for all of the args of a request, and the output is split back along the batch dimension.
+    """
+
+    def __init__(self, models, address=DEFAULT_ADDRESS, max_batch_wait=2e-3):
+        self.models = models
+        self.address = address
+        self.max_batch_wait = max_batch_wait
+        self.requests = Queue.Queue()
+
+        self.n_requests = 0
+        self.n_calls = 0
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        listener = Listener(self.address, family='AF_UNIX')
+        accept_thread = threading.Thread(target=self.accept_connections, args=(listener,))
+        accept_thread.daemon = True
+        accept_thread.start()
+        print "Serving %s at %s" % (', '.join(sorted(self.models.keys())), self.address)
+
+        try:
+            while True:
+                self.run_requests(self.get_pending_requests())
+        finally:
+            listener.close()
+            if os.path.exists(self.address):
+                os.remove(self.address)
+
+    def accept_connections(self, listener):
+        while True:
+            conn = listener.accept()
+            conn_thread = threading.Thread(target=self.read_requests, args=(conn,))
+            conn_thread.daemon = True
+            conn_thread.start()
+
+    def read_requests(self, conn):
+        while True:
+            try:
+                model_name, method_name, args = conn.recv()
+            except (EOFError, IOError):
+                conn.close()
+                return
+            self.requests.put((conn, model_name, method_name, args))
+
+    def get_pending_requests(self):
+        requests = [self.requests.get()]
+        deadline = time.time() + self.max_batch_wait
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                requests.append(self.requests.get(timeout=remaining))
+            except Queue.Empty:
+                break
+        return requests
+
+    def call(self, model_name, method_name, args):
+        model = self.models[model_name]
+        if method_name == '__class_name__':
+            return model.__class__.__name__
+        if method_name == '__call__':
+            result = model(*args)
+        else:
+            result = getattr(model, method_name)(*args)
+        if is_torch_tensor(result):
+            result = result.detach()
+        return result
+
+    def run_requests(self, requests):
+        self.n_requests += len(requests)
+        groups = collections.OrderedDict()
+        for conn, model_name, method_name, args in requests:
+            signature = get_batch_signature(args)
+            key = (model_name, method_name, signature) if signature is not None else len(groups)
+            groups.setdefault(key, []).append((conn, model_name, method_name, args))
+
+        for group in groups.values():
+            if len(group) == 1:
+                self.run_single_request(*group[0])
+            else:
+                self.run_batched_requests(group)
+
+    def run_single_request(self, conn, model_name, method_name, args):
+        self.n_calls += 1
+        try:
+            reply = ('ok', self.call(model_name, method_name, args))
+        except Exception:
+            reply = ('error', traceback.format_exc())
+        self.send(conn, reply)
+
+    def run_batched_requests(self, group):
+        _, model_name, method_name, _ = group[0]
+        batch_sizes = [args[0].shape[0] for _, _, _, args in group]
+        batch_args = [concatenate([args[arg_idx] for _, _, _, args in group]) for arg_idx in range(len(group[0][3]))]
+        self.n_calls += 1
+        try:
+            result = self.call(model_name, method_name, batch_args)
+        except Exception:
+            result = None
+        if result is None or not hasattr(result, 'shape') or len(result.shape) == 0 \
+                or result.shape[0] != sum(batch_sizes):
+            # the method does not map each row of its input to a row of its output; run the requests one by one
+            for request in group:
+                self.run_single_request(*request)
+            return
+
+        ends = np.cumsum(batch_sizes)
+        for (conn, _, _, _), begin, end in zip(group, ends - batch_sizes, ends):
+            self.send(conn, ('ok', result[int(begin):int(end)]))
+
+    @staticmethod
+    def send(conn, reply):
+        try:
+            conn.send(reply)
+        except IOError:
+            pass  # the client is gone
+
+
+class ModelClient:
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.conn = Client(address, family='AF_UNIX')
+        self.lock = threading.Lock()
+
+    def request(self, model_name, method_name, args):
+        with self.lock:
+            self.conn.send((model_name, method_name, tuple(args)))
+            status, result = self.conn.recv()
+        if status == 'error':
+            raise RuntimeError('Model server failed on %s.%s:\n%s' % (model_name, method_name, result))
+        return result
+
+
+class RemoteModel:
+    """
+    Stands in for a model served by a ModelServer; method calls and calls on the model itself are forwarded to the
+    server. model_class_name is the class name of the served model.
+    """
+
+    def __init__(self, client, model_name):
+        self.client = client
+        self.model_name = model_name
+        self.model_class_name = client.request(model_name, '__class_name__', ())
+
+    def __call__(self, *args):
+        return self.client.request(self.model_name, '__call__', args)
+
+    def __getattr__(self, method_name):
+        if method_name.startswith('__'):
+            raise AttributeError(method_name)
+        return lambda *args: self.client.request(self.model_name, method_name, args)
+
+
+def get_model_class_name(model):
+    return getattr(model, 'model_class_name', model.__class__.__name__)
@@ -2,16 +2,14 @@ from motion_planners.rrt import TreeNode, configs
 from motion_planners.utils import argmin
 import numpy as np
 from random import randint
-import pickle
-import Queue
 import openravepy
 import time
 
 from gtamp_utils import utils
 
-from gtamp_utils.utils import visualize_path, se2_distance, are_base_confs_close_enough
-
-prm_vertices = prm_edges = None
+from gtamp_utils.utils import visualize_path, se2_distance, se2_distances, are_base_confs_close_enough
+from gtamp_utils.prm_graph import get_prm_graph
+from gtamp_utils.prm_search import prm_astar, PRMShortestPathTree, compute_distance_to_goal_lower_bounds
 
 
 def get_number_of_confs_in_between(q1, q2, body):
@@ -57,6 +55,35 @@ def collision_fn(env, body, check_self=False):
     return fn
 
 
+class CollisionMemo:
+    """
+    Wraps a base config collision function with a memory of its results, keyed by the config quantized to
+    xy_resolution and th_resolution. Meant to live for one motion planning query, during which the environment does
+    not change, so that its restarts and both of the RRT trees share the checks.
+    """
+
+    def __init__(self, collision, xy_resolution=1e-3, th_resolution=1e-3):
+        self.collision = collision
+        self.resolution = np.array([xy_resolution, xy_resolution, th_resolution])
+        self.in_collision = {}
+        self.n_checks = 0
+        self.n_saved_checks = 0
+
+    def make_key(self, q):
+        q = np.array(q, dtype=float).squeeze()
+        q[-1] = np.mod(q[-1] + np.pi, 2 * np.pi) - np.pi
+        return tuple(np.round(q / self.resolution).astype(int))
+
+    def __call__(self, q):
+        key = self.make_key(q)
+        if key in self.in_collision:
+            self.n_saved_checks += 1
+        else:
+            self.n_checks += 1
+            self.in_collision[key] = self.collision(q)
+        return self.in_collision[key]
+
+
 def extend_fn(body):
     return lambda q1, q2: linear_interpolation(body, q1, q2)
 
@@ -89,6 +116,11 @@ def base_distance_fn(body, x_extents, y_extents):
     return lambda q1, q2: base_distance(q1, q2, x_extents, y_extents)
 
 
+def base_distances_fn(body, x_extents, y_extents):
+    # batched base_distance_fn: distances from each row of configs to q
+    return lambda configs, q: se2_distances(configs, q, c1=1, c2=0.1)
+
+
 def arm_base_distance_fn(body, x_extents, y_extents):
     return lambda q1, q2: arm_base_cspace_distance_2(body, q1, q2, x_extents, y_extents)
 
@@ -177,9 +209,9 @@ def base_linear_interpolation(body, q1, q2):
 
 
 def base_linear_interpolation(body, q1, q2):
+    # lazy, so that the configs after the first collision along the edge are never computed
     n = get_number_of_confs_in_between(q1, q2, body)
     q = q1
-    interpolated_qs = []
     for i in range(n):
         curr_q = q
         q = (1. / (n - i)) * body.SubtractActiveDOFValues(q2,
@@ -188,8 +220,7 @@ def base_linear_interpolation(body, q1, q2):
             q[-1] = q[-1] - 2 * np.pi
         if q[-1] < -np.pi:
             q[-1] = q[-1] + 2 * np.pi
-        interpolated_qs.append(q)
-    return interpolated_qs
+        yield q
 
 
 def rrt_region(q1, region, distance, sample, extend, collision, iterations):
@@ -228,17 +259,47 @@ def rrt_region(q1, region, distance, sample, extend, collision, iterations):
     return None
 
 
-def rrt_connect(q1, q2, distance, sample, extend, collision, iterations):
+class RRTTree:
+    """
+    The nodes of an RRT tree, with their configs also stored row by row in an array that doubles in size when full, so
+    that the nearest node to a config is found with one call to a batched distance function.
+    """
+
+    def __init__(self, root, distances):
+        self.nodes = [root]
+        self.configs = np.zeros((16, len(root.config)))
+        self.configs[0] = root.config
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def append(self, node):
+        if len(self.nodes) == len(self.configs):
+            self.configs = np.vstack([self.configs, np.zeros(self.configs.shape)])
+        self.configs[len(self.nodes)] = node.config
+        self.nodes.append(node)
+
+    def nearest(self, q):
+        # first of the closest nodes, as argmin over the node list
+        return self.nodes[int(np.argmin(self.distances(self.configs[0:len(self.nodes)], q)))]
+
+
+def rrt_connect(q1, q2, distance, sample, extend, collision, iterations, distances=None):
+    # distances is the batched version of distance, see base_distances_fn
     # check if q1 or q2 is in collision
     if collision(q1) or collision(q2):
         print 'collision in either initial or goal'
         return None
 
+    if distances is None:
+        distances = lambda configs, q: np.array([distance(config, q) for config in configs])
+
     # define two roots of the tree
     root1, root2 = TreeNode(q1), TreeNode(q2)
 
     # tree1_nodes grows from q1, tree2_nodes grows from q2
-    tree1_nodes, tree2_nodes = [root1], [root2]
+    tree1_nodes, tree2_nodes = RRTTree(root1, distances), RRTTree(root2, distances)
 
     # sample and extend iterations number of times
     for ntry in range(iterations):
@@ -249,7 +310,7 @@ def rrt_connect(q1, q2, distance, sample, extend, collision, iterations):
         s = sample()
 
         # returns the node with the closest distance to s from a set of nodes tree1_nodes
-        tree1_node_closest_to_new_config = argmin(lambda n: distance(n.config, s), tree1_nodes)
+        tree1_node_closest_to_new_config = tree1_nodes.nearest(s)
 
         # extend from the closest config to s
         extended_tree1_node = tree1_node_closest_to_new_config
@@ -261,7 +322,7 @@ def rrt_connect(q1, q2, distance, sample, extend, collision, iterations):
             tree1_nodes.append(extended_tree1_node)
 
         # try to extend to the tree grown from the other side
-        extended_tree2_node = argmin(lambda n: distance(n.config, extended_tree1_node.config), tree2_nodes)
+        extended_tree2_node = tree2_nodes.nearest(extended_tree1_node.config)
 
         for q in extend(extended_tree2_node.config, extended_tree1_node.config):
             if collision(q):
@@ -340,63 +401,90 @@ def get_goal_config_used(motion_plan, potential_goal_configs):
 
 # returns list of paths, 1 for each goal function
 def find_prm_path(start, goal_fns, heuristic, is_collision, source=''):
-    results = [None] * len(goal_fns)  # why do you have multiple goal functions?
-    visited = {s for s in start}
-    queue = Queue.PriorityQueue()
-    for s in start:
-        queue.put((heuristic(s), 0, np.random.rand(), s, [s]))
-
-    while not queue.empty():
-        _, dist, _, vertex, path = queue.get()
-
-        for next in prm_edges[vertex] - visited:
-            visited.add(next)
-            if is_collision(next):  # I think this can be lazily checked?
-                continue
-
-            #for i, goal_fn in enumerate(goal_fns):
-            if results[0] is None and goal_fns[0](next):
-                # what does results[i] supposed to hold? The path and next node if the next node is a goal node.
-                results[0] = path + [next]
-                break
-            else:
-                newdist = dist + np.linalg.norm(prm_vertices[vertex] - prm_vertices[next])
-                queue.put((newdist + heuristic(next), newdist, np.random.rand(), next, path + [next]))
-
-    #if source == 'sampler' and results[0] is None:
-    #    import pdb; pdb.set_trace()
-
-    # todo keep track of the configuration that is closest to the goal config
-    return results
-
+    if len(goal_fns) == 1:
+        return [prm_astar(start, goal_fns[0], is_collision, heuristic)]
+
+    # a single shortest-path tree answers all of the goal functions
+    tree = PRMShortestPathTree(start, is_collision)
+    return [tree.get_path(goal_fn) for goal_fn in goal_fns]
+
+
+class PRMGoal:
+    def __init__(self, q2, prm_graph):
+        self.q2 = q2
+        self.prm_graph = prm_graph
+        self.is_goal_region = type(q2) is AARegion
+        self.is_multiple_goals = not self.is_goal_region and isinstance(q2, list)  # and len(q2[0]) == len(q1)
+        self.is_single_goal = not self.is_goal_region and not self.is_multiple_goals
+
+    def remove_goals_in_collision(self, non_prm_config_collision_checker):
+        # returns False if no collision-free goal config is left
+        if self.is_single_goal and non_prm_config_collision_checker(self.q2):
+            return False
+
+        if self.is_multiple_goals:
+            self.q2 = [q_goal for q_goal in self.q2 if not non_prm_config_collision_checker(q_goal)]
+            if len(self.q2) == 0:
+                return False
+        return True
+
+    def get_direct_path(self, q1):
+        if self.is_single_goal and are_base_confs_close_enough(q1, self.q2, xy_threshold=0.8, th_threshold=50.):
+            return [q1, self.q2]
+
+        if self.is_multiple_goals:
+            for q_goal in self.q2:
+                if are_base_confs_close_enough(q1, q_goal, xy_threshold=0.8, th_threshold=50.):
+                    return [q1, q_goal]
+        return None
 
-def init_prm():
-    global prm_vertices
-    global prm_edges
-    if prm_vertices is None or prm_edges is None:
-        prm_vertices, prm_edges = pickle.load(open('./prm.pkl', 'rb'))
+    def get_goal_test_and_heuristic(self):
+        # returns (None, None) if no PRM vertex is close enough to the goal
+        if self.is_goal_region:
+            prm_vertices = self.prm_graph.vertices
+            goal_region = self.q2
+
+            def is_connected_to_goal(prm_vertex_idx):
+                return goal_region.contains_point(prm_vertices[prm_vertex_idx])
+
+            return is_connected_to_goal, None
+
+        if self.is_multiple_goals:
+            goal_vertices = self.prm_graph.get_vertices_close_to(self.q2, xy_threshold=0.8, th_threshold=360.)
+        else:
+            goal_vertices = self.prm_graph.get_vertices_close_to(self.q2, xy_threshold=0.8, th_threshold=52.)
+        if len(goal_vertices) == 0:
+            return None, None
+        is_connected_to_goal = np.zeros((self.prm_graph.n_vertices,), dtype=bool)
+        is_connected_to_goal[goal_vertices] = True
+        heuristic = compute_distance_to_goal_lower_bounds(goal_vertices, self.prm_graph)
+        return is_connected_to_goal, heuristic
+
+    def make_path(self, q1, vertex_path):
+        path = [q1] + [self.prm_graph.vertices[i] for i in vertex_path]
+        if self.is_single_goal:
+            path += [self.q2]
+        elif self.is_multiple_goals:
+            path += [get_goal_config_used(path, self.q2)]
+        return path
 
 
 def prm_connect(q1, q2, collision_checker, source=''):
-    global prm_vertices
-    global prm_edges
+    return prm_connect_to_goals(q1, [q2], collision_checker, source)[0]
 
-    is_goal_region = False
-    is_multiple_goals = False
-    if type(q2) is AARegion:
-        is_goal_region = True
-    else:
-        is_multiple_goals = isinstance(q2, list)  # and len(q2[0]) == len(q1)
 
-    is_single_goal = not is_goal_region and not is_multiple_goals
+def prm_connect_to_goals(q1, goals, collision_checker, source=''):
+    """
+    prm_connect from q1 to each of the goals. When there is more than one goal left after the base case checks,
+    a single shortest-path tree from q1 is computed and every path is read off of it.
+    """
+    prm_graph = get_prm_graph()
+    prm_vertices = prm_graph.vertices
     collision_checker_is_set = isinstance(collision_checker, set)
-
-    if prm_vertices is None or prm_edges is None:
-        prm_vertices, prm_edges = pickle.load(open('./prm.pkl', 'rb'))
-
     no_collision_checking = collision_checker_is_set and len(collision_checker) == 0
 
-    # todo I cannot read this code below and understand what happens when q2 is a region
+    goals = [PRMGoal(q2, prm_graph) for q2 in goals]
+    paths = [None] * len(goals)
 
     ## Base case checks
     if not no_collision_checking:
@@ -405,83 +493,49 @@ def prm_connect(q1, q2, collision_checker, source=''):
         non_prm_config_collision_checker = collision_fn(env, robot)
 
         if non_prm_config_collision_checker(q1):
-            return None
-
-        if is_single_goal and non_prm_config_collision_checker(q2):
-            return None
-
-        if is_multiple_goals:
-            q2_original = q2
-            q2 = [q_goal for q_goal in q2_original if not non_prm_config_collision_checker(q_goal)]
-
-            if len(q2) == 0:
-                return None
-
-    if is_single_goal and are_base_confs_close_enough(q1, q2, xy_threshold=0.8, th_threshold=50.):
-        return [q1, q2]
+            return paths
+        is_goal_feasible = [goal.remove_goals_in_collision(non_prm_config_collision_checker) for goal in goals]
+    else:
+        is_goal_feasible = [True] * len(goals)
 
-    if is_multiple_goals:
-        for q_goal in q2:
-            if are_base_confs_close_enough(q1, q_goal, xy_threshold=0.8, th_threshold=50.):
-                return [q1, q_goal]
+    goals_to_search = []
+    for goal_idx, goal in enumerate(goals):
+        if not is_goal_feasible[goal_idx]:
+            continue
+        paths[goal_idx] = goal.get_direct_path(q1)
+        if paths[goal_idx] is None:
+            goals_to_search.append(goal_idx)
     ###
 
-    ## Defines a goal test function
-    if is_multiple_goals:
-        close_points = []
-        def is_connected_to_goal(prm_vertex_idx):
-            q = prm_vertices[prm_vertex_idx]
-            goals = q2
-            if len(q.squeeze()) != 3:
-                raise NotImplementedError
-
-            #if source == 'sampler':
-            #    diff = utils.base_conf_diff(q, q2[0])
-            #    xydist = np.linalg.norm(diff[0:2])
-            #    if xydist < 0.8:
-            #        close_points.append(q)
-
-            return any(are_base_confs_close_enough(q, g, xy_threshold=0.8, th_threshold=360.) for g in goals)
-    elif is_goal_region:
-        def is_connected_to_goal(prm_vertex_idx):
-            q = prm_vertices[prm_vertex_idx]
-            goal_region = q2
-            return goal_region.contains_point(q)
-    else:
-        def is_connected_to_goal(prm_vertex_idx):
-            q = prm_vertices[prm_vertex_idx]
-            return are_base_confs_close_enough(q, q2, xy_threshold=0.8, th_threshold=52.)
-    #####
-
-    def heuristic(q):
-        return 0
+    if len(goals_to_search) == 0:
+        return paths
 
     def is_collision(q):
         return q in collision_checker if collision_checker_is_set else collision_checker(prm_vertices[q])
 
     ### making a set of qinit idxs
-    start = set()
-    for idx, q in enumerate(prm_vertices):
-        q_close_enough_to_q1 = are_base_confs_close_enough(q, q1, xy_threshold=0.8, th_threshold=360.)
-        if q_close_enough_to_q1:
-            if not is_collision(idx):
-                start.add(idx)
+    start = {
+        idx for idx in prm_graph.get_vertices_close_to(q1, xy_threshold=0.8, th_threshold=360.).tolist()
+        if not is_collision(idx)
+    }
     #####
 
-    path = find_prm_path(start, [is_connected_to_goal], heuristic, is_collision, source)[0]
-
-    #if source == 'sampler':
-    #    import pdb;pdb.set_trace()
-
-    if path is not None:
-        path = [q1] + [prm_vertices[i] for i in path]
-        if is_single_goal:
-            path += [q2]
-        elif is_multiple_goals:
-            path += [get_goal_config_used(path, q2)]
-        return path
+    if len(goals_to_search) == 1:
+        tree = None
     else:
-        return None
+        tree = PRMShortestPathTree(start, is_collision, prm_graph)
+
+    for goal_idx in goals_to_search:
+        is_connected_to_goal, heuristic = goals[goal_idx].get_goal_test_and_heuristic()
+        if is_connected_to_goal is None:
+            continue
+        if tree is None:
+            vertex_path = prm_astar(start, is_connected_to_goal, is_collision, heuristic, prm_graph)
+        else:
+            vertex_path = tree.get_path(is_connected_to_goal)
+        if vertex_path is not None:
+            paths[goal_idx] = goals[goal_idx].make_path(q1, vertex_path)
+    return paths
 
 
 def direct_path(q1, q2, extend, collision):
@@ -0,0 +1,120 @@
+import numpy as np
+
+from gtamp_utils.utils import set_robot_config, get_body_xytheta
+from gtamp_utils.collision_cache import compute_holding_state_hash
+
+
+class PRMCollisionMap:
+    """
+    Computes the set of PRM vertices at which the robot collides with a given object.
+
+    Broad phase: the robot, together with whatever it is holding, is bounded by a disc centered at its base origin.
+    The disc does not depend on the base rotation, so one numpy expression tells which vertices are too far away from
+    the object's AABB to possibly collide with it. Only the remaining vertices are sent to env.CheckCollision.
+
+    If a PersistentCollisionCache is given, bitsets computed by other states or other planner processes are reused.
+    """
+
+    def __init__(self, problem_env, prm_vertices, margin=0.05, cache=None):
+        self.problem_env = problem_env
+        self.prm_vertices = np.asarray(prm_vertices)
+        self.prm_xy = self.prm_vertices[:, 0:2]
+        self.n_vertices = len(self.prm_vertices)
+        self.margin = margin
+        self.robot_radius = None
+        self.cache = cache
+
+        self.n_broad_phase_rejections = 0
+        self.n_narrow_phase_checks = 0
+
+    def compute_robot_radius(self):
+        robot = self.problem_env.robot
+        base_xy = get_body_xytheta(robot)[0, 0:2]
+        bodies = [robot] + list(robot.GetGrabbed())
+        radius = 0
+        for body in bodies:
+            aabb = body.ComputeAABB()
+            farthest_corner = np.abs(aabb.pos()[0:2] - base_xy) + aabb.extents()[0:2]
+            radius = max(radius, np.linalg.norm(farthest_corner))
+        return radius
+
+    def get_candidate_vertices(self, obj):
+        if self.robot_radius is None:
+            self.robot_radius = self.compute_robot_radius()
+        aabb = obj.ComputeAABB()
+        dist_to_box = np.maximum(np.abs(self.prm_xy - aabb.pos()[0:2]) - aabb.extents()[0:2], 0)
+        reach = self.robot_radius + self.margin
+        is_candidate = np.sum(dist_to_box * dist_to_box, axis=-1) <= reach * reach
+        return np.nonzero(is_candidate)[0]
+
+    def in_collision(self, q, obj, is_robot_holding):
+        robot = self.problem_env.robot
+        env = self.problem_env.env
+        set_robot_config(q, robot)
+        if is_robot_holding:
+            # note:
+            # openrave bug: when an object is held, it won't check the held_obj and given object collision unless
+            #               collision on robot is first checked. So, we have to check it twice
+            env.CheckCollision(robot)
+        return env.CheckCollision(robot, obj)
+
+    def compute_collision_bitset(self, obj):
+        is_robot_holding = len(self.problem_env.robot.GetGrabbed()) > 0
+        candidates = self.get_candidate_vertices(obj)
+        self.n_broad_phase_rejections += self.n_vertices - len(candidates)
+        self.n_narrow_phase_checks += len(candidates)
+
+        in_collision = np.zeros((self.n_vertices,), dtype=bool)
+        for idx in candidates:
+            in_collision[idx] = self.in_collision(self.prm_vertices[idx], obj, is_robot_holding)
+        return np.packbits(in_collision)
+
+    def get_collision_bitset(self, obj, obj_pose, holding_state_hash):
+        if self.cache is None:
+            return self.compute_collision_bitset(obj)
+        key = self.cache.make_key(obj, obj_pose, holding_state_hash)
+        bitset = self.cache.get(key)
+        if bitset is None:
+            bitset = self.compute_collision_bitset(obj)
+            self.cache.put(key, bitset)
+        return bitset
+
+    def bitset_to_vertex_set(self, bitset):
+        in_collision = np.unpackbits(bitset)[:self.n_vertices]
+        return set(np.nonzero(in_collision)[0].tolist())
+
+    def compute_collisions(self, objects, parent_collides=None):
+        """
+        Returns (collides, current_collides) in the format used by PaPState:
+            collides: (obj_name, rounded_pose_tuple) -> set of PRM vertex indices, with the parent's entries reused
+            current_collides: obj_name -> set of PRM vertex indices at the object's current pose
+        """
+        self.robot_radius = None
+        obj_name_to_pose = {
+            obj.GetName(): tuple(get_body_xytheta(obj)[0].round(6))
+            for obj in objects
+        }
+
+        if self.cache is not None:
+            holding_state_hash = compute_holding_state_hash(self.problem_env.robot)
+        else:
+            holding_state_hash = None
+
+        collisions_at_all_obj_pose_pairs = {}
+        old_q = get_body_xytheta(self.problem_env.robot)
+        for obj in objects:
+            obj_name_pose_tuple = (obj.GetName(), obj_name_to_pose[obj.GetName()])
+            collisions_with_obj_did_not_change = parent_collides is not None and \
+                                                 obj_name_pose_tuple in parent_collides
+            if collisions_with_obj_did_not_change:
+                collisions_at_all_obj_pose_pairs[obj_name_pose_tuple] = parent_collides[obj_name_pose_tuple]
+            else:
+                bitset = self.get_collision_bitset(obj, obj_name_to_pose[obj.GetName()], holding_state_hash)
+                collisions_at_all_obj_pose_pairs[obj_name_pose_tuple] = self.bitset_to_vertex_set(bitset)
+        set_robot_config(old_q, self.problem_env.robot)
+
+        collisions_at_current_obj_pose_pairs = {
+            obj.GetName(): collisions_at_all_obj_pose_pairs[(obj.GetName(), obj_name_to_pose[obj.GetName()])]
+            for obj in objects
+        }
+        return collisions_at_all_obj_pose_pairs, collisions_at_current_obj_pose_pairs
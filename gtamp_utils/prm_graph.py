@@ -0,0 +1,117 @@
+import os
+import pickle
+import numpy as np
+from scipy.spatial import cKDTree
+
+from gtamp_utils.utils import are_base_confs_close_enough_batch
+
+prm_graph = None
+
+
+class PRMGraph:
+    """
+    The roadmap stored in prm.pkl, as arrays:
+        vertices: (n_vertices, 3) float64 base configurations
+        indptr, indices, edge_lengths: CSR adjacency; the neighbors of vertex i are indices[indptr[i]:indptr[i+1]]
+    """
+
+    def __init__(self, vertices, indptr, indices, edge_lengths):
+        self.vertices = vertices
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_lengths = edge_lengths
+        self.n_vertices = len(vertices)
+        self.edge_sets = None
+        self.xy_tree = None
+
+    @staticmethod
+    def from_edge_sets(vertices, edges):
+        vertices = np.ascontiguousarray(np.array(vertices, dtype=np.float64))
+        degrees = np.array([len(e) for e in edges], dtype=np.int64)
+        indptr = np.zeros((len(vertices) + 1,), dtype=np.int64)
+        indptr[1:] = np.cumsum(degrees)
+        indices = np.zeros((indptr[-1],), dtype=np.int64)
+        for i, e in enumerate(edges):
+            indices[indptr[i]:indptr[i + 1]] = sorted(e)
+        src = np.repeat(np.arange(len(vertices)), degrees)
+        edge_lengths = np.linalg.norm(vertices[src] - vertices[indices], axis=-1)
+        return PRMGraph(vertices, indptr, indices, edge_lengths)
+
+    def neighbors(self, vertex):
+        return self.indices[self.indptr[vertex]:self.indptr[vertex + 1]]
+
+    def neighbor_edge_lengths(self, vertex):
+        return self.edge_lengths[self.indptr[vertex]:self.indptr[vertex + 1]]
+
+    def get_xy_tree(self):
+        if self.xy_tree is None:
+            self.xy_tree = cKDTree(np.array(self.vertices[:, 0:2]))
+        return self.xy_tree
+
+    def get_vertices_close_to(self, qs, xy_threshold, th_threshold, use_kdtree=True):
+        # indices of the vertices that are close enough, in the sense of are_base_confs_close_enough, to any of qs
+        qs = np.asarray(qs, dtype=np.float64).reshape((-1, 3))
+        if len(qs) == 0:
+            return np.zeros((0,), dtype=np.int64)
+        if use_kdtree:
+            candidates = self.get_xy_tree().query_ball_point(qs[:, 0:2], xy_threshold)
+            candidates = np.array(sorted(set().union(*candidates)), dtype=np.int64)
+        else:
+            candidates = np.arange(self.n_vertices)
+        if len(candidates) == 0:
+            return candidates
+        is_close = are_base_confs_close_enough_batch(self.vertices[candidates][:, None, :], qs[None, :, :],
+                                                     xy_threshold, th_threshold)
+        return candidates[np.any(is_close, axis=-1)]
+
+    def get_edge_sets(self):
+        # list-of-sets form of prm.pkl, for the code that still wants it
+        if self.edge_sets is None:
+            self.edge_sets = [set(self.neighbors(i).tolist()) for i in range(self.n_vertices)]
+        return self.edge_sets
+
+    def get_edge_index(self):
+        # (2, n_edges) array of [src; dest], the edge format used by the reachability GNNs
+        src = np.repeat(np.arange(self.n_vertices), np.diff(self.indptr))
+        return np.vstack([src, self.indices])
+
+    def save(self, dirname):
+        # arrays are kept as separate .npy files because numpy cannot memory-map the members of an .npz
+        tmpdir = dirname + '.tmp%d' % os.getpid()
+        if not os.path.isdir(tmpdir):
+            os.makedirs(tmpdir)
+        for name in ['vertices', 'indptr', 'indices', 'edge_lengths']:
+            np.save(os.path.join(tmpdir, name + '.npy'), getattr(self, name))
+        try:
+            os.rename(tmpdir, dirname)
+        except OSError:
+            # another process saved it first
+            for fname in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, fname))
+            os.rmdir(tmpdir)
+
+    @staticmethod
+    def load(dirname):
+        arrays = [np.load(os.path.join(dirname, name + '.npy'), mmap_mode='c')
+                  for name in ['vertices', 'indptr', 'indices', 'edge_lengths']]
+        return PRMGraph(*arrays)
+
+
+def load_prm_graph(prm_file='./prm.pkl'):
+    dirname = os.path.splitext(prm_file)[0] + '_graph'
+    is_saved_graph_up_to_date = os.path.isdir(dirname) and os.path.getmtime(dirname) >= os.path.getmtime(prm_file)
+    if not is_saved_graph_up_to_date:
+        vertices, edges = pickle.load(open(prm_file, 'rb'))
+        graph = PRMGraph.from_edge_sets(vertices, edges)
+        if os.path.isdir(dirname):
+            return graph
+        graph.save(dirname)
+    return PRMGraph.load(dirname)
+
+
+def get_prm_graph():
+    # loaded once per process; the arrays are copy-on-write maps of the saved .npy files
+    global prm_graph
+    if prm_graph is None:
+        prm_graph = load_prm_graph()
+    return prm_graph
@@ -0,0 +1,192 @@
+import heapq
+import numpy as np
+
+from gtamp_utils.prm_graph import get_prm_graph
+
+
+def as_vertex_fn(fn_or_array):
+    if fn_or_array is None or callable(fn_or_array):
+        return fn_or_array
+    return lambda vertex: fn_or_array[vertex]
+
+
+def compute_distance_to_goal_lower_bounds(goal_vertices, prm_graph=None):
+    # Straight-line distance from every vertex to the nearest goal vertex. Edge lengths are euclidean distances
+    # between vertices, so this never overestimates the remaining path length and is a consistent A* heuristic.
+    if prm_graph is None:
+        prm_graph = get_prm_graph()
+    goal_configs = np.asarray(prm_graph.vertices)[np.asarray(goal_vertices, dtype=np.int64)]
+    if len(goal_configs) == 0:
+        return np.zeros((prm_graph.n_vertices,))
+    diffs = np.asarray(prm_graph.vertices)[:, None, :] - goal_configs[None, :, :]
+    return np.min(np.linalg.norm(diffs, axis=-1), axis=-1)
+
+
+def retrace_path(parents, vertex):
+    path = [vertex]
+    while parents[vertex] != -1:
+        vertex = parents[vertex]
+        path.append(vertex)
+    return path[::-1]
+
+
+class PRMSearch:
+    """
+    Best-first search over the PRM from a set of start vertices, with distances and parent pointers kept in arrays.
+    Vertices for which is_collision is true are never entered; it is evaluated at most once per vertex. Start vertices
+    are expanded without being collision checked and, as in the original find_prm_path, are never goal-tested.
+    """
+
+    def __init__(self, start, is_collision, prm_graph=None):
+        self.prm_graph = get_prm_graph() if prm_graph is None else prm_graph
+        n_vertices = self.prm_graph.n_vertices
+        self.is_collision = is_collision
+        self.dists = np.full((n_vertices,), np.inf)
+        self.parents = -np.ones((n_vertices,), dtype=np.int64)
+        self.is_start = np.zeros((n_vertices,), dtype=bool)
+        self.is_closed = np.zeros((n_vertices,), dtype=bool)
+        self.collision_checked = np.zeros((n_vertices,), dtype=bool)
+        self.in_collision = np.zeros((n_vertices,), dtype=bool)
+
+        self.start = list(start)
+        for s in self.start:
+            self.dists[s] = 0
+            self.is_start[s] = True
+
+    def check_collision(self, vertex):
+        if not self.collision_checked[vertex]:
+            self.collision_checked[vertex] = True
+            self.in_collision[vertex] = self.is_collision(vertex)
+        return self.in_collision[vertex]
+
+    def run(self, is_goal=None, heuristic=None):
+        # Returns the first goal vertex popped, or None if is_goal is None or no goal vertex is reachable.
+        is_goal = as_vertex_fn(is_goal)
+        heuristic = as_vertex_fn(heuristic)
+        queue = []
+        for s in self.start:
+            heapq.heappush(queue, (heuristic(s) if heuristic is not None else 0, 0., s))
+
+        while len(queue) > 0:
+            _, dist, vertex = heapq.heappop(queue)
+            if self.is_closed[vertex]:
+                continue
+            self.is_closed[vertex] = True
+            if is_goal is not None and not self.is_start[vertex] and is_goal(vertex):
+                return vertex
+
+            neighbors = self.prm_graph.neighbors(vertex).tolist()
+            edge_lengths = self.prm_graph.neighbor_edge_lengths(vertex).tolist()
+            for next, edge_length in zip(neighbors, edge_lengths):
+                if self.is_closed[next] or self.is_start[next]:
+                    continue
+                newdist = dist + edge_length
+                if newdist >= self.dists[next] or self.check_collision(next):
+                    continue
+                self.dists[next] = newdist
+                self.parents[next] = vertex
+                heapq.heappush(queue, (newdist + (heuristic(next) if heuristic is not None else 0), newdist, next))
+        return None
+
+    def get_path_to(self, vertex):
+        if vertex is None or not np.isfinite(self.dists[vertex]):
+            return None
+        return retrace_path(self.parents, vertex)
+
+
+def prm_astar(start, is_goal, is_collision, heuristic=None, prm_graph=None):
+    """
+    A* from a set of start vertices to a vertex satisfying is_goal. is_goal and heuristic are either functions of a
+    vertex index or arrays indexed by it. Returns the list of vertex indices on the path, or None.
+    """
+    search = PRMSearch(start, is_collision, prm_graph)
+    return search.get_path_to(search.run(is_goal, heuristic))
+
+
+class PRMShortestPathTree:
+    """
+    The complete shortest-path tree from a set of start vertices under one collision mask. Paths to any number of goal
+    sets are read off the same tree.
+    """
+
+    def __init__(self, start, is_collision, prm_graph=None):
+        self.search = PRMSearch(start, is_collision, prm_graph)
+        self.search.run()
+        self.reached = np.nonzero(np.isfinite(self.search.dists) & ~self.search.is_start)[0]
+        self.reached = self.reached[np.argsort(self.search.dists[self.reached], kind='mergesort')]
+
+    def get_closest_goal_vertex(self, is_goal):
+        if callable(is_goal):
+            for vertex in self.reached.tolist():
+                if is_goal(vertex):
+                    return vertex
+            return None
+        is_reached_goal = np.asarray(is_goal)[self.reached]
+        if not np.any(is_reached_goal):
+            return None
+        return int(self.reached[np.argmax(is_reached_goal)])
+
+    def get_path(self, is_goal):
+        return self.search.get_path_to(self.get_closest_goal_vertex(is_goal))
+
+    def is_reachable(self, is_goal):
+        return self.get_closest_goal_vertex(is_goal) is not None
+
+
+def count_objects(object_mask):
+    return bin(object_mask).count('1')
+
+
+def prm_minimum_constraint_search(start, is_goal, vertex_object_masks, is_collision=None, prm_graph=None):
+    """
+    Label-setting Dijkstra for the PRM path that passes through the fewest distinct objects. vertex_object_masks[v] is
+    the bitmask of the objects that the robot collides with at vertex v; vertices for which is_collision is true are
+    never entered. A label is an (object mask, path length) pair reaching a vertex, and labels are popped in the order of
+    (number of objects, path length). A label is dropped if a popped label at the same vertex has a subset of its
+    objects and a path no longer than its own. As in PRMSearch, start vertices are never goal-tested or re-entered.
+    Returns (vertex path, object mask) of the first goal label popped, or (None, None).
+    """
+    if prm_graph is None:
+        prm_graph = get_prm_graph()
+    is_goal = as_vertex_fn(is_goal)
+    start = set(start)
+    popped_labels = {}  # vertex -> list of (object mask, path length)
+    label_parents = []  # label id -> (vertex, parent label id)
+
+    def is_dominated(vertex, object_mask, dist):
+        for popped_mask, popped_dist in popped_labels.get(vertex, []):
+            if popped_mask & object_mask == popped_mask and popped_dist <= dist:
+                return True
+        return False
+
+    queue = []
+    for s in start:
+        label_parents.append((s, -1))
+        heapq.heappush(queue, (count_objects(vertex_object_masks[s]), 0., vertex_object_masks[s], s,
+                               len(label_parents) - 1))
+
+    while len(queue) > 0:
+        _, dist, object_mask, vertex, label = heapq.heappop(queue)
+        if is_dominated(vertex, object_mask, dist):
+            continue
+        popped_labels.setdefault(vertex, []).append((object_mask, dist))
+        if vertex not in start and is_goal(vertex):
+            path = []
+            while label != -1:
+                path.append(label_parents[label][0])
+                label = label_parents[label][1]
+            return path[::-1], object_mask
+
+        neighbors = prm_graph.neighbors(vertex).tolist()
+        edge_lengths = prm_graph.neighbor_edge_lengths(vertex).tolist()
+        for next, edge_length in zip(neighbors, edge_lengths):
+            if next in start or (is_collision is not None and is_collision(next)):
+                continue
+            next_object_mask = object_mask | vertex_object_masks[next]
+            next_dist = dist + edge_length
+            if is_dominated(next, next_object_mask, next_dist):
+                continue
+            label_parents.append((next, label))
+            heapq.heappush(queue, (count_objects(next_object_mask), next_dist, next_object_mask, next,
+                                   len(label_parents) - 1))
+    return None, None
@@ -0,0 +1,45 @@
+import numpy as np
+from openravepy import DOFAffine
+
+
+def get_xy_aabb(body):
+    # [xmin, ymin, xmax, ymax] of the body's axis-aligned bounding box
+    aabb = body.ComputeAABB()
+    return np.hstack([aabb.pos()[0:2] - aabb.extents()[0:2], aabb.pos()[0:2] + aabb.extents()[0:2]])
+
+
+class BaseSweptFootprint:
+    """
+    Conservative 2D footprint of the robot moving along a base path. The xy bounding box of the robot and the bodies it
+    holds, in its current arm configuration, is computed once in the robot frame, and then rotated and translated to
+    all of the configs of the path and bounded again, with array operations. A body whose xy bounding box does not
+    overlap the box of a config cannot collide with the robot at that config, so exact collision checks are only
+    needed at the configs where the boxes overlap.
+    """
+
+    def __init__(self, robot, path, local_box=None, margin=1e-2):
+        self.local_box = self.compute_local_box(robot) if local_box is None else local_box
+        xmin, ymin, xmax, ymax = self.local_box
+        corners = np.array([[xmin, ymin], [xmin, ymax], [xmax, ymin], [xmax, ymax]])
+
+        configs = np.array([np.asarray(q).squeeze() for q in path]).reshape((-1, 3))
+        cos_th = np.cos(configs[:, 2:3])
+        sin_th = np.sin(configs[:, 2:3])
+        xs = configs[:, 0:1] + cos_th * corners[:, 0] - sin_th * corners[:, 1]
+        ys = configs[:, 1:2] + sin_th * corners[:, 0] + cos_th * corners[:, 1]
+        self.boxes = np.stack([xs.min(axis=-1) - margin, ys.min(axis=-1) - margin,
+                               xs.max(axis=-1) + margin, ys.max(axis=-1) + margin], axis=-1)
+
+    @staticmethod
+    def compute_local_box(robot):
+        with robot:
+            robot.SetActiveDOFs([], DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis, [0, 0, 1])
+            robot.SetActiveDOFValues([0, 0, 0])
+            boxes = np.array([get_xy_aabb(robot)] + [get_xy_aabb(body) for body in robot.GetGrabbed()])
+        return np.hstack([boxes[:, 0:2].min(axis=0), boxes[:, 2:4].max(axis=0)])
+
+    def get_configs_overlapping(self, body):
+        # boolean mask over the path configs at which the body may be in collision with the robot
+        box = get_xy_aabb(body)
+        return (self.boxes[:, 0] <= box[2]) & (box[0] <= self.boxes[:, 2]) \
+               & (self.boxes[:, 1] <= box[3]) & (box[1] <= self.boxes[:, 3])
@@ -812,6 +812,16 @@ def se2_distance(base_a1, base_a2, c1, c2):
     return distance
 
 
+def se2_distances(base_as, base_a2, c1, c2):
+    # se2_distance from each row of base_as to base_a2. The angle term is the distance between the unit vectors of the
+    # two headings, 2|sin(dth/2)|, which handles the wrap-around.
+    base_as = np.asarray(base_as).reshape((-1, 3))
+    base_a2 = np.asarray(base_a2).squeeze()
+    angle_distances = 2 * np.abs(np.sin((base_as[:, -1] - base_a2[-1]) / 2.))
+    base_distances = np.linalg.norm(base_as[:, 0:2] - base_a2[0:2], axis=-1)
+    return c1 * base_distances + c2 * angle_distances
+
+
 def are_base_confs_close_enough(q1, q2, xy_threshold, th_threshold):
     diff = base_conf_diff(q1, q2)
     th_threshold = th_threshold * np.pi / 180.0
@@ -822,6 +832,17 @@ def are_base_confs_close_enough(q1, q2, xy_threshold, th_threshold):
         return False
 
 
+def are_base_confs_close_enough_batch(q1s, q2s, xy_threshold, th_threshold):
+    # are_base_confs_close_enough over the last axis of q1s and q2s, broadcasting the rest
+    q1s = np.asarray(q1s)
+    q2s = np.asarray(q2s)
+    xy_dist = np.linalg.norm(q1s[..., 0:2] - q2s[..., 0:2], axis=-1)
+    th_diff = np.abs(np.mod(q1s[..., -1], 2 * np.pi) - np.mod(q2s[..., -1], 2 * np.pi))
+    th_diff = np.minimum(th_diff, 2 * np.pi - th_diff)
+    th_threshold = th_threshold * np.pi / 180.0
+    return np.logical_and(xy_dist < xy_threshold, th_diff < th_threshold)
+
+
 def convert_base_pose_to_se2(base_pose):
     base_pose = base_pose.squeeze()
     a, b = pol2cart(1, base_pose[-1])
@@ -44,31 +44,78 @@ def make_one_hot_encoded_edge(edge):
     return one_hot_encoded
 
 
-def get_edges(state, region_nodes, entity_names):
-    # Desired output shape: n_e x n_e x n_r x n_edge
+def encode_in_one_hot_batch(predicate_evals):
+    # encode_in_one_hot applied to each entry along the last axis; [..., n] -> [..., 2n]
+    is_true = predicate_evals == 1
+    one_hot_encoded = np.stack([~is_true, is_true], axis=-1).astype(np.float64)
+    return one_hot_encoded.reshape(is_true.shape[:-1] + (-1,))
+
 
-    #regions = [r for r in entity_names if 'region' in r and 'entire' not in r]  # is the region order always fixed?
-    is_one_arm_env = 'rectangular_packing_box1_region' in region_nodes.keys()
+def get_regions(entity_names):
+    is_one_arm_env = 'rectangular_packing_box1_region' in entity_names
     if is_one_arm_env:
-        regions = ['rectangular_packing_box1_region', 'center_shelf_region']
+        return ['rectangular_packing_box1_region', 'center_shelf_region']
     else:
-        regions = ['home_region', 'loading_region']
-    n_edge_features = 44
+        return ['home_region', 'loading_region']
+
+
+def get_predicate_arrays(state, entity_names):
+    """
+    The predicate evaluations of the state as dense arrays indexed by the position of the entities in entity_names:
+        nodes: n_e x n_node
+        binary_edges: n_e x n_e x n_binary_predicates
+        ternary_edges: n_e x n_e x n_r x n_ternary_predicates, over the regions of get_regions
+    These are built once per state, and kept on it.
+    """
+    entity_names = list(entity_names)
+    cached = getattr(state, 'predicate_arrays', None)
+    if cached is not None and cached['entity_names'] == entity_names:
+        return cached
+
+    regions = get_regions(entity_names)
+    predicate_arrays = {
+        'entity_names': entity_names,
+        'nodes': np.array([state.nodes[a] for a in entity_names], dtype=np.float64),
+        'binary_edges': np.array([[state.binary_edges[(a, b)] for b in entity_names] for a in entity_names],
+                                 dtype=np.float64),
+        'ternary_edges': np.array([[[state.ternary_edges[(a, b, r)] for r in regions] for b in entity_names]
+                                   for a in entity_names], dtype=np.float64),
+    }
+    state.predicate_arrays = predicate_arrays
+    return predicate_arrays
+
+
+def make_one_hot_encoded_nodes(nodes):
+    return np.concatenate([nodes[:, :6], encode_in_one_hot_batch(nodes[:, 6:])], axis=-1)
+
+
+def get_edges(state, region_nodes, entity_names):
+    # Desired output shape: n_e x n_e x n_r x n_edge
+    regions = get_regions(region_nodes.keys())
+    predicate_arrays = get_predicate_arrays(state, entity_names)
+    name_to_idx = {name: i for i, name in enumerate(entity_names)}
+    region_idxs = [name_to_idx[r] for r in regions]
     n_regions = len(regions)
     n_entities = len(entity_names)
-    edges = np.zeros((n_entities, n_entities, n_regions, n_edge_features))
-    for aidx, a in enumerate(entity_names):
-        for bidx, b in enumerate(entity_names):
-            ab_binary_edge = make_one_hot_encoded_edge(state.binary_edges[(a, b)])
-            ba_binary_edge = make_one_hot_encoded_edge(state.binary_edges[(b, a)])
-            for ridx, r in enumerate(regions):
-                ar_binary_edge = make_one_hot_encoded_edge(state.binary_edges[(a, r)])  # do we need this?
-                br_binary_edge = make_one_hot_encoded_edge(state.binary_edges[(b, r)])
-                ternary_edge1 = make_one_hot_encoded_edge(state.ternary_edges[(a, b, r)])
-                ternary_edge2 = make_one_hot_encoded_edge(state.ternary_edges[(b, a, r)])
-                edge_feature = np.hstack([region_nodes[r], ar_binary_edge, br_binary_edge, ab_binary_edge,
-                                          ba_binary_edge, ternary_edge1, ternary_edge2])
-                edges[aidx, bidx, ridx, :] = edge_feature
+
+    binary_edges = encode_in_one_hot_batch(predicate_arrays['binary_edges'])
+    ternary_edges = encode_in_one_hot_batch(predicate_arrays['ternary_edges'])
+    ab_binary_edges = binary_edges[:, :, None, :]
+    ba_binary_edges = binary_edges.transpose((1, 0, 2))[:, :, None, :]
+    ar_binary_edges = binary_edges[:, None, region_idxs, :]  # do we need this?
+    br_binary_edges = binary_edges[None, :, region_idxs, :]
+    region_node_features = np.array([region_nodes[r] for r in regions])[None, None, :, :]
+
+    shape = (n_entities, n_entities, n_regions)
+    edges = np.concatenate([
+        np.broadcast_to(region_node_features, shape + region_node_features.shape[-1:]),
+        np.broadcast_to(ar_binary_edges, shape + ar_binary_edges.shape[-1:]),
+        np.broadcast_to(br_binary_edges, shape + br_binary_edges.shape[-1:]),
+        np.broadcast_to(ab_binary_edges, shape + ab_binary_edges.shape[-1:]),
+        np.broadcast_to(ba_binary_edges, shape + ba_binary_edges.shape[-1:]),
+        ternary_edges,
+        ternary_edges.transpose((1, 0, 2, 3))
+    ], axis=-1)
     return edges
 
 
@@ -123,18 +170,20 @@ def get_actions(op_skeleton, entity_names):
     return action
 
 
-def extract_individual_example(state, op_instance, remaining_steps=0):
+def extract_state_features(state):
+    # node and edge features of a state, shared by all of its actions
     entity_names = list(state.nodes.keys())[::-1]
-    nodes = []
-    region_nodes = {}
-    for name in entity_names:
-        onehot = make_one_hot_encoded_node(state.nodes[name])
-        nodes.append(onehot)
-        if name.find('region') != -1 and name.find('entire') ==-1:
-            region_nodes[name] = onehot
-
-    nodes = np.vstack(nodes)
+    nodes = make_one_hot_encoded_nodes(get_predicate_arrays(state, entity_names)['nodes'])
+    region_nodes = {
+        name: onehot for name, onehot in zip(entity_names, nodes)
+        if name.find('region') != -1 and name.find('entire') == -1
+    }
     edges = get_edges(state, region_nodes, entity_names)
+    return nodes, edges, entity_names
+
+
+def extract_individual_example(state, op_instance, remaining_steps=0):
+    nodes, edges, entity_names = extract_state_features(state)
     actions = get_actions(op_instance, entity_names)
 
     costs = remaining_steps
@@ -291,3 +291,12 @@ class PaPGNN(GNN):
         val = self.predict_with_raw_input_format(nodes, edges, action)
         return val
 
+    def predict_batch(self, state, op_skeletons):
+        # q values of all op_skeletons in state, with one forward pass
+        raw_formats = [self.make_raw_format(state, op_skeleton) for op_skeleton in op_skeletons]
+        nodes = np.concatenate([nodes for nodes, _, _ in raw_formats], axis=0)
+        edges = np.concatenate([edges for _, edges, _ in raw_formats], axis=0)
+        actions = np.concatenate([action for _, _, action in raw_formats], axis=0)
+        vals = self.predict_with_raw_input_format(nodes, edges, actions)
+        return np.asarray(vals).reshape((len(op_skeletons),))
+
@@ -207,7 +207,7 @@ def visualize_grasp(manip, Tworld):
     """
 
 
-def solveTwoArmIKs(env, robot, obj, grasps):
+def solveTwoArmIKs(env, robot, obj, grasps, ik_cache=None):
     leftarm_manip = robot.GetManipulator('leftarm')
     rightarm_manip = robot.GetManipulator('rightarm')
     rightarm_torso_manip = robot.GetManipulator('rightarm_torso')
@@ -263,7 +263,10 @@ def solveTwoArmIKs(env, robot, obj, grasps):
 
         # checking right arm ik solution feasibility
         obj.Enable(False)
-        right_g_config = rightarm_torso_manip.FindIKSolution(g_right, 0)
+        if ik_cache is None:
+            right_g_config = rightarm_torso_manip.FindIKSolution(g_right, 0)
+        else:
+            right_g_config = ik_cache.find_ik_solution(rightarm_torso_manip, g_right)
 
         # rightarm_torso_manip.GetEndEffector().SetTransform(Tright_ee)
         if right_g_config is None:
@@ -279,7 +282,10 @@ def solveTwoArmIKs(env, robot, obj, grasps):
         # checking left arm ik solution feasibility
         st = time.time()
         obj.Enable(False)
-        left_g_config = leftarm_manip.FindIKSolution(g_left, 0)
+        if ik_cache is None:
+            left_g_config = leftarm_manip.FindIKSolution(g_left, 0)
+        else:
+            left_g_config = ik_cache.find_ik_solution(leftarm_manip, g_left)
         with robot:
             set_config(robot, left_g_config, leftarm_manip.GetArmIndices())
             if env.CheckCollision(robot):
@@ -294,3 +300,90 @@ def solveTwoArmIKs(env, robot, obj, grasps):
             obj.Enable(True)
             return [left_g_config, right_g_config]
     return None
+
+
+def rejects_grasp_facing(angle_diff, yaw_wrt_obj):
+    # the condition 1 of solveTwoArmIKs, on arrays of angle differences in degrees
+    return (angle_diff < 45) | ((angle_diff <= 360) & (angle_diff >= 315) & (yaw_wrt_obj != PI / 2)) \
+           | ((angle_diff < 135) & (angle_diff >= 45) & (yaw_wrt_obj != PI)) \
+           | ((angle_diff < 225) & (angle_diff >= 135) & (yaw_wrt_obj != 3 * PI / 2)) \
+           | ((angle_diff < 310) & (angle_diff >= 225) & (yaw_wrt_obj != 0))
+
+
+def filter_two_arm_grasps_batch(grasp_params, base_poses, obj, robot, eps=1e-6):
+    """
+    For N pairs of grasp parameters [theta, height_portion, depth_portion] and robot base poses, returns an N x 4
+    boolean array that tells which of the four grasps of compute_two_arm_grasp pass the facing and the arm reach
+    conditions that solveTwoArmIKs checks before calling the IK solver. A sample with no grasp left has no two-arm IK
+    solution. Grasps within eps of a threshold are kept, so that this never rejects what solveTwoArmIKs would accept.
+    """
+    grasp_params = np.asarray(grasp_params, dtype=np.float64).reshape((-1, 3))
+    base_poses = np.asarray(base_poses, dtype=np.float64).reshape((-1, 3))
+    thetas = grasp_params[:, 0]
+    height_portions = grasp_params[:, 1]
+    depth_portions = grasp_params[:, 2]
+    arm_len = 0.9844
+
+    with obj:
+        obj.SetTransform(np.eye(4))
+        aabb = obj.ComputeAABB()
+        if obj.GetName().find('tobj') != -1:
+            aabb = obj.GetLinks()[0].ComputeAABB()
+        aabb_pos = np.array(aabb.pos())
+        x_extent, y_extent, z_extent = aabb.extents()[0:3]
+    T_obj = get_trans(obj)
+    obj_yaw = np.arctan2(T_obj[1, 0], T_obj[0, 0])
+
+    # end-effector position wrt tool; compute_Tee_at_given_Ttool
+    left_T_tool_wrt_ee = robot.GetManipulator('leftarm').GetLocalToolTransform()
+    right_T_tool_wrt_ee = robot.GetManipulator('rightarm').GetLocalToolTransform()
+    left_ee_wrt_tool = -np.dot(left_T_tool_wrt_ee[0:3, 0:3].T, left_T_tool_wrt_ee[0:3, 3])
+    right_ee_wrt_tool = -np.dot(right_T_tool_wrt_ee[0:3, 0:3].T, right_T_tool_wrt_ee[0:3, 3])
+
+    # rotation of tool_wrt_world(roll=theta, pitch=0, yaw), which is Rz(yaw) Rx(theta)
+    cos_roll = np.cos(thetas)
+    sin_roll = np.sin(thetas)
+    zeros = np.zeros_like(thetas)
+    ones = np.ones_like(thetas)
+    R_roll = np.stack([np.stack([ones, zeros, zeros], axis=-1),
+                       np.stack([zeros, cos_roll, -sin_roll], axis=-1),
+                       np.stack([zeros, sin_roll, cos_roll], axis=-1)], axis=1)
+
+    robot_xy = base_poses[:, 0:2]
+    angle_diff = np.mod(np.degrees(base_poses[:, 2]) - np.degrees(obj_yaw), 360)
+
+    yaw_list = [0, PI / 2, PI, 3 * PI / 2]
+    grasp_axes = [np.array([1, 0, 0]), np.array([0, 1, 0]), np.array([-1, 0, 0]), np.array([0, -1, 0])]
+    non_grasp_axes = [np.array([0, 1, 0]), np.array([-1, 0, 0]), np.array([0, -1, 0]), np.array([1, 0, 0])]
+    passes = np.zeros((len(grasp_params), len(yaw_list)), dtype=bool)
+    for yaw_idx, yaw in enumerate(yaw_list):
+        if yaw == PI / 2 or yaw == 3 * PI / 2:
+            extent = y_extent
+            depth = x_extent
+        else:
+            extent = x_extent
+            depth = y_extent
+        grasp_width = grasp_axes[yaw_idx] * (extent + 0.045)
+        grasp_depth = non_grasp_axes[yaw_idx][None, :] * (-depth + 2 * depth * depth_portions)[:, None]
+        grasp_height = np.array([0, 0, 1])[None, :] * (z_extent - 2 * z_extent * height_portions)[:, None]
+        right_tool_point = aabb_pos - grasp_width - grasp_depth - grasp_height
+        left_tool_point = aabb_pos + grasp_width - grasp_depth - grasp_height
+
+        R_yaw = np.array([[np.cos(yaw), -np.sin(yaw), 0], [np.sin(yaw), np.cos(yaw), 0], [0, 0, 1]])
+        R_tool = np.einsum('ij,njk->nik', R_yaw, R_roll)
+        left_ee_wrt_obj = left_tool_point + np.einsum('nij,j->ni', R_tool, left_ee_wrt_tool)
+        right_ee_wrt_obj = right_tool_point + np.einsum('nij,j->ni', R_tool, right_ee_wrt_tool)
+        left_ee_xy = (np.dot(left_ee_wrt_obj, T_obj[0:3, 0:3].T) + T_obj[0:3, 3])[:, 0:2]
+        right_ee_xy = (np.dot(right_ee_wrt_obj, T_obj[0:3, 0:3].T) + T_obj[0:3, 3])[:, 0:2]
+
+        # condition 1 of solveTwoArmIKs, rejected only if rejected throughout [angle_diff - eps, angle_diff + eps]
+        is_facing_rejected = rejects_grasp_facing(angle_diff, yaw)
+        for shift in [-eps, eps]:
+            is_facing_rejected &= rejects_grasp_facing(np.mod(angle_diff + shift, 360), yaw)
+
+        # condition 2 of solveTwoArmIKs
+        reach = arm_len * 0.75 + eps
+        is_within_reach = (np.linalg.norm(robot_xy - right_ee_xy, axis=-1) <= reach) & \
+                          (np.linalg.norm(robot_xy - left_ee_xy, axis=-1) <= reach)
+        passes[:, yaw_idx] = ~is_facing_rejected & is_within_reach
+    return passes
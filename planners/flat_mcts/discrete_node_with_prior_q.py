@@ -1,33 +1,114 @@
 from mcts_tree_discrete_node import DiscreteTreeNode
 from planners.heuristics import get_objects_to_move
 
+import collections
 import numpy as np
 
+DEBUG = False
+
 
 def alpha_zero_ucb(n, n_sa):
-    return np.sqrt(n + 1) / float(n_sa + 1)
+    return np.sqrt(n + 1) / (n_sa + 1.0)
+
+
+def get_features_fingerprint(features):
+    return tuple((key, tuple(np.asarray(features[key], dtype=float).ravel().tolist())) for key in sorted(features))
+
+
+def get_state_fingerprint(state):
+    # the predicates of the entities, pairs and triples of entities, which are the inputs of the learned q;
+    # the first six node features are the geometric ones, which the learned q drops
+    nodes = tuple((entity, tuple(np.asarray(state.nodes[entity][6:], dtype=float).tolist()))
+                  for entity in sorted(state.nodes))
+    return nodes, get_features_fingerprint(state.binary_edges), get_features_fingerprint(state.ternary_edges)
+
+
+def get_action_names(action):
+    return action.discrete_parameters['object'], action.discrete_parameters['region']
+
+
+def softmax(values):
+    exp_values = np.exp(values - np.max(values))
+    return exp_values / np.sum(exp_values)
+
+
+class LearnedQValueCache:
+    """
+    (state fingerprint, actions) -> learned q values of the actions, so that the nodes of the same abstract state share
+    one prediction. Owned by the planner, which has a single learned q. At most max_entries states are kept; the least
+    recently used ones are evicted.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.q_values = collections.OrderedDict()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def get(self, state, actions, predict):
+        key = (get_state_fingerprint(state), tuple(get_action_names(a) for a in actions))
+        if key in self.q_values:
+            self.n_hits += 1
+            q_values = self.q_values.pop(key)
+        else:
+            self.n_misses += 1
+            q_values = predict()
+        self.q_values[key] = q_values
+        while len(self.q_values) > self.max_entries:
+            self.q_values.popitem(last=False)
+        return q_values
+
+    def print_stats(self):
+        print "Learned q value cache hits %d / %d, %d entries" \
+              % (self.n_hits, self.n_hits + self.n_misses, len(self.q_values))
 
 
 class DiscreteTreeNodeWithPriorQ(DiscreteTreeNode):
     def __init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node, is_init_node, actions,
-                 learned_q):
+                 learned_q, stats_table=None, learned_q_value_cache=None):
         # psa is based on the number of objs to move
+        self.learned_q_value_cache = learned_q_value_cache
         DiscreteTreeNode.__init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node,
-                                  is_init_node, actions, learned_q)
+                                  is_init_node, actions, learned_q, stats_table)
         is_infeasible_state = self.state is None
         if is_infeasible_state:
-            for a in self.A:
-                self.Q[a] = 0
+            self.get_stats('Q_sa')[:] = 0
         else:
             objs_to_move = get_objects_to_move(self.state, self.state.problem_env)
-            for a in self.A:
-                self.Q[a] = -len(objs_to_move)
+            self.get_stats('Q_sa')[:] = -len(objs_to_move)
+            self.get_stats('prior')[:] = softmax(self.compute_init_q_values(objs_to_move))
+        self.get_stats('is_q_set')[:] = True
+
+    def compute_init_q_values(self, objects_to_move):
+        if self.learned_q is not None:
+            if self.learned_q_value_cache is None:
+                return self.predict_learned_q_values()
+            return self.learned_q_value_cache.get(self.state, self.A, self.predict_learned_q_values)
+
+        init_q_values = []
+        for a in self.A:
+            obj_name, region_name = get_action_names(a)
+            o_reachable = self.state.is_entity_reachable(obj_name)
+            o_r_manip_free = self.state.binary_edges[(obj_name, region_name)][-1]
+            o_needs_to_be_moved = obj_name in objects_to_move
+            if o_reachable and o_r_manip_free and o_needs_to_be_moved:
+                val = 1
+            else:
+                val = 0
+            init_q_values.append(val)
+        return np.array(init_q_values, dtype=float)
+
+    def predict_learned_q_values(self):
+        if hasattr(self.learned_q, 'predict_batch'):
+            return np.asarray(self.learned_q.predict_batch(self.state, self.A), dtype=float).reshape((len(self.A),))
+        init_q_values = [self.learned_q.predict(self.state, a) for a in self.A]
+        return np.array(init_q_values, dtype=float).reshape((len(self.A),))
 
     def perform_ucb_over_actions(self):
         # todo this function is to be deleted once everything has been implemented
         assert self.is_operator_skeleton_node
         actions = self.A
-        q_values = [self.Q[a] for a in self.A]
+        q_values = self.get_stats('Q_sa')
 
         """
         for a, q in zip(actions, q_values):
@@ -49,50 +130,25 @@ class DiscreteTreeNodeWithPriorQ(DiscreteTreeNode):
         return best_action
 
     def get_action_with_highest_ucb_value(self, actions, q_values):
-        best_value = -np.inf
-
-        if self.learned_q is not None:
-            # todo make this more efficient by calling predict_with_raw_*
-            init_q_values = [self.learned_q.predict(self.state, a) for a in actions]
-            exp_sum = np.sum([np.exp(q) for q in init_q_values])
-        else:
-            objects_to_move = get_objects_to_move(self.state, self.state.problem_env)
-            init_q_values = []
-            for a in actions:
-                obj_name = a.discrete_parameters['object']
-                region_name = a.discrete_parameters['region']
-                o_reachable = self.state.is_entity_reachable(obj_name)
-                o_r_manip_free = self.state.binary_edges[(obj_name, region_name)][-1]
-                o_needs_to_be_moved = obj_name in objects_to_move
-                if o_reachable and o_r_manip_free and o_needs_to_be_moved:
-                    val = 1
-                else:
-                    val = 0
-                init_q_values.append(val)
-            exp_sum = np.sum([np.exp(q) for q in init_q_values])
-
-        action_ucb_values = []
-
-        for action, value, learned_value in zip(actions, q_values, init_q_values):
-            q_bonus = np.exp(learned_value) / float(exp_sum)
-            ucb_value = value + q_bonus + self.compute_ucb_value(action)
+        # actions are the actions of this node, in the order of self.A; the priors are computed in the constructor
+        prior = self.get_stats('prior')
+        ucb_values = np.asarray(q_values) + prior + self.compute_ucb_values_array()
+        if DEBUG:
+            self.print_action_values(prior, ucb_values)
+        return actions[self.choose_idx_with_highest_value(ucb_values)]
 
+    def print_action_values(self, q_bonuses, ucb_values):
+        for action, q_value, q_bonus, ucb_value in zip(self.A, self.get_stats('Q_sa'), q_bonuses, ucb_values):
             obj_name = action.discrete_parameters['object']
             region_name = action.discrete_parameters['region']
             print "%30s %30s Reachable? %d  ManipFree? %d IsGoal? %d Q? %.5f QBonus? %.5f Q+UCB? %.5f" \
                   % (obj_name, region_name, self.state.is_entity_reachable(obj_name),
                      self.state.binary_edges[(obj_name, region_name)][-1],
-                     obj_name in self.state.goal_entities, self.Q[action], q_bonus,
+                     obj_name in self.state.goal_entities, q_value, q_bonus,
                      ucb_value)
 
-            action_ucb_values.append(ucb_value)
-            if ucb_value > best_value:
-                best_value = ucb_value
-
-        boolean_idxs_with_highest_ucb = (np.max(action_ucb_values) == action_ucb_values).squeeze()
-        best_action_idx = np.random.randint(np.sum(boolean_idxs_with_highest_ucb))
-        best_action = np.array(actions)[boolean_idxs_with_highest_ucb][best_action_idx]
-        return best_action
+    def compute_ucb_values_array(self):
+        return self.ucb_parameter * alpha_zero_ucb(self.Nvisited, self.get_stats('N_sa'))
 
     def compute_ucb_value(self, action):
         return self.ucb_parameter * alpha_zero_ucb(self.Nvisited, self.N[action])
@@ -10,10 +10,10 @@ def alpha_zero_ucb(n, n_sa):
 
 class DiscreteTreeNodeWithPsa(DiscreteTreeNode):
     def __init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node, is_init_node, actions,
-                 learned_q):
+                 learned_q, stats_table=None):
         # psa is based on the number of objs to move
         DiscreteTreeNode.__init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node,
-                                  is_init_node, actions, learned_q)
+                                  is_init_node, actions, learned_q, stats_table)
         for a in self.A:
             self.Q[a] = 0
 
@@ -1,8 +1,9 @@
 from mcts_tree_continuous_node import ContinuousTreeNode
 from discrete_node_with_psa import DiscreteTreeNodeWithPsa
 from mcts_tree_discrete_pap_node import PaPDiscreteTreeNodeWithPriorQ
-from discrete_node_with_prior_q import DiscreteTreeNodeWithPriorQ
+from discrete_node_with_prior_q import DiscreteTreeNodeWithPriorQ, LearnedQValueCache
 from mcts_tree import MCTSTree
+from planners.transposition_table import StateFingerprint, TranspositionTable
 
 from generators.uniform import UniformPaPGenerator
 from generators.voo import PaPVOOGenerator
@@ -16,13 +17,11 @@ from gtamp_utils import utils
 
 
 import numpy as np
-import sys
 import socket
 import pickle
 import time
 import os
 
-sys.setrecursionlimit(15000)
 DEBUG = False
 
 hostname = socket.gethostname()
@@ -45,11 +44,17 @@ class MCTS:
         self.use_v_fcn = parameters.use_learned_q
         self.v_fcn = v_fcn
         self.learned_q = learned_q
+        self.learned_q_value_cache = None if learned_q is None else LearnedQValueCache()
         self.use_shaped_reward = parameters.use_shaped_reward
         self.planning_horizon = parameters.planning_horizon
         self.sampling_strategy = parameters.sampling_strategy
         self.explr_p = parameters.explr_p
         self.switch_frequency = parameters.switch_frequency
+        if parameters.use_transposition_table:
+            # nodes whose objects are at the same places share one abstract state
+            self.transposition_table = TranspositionTable()
+        else:
+            self.transposition_table = None
 
         # Hard-coded params
         self.check_reachability = True
@@ -62,7 +67,9 @@ class MCTS:
 
         # MCTS initialization
         self.s0_node = None
-        self.tree = MCTSTree(self.ucb_parameter)
+        self.node_to_search_from = None  # where the last search stopped, and its number of iterations so far
+        self.n_iter_done = 0
+        self.tree = MCTSTree(self.ucb_parameter, self.discount_rate)
         self.best_leaf_node = None
         self.goal_entities = goal_entities
 
@@ -131,6 +138,16 @@ class MCTS:
         return generator
 
     def compute_state(self, parent_node, parent_action):
+        if self.transposition_table is None or self.problem_env.is_goal_reached():
+            return self.compute_new_state(parent_node, parent_action)
+
+        fingerprint = StateFingerprint(utils.CustomStateSaver(self.problem_env.env), self.goal_entities)
+        entry = self.transposition_table.get(fingerprint)
+        if entry is None:
+            entry = self.transposition_table.put(fingerprint, self.compute_new_state(parent_node, parent_action))
+        return entry.get_state(None if parent_node is None else parent_node.state)
+
+    def compute_new_state(self, parent_node, parent_action):
         if self.problem_env.is_goal_reached():
             state = parent_node.state
         else:
@@ -190,10 +207,12 @@ class MCTS:
         if is_operator_skeleton_node:
             applicable_op_skeletons = self.problem_env.get_applicable_ops(parent_action)
             node = DiscreteTreeNodeWithPriorQ(state, self.ucb_parameter, depth, state_saver, is_operator_skeleton_node,
-                                              is_init_node, applicable_op_skeletons, self.learned_q)
+                                              is_init_node, applicable_op_skeletons, self.learned_q,
+                                              stats_table=self.tree.stats_table,
+                                              learned_q_value_cache=self.learned_q_value_cache)
         else:
             node = ContinuousTreeNode(state, parent_action, self.ucb_parameter, depth, state_saver,
-                                      is_operator_skeleton_node, is_init_node)
+                                      is_operator_skeleton_node, is_init_node, stats_table=self.tree.stats_table)
             node.sampling_agent = self.create_sampling_agent(node)
 
         node.parent = parent_node
@@ -272,7 +291,11 @@ class MCTS:
         else:
             return False
 
-    def search(self, n_iter=np.inf, iteration_for_tree_logging=0, node_to_search_from=None, max_time=np.inf):
+    def search(self, n_iter=np.inf, iteration_for_tree_logging=0, node_to_search_from=None, max_time=np.inf,
+               n_iter_done=0):
+        # n_iter_done is the number of iterations of the searches this one resumes from node_to_search_from, so that
+        # the node switches every switch_frequency iterations across them; self.node_to_search_from and
+        # self.n_iter_done are where this search stopped
         depth = 0
         time_to_search = 0
 
@@ -289,7 +312,8 @@ class MCTS:
         plan = []
         if n_iter == np.inf:
             n_iter = 999999
-        for iteration in range(1, n_iter):
+        self.n_iter_done = n_iter_done
+        for iteration in range(n_iter_done + 1, n_iter_done + n_iter):
             print '*****SIMULATION ITERATION %d' % iteration
             self.problem_env.reset_to_init_state(node_to_search_from)
 
@@ -298,6 +322,7 @@ class MCTS:
             self.simulate(node_to_search_from, node_to_search_from, depth, new_traj)
             time_to_search += time.time() - stime
             new_trajs.append(new_traj)
+            self.n_iter_done = iteration
 
             # note that I need to evaluate all actions in a node to switch
             is_time_to_switch_node = iteration % self.switch_frequency == 0  # and the node should be feasible
@@ -326,6 +351,7 @@ class MCTS:
                 print "Time is up"
                 break
 
+        self.node_to_search_from = node_to_search_from
         self.problem_env.reset_to_init_state(node_to_search_from)
         return self.search_time_to_reward, plan
 
@@ -335,7 +361,7 @@ class MCTS:
         for trj in trajectories:
             traj_sum_reward = 0
             for aidx, a in enumerate(trj):
-                traj_sum_reward += np.power(self.discount_rate, aidx) * curr_node.reward_history[a][0]
+                traj_sum_reward += np.power(self.discount_rate, aidx) * curr_node.get_reward(a)
                 curr_node = curr_node.children[a]
             traj_rewards.append(traj_sum_reward)
         return trajectories[np.argmax(traj_rewards)], curr_node
@@ -372,65 +398,96 @@ class MCTS:
         curr_node.reward = reward
 
     def simulate(self, curr_node, node_to_search_from, depth, new_traj):
-        if self.problem_env.reward_function.is_goal_reached():
-            if not curr_node.is_goal_and_already_visited:
-                self.found_solution = True
-                curr_node.is_goal_node = True
-                print "Solution found, returning the goal reward", self.problem_env.reward_function.goal_reward
-                self.update_goal_node_statistics(curr_node, self.problem_env.reward_function.goal_reward)
-            return self.problem_env.reward_function.goal_reward
-
-        if depth == self.planning_horizon:
-            # would it ever get here? why does it not satisfy the goal?
-            print "Depth limit reached"
-            return 0
+        # Descends from curr_node until the goal, the planning horizon, an infeasible action or a leaf evaluation,
+        # pushing the visited (node, action, reward) on a path, and then backs up the discounted return in one pass
+        # from the last visited node to node_to_search_from and its ancestors.
+        path = []
+        leaf_value = None  # value of the state reached by the last action on the path
+        is_leaf_value_discounted = True
+        while True:
+            if self.problem_env.reward_function.is_goal_reached():
+                if not curr_node.is_goal_and_already_visited:
+                    self.found_solution = True
+                    curr_node.is_goal_node = True
+                    print "Solution found, returning the goal reward", self.problem_env.reward_function.goal_reward
+                    self.update_goal_node_statistics(curr_node, self.problem_env.reward_function.goal_reward)
+                leaf_value = self.problem_env.reward_function.goal_reward
+                break
 
-        if DEBUG:
-            print "At depth ", depth
-            print "Is it time to pick?", self.problem_env.is_pick_time()
+            if depth == self.planning_horizon:
+                # would it ever get here? why does it not satisfy the goal?
+                print "Depth limit reached"
+                leaf_value = 0
+                break
 
-        action = self.choose_action(curr_node)
+            if DEBUG:
+                print "At depth ", depth
+                print "Is it time to pick?", self.problem_env.is_pick_time()
 
-        is_action_feasible = self.apply_action(curr_node, action)
+            action = self.choose_action(curr_node)
+            is_action_feasible = self.apply_action(curr_node, action)
 
-        if not curr_node.is_action_tried(action):
-            next_node = self.create_node(action, depth + 1, curr_node, not is_action_feasible)
-            self.tree.add_node(next_node, action, curr_node)
-            reward = self.problem_env.reward_function(curr_node.state, next_node.state, action, depth)
-            next_node.parent_action_reward = reward
-            next_node.sum_ancestor_action_rewards = next_node.parent.sum_ancestor_action_rewards + reward
-        else:
-            next_node = curr_node.children[action]
-            reward = next_node.parent_action_reward
+            is_tree_action = curr_node.is_action_tried(action)
+            if is_tree_action:
+                next_node = curr_node.children[action]
+                reward = next_node.parent_action_reward
+            else:
+                next_node = self.create_node(action, depth + 1, curr_node, not is_action_feasible)
+                reward = self.problem_env.reward_function(curr_node.state, next_node.state, action, depth)
+                self.tree.add_node(next_node, action, curr_node, reward)
+                next_node.parent_action_reward = reward
+                next_node.sum_ancestor_action_rewards = next_node.parent.sum_ancestor_action_rewards + reward
+
+            print "Reward", reward
+            path.append((curr_node, action, reward))
+
+            if not is_action_feasible:
+                # this (s,a) is a dead-end
+                print "Infeasible action"
+                leaf_value = self.get_infeasible_action_value(curr_node)
+                is_leaf_value_discounted = False
+                break
 
-        print "Reward", reward
+            leaf_value = self.get_leaf_value(curr_node, next_node, is_tree_action)
+            if leaf_value is not None:
+                is_leaf_value_discounted = False
+                break
+
+            curr_node = next_node
+            depth += 1
 
-        if not is_action_feasible:
-            # this (s,a) is a dead-end
-            print "Infeasible action"
-            if self.use_v_fcn:
-                sum_rewards = reward + curr_node.parent.v_fcn[curr_node.parent_action]
-                print sum_rewards
+        sum_rewards = leaf_value
+        for idx in range(len(path) - 1, -1, -1):
+            node, action, reward = path[idx]
+            if idx == len(path) - 1 and not is_leaf_value_discounted:
+                sum_rewards = reward + leaf_value
             else:
-                sum_rewards = reward
-        else:
-            sum_rewards = reward + self.discount_rate * self.simulate(next_node, node_to_search_from, depth + 1,
-                                                                      new_traj)
+                sum_rewards = reward + self.discount_rate * sum_rewards
+            node.update_node_statistics(action, sum_rewards, reward)
 
-        curr_node.update_node_statistics(action, sum_rewards, reward)
-        if curr_node == node_to_search_from and curr_node.parent is not None:
-            self.update_ancestor_node_statistics(curr_node.parent, curr_node.parent_action, sum_rewards)
+        if len(path) > 0 and path[0][0] == node_to_search_from and node_to_search_from.parent is not None:
+            self.update_ancestor_node_statistics(node_to_search_from.parent, node_to_search_from.parent_action,
+                                                 sum_rewards)
 
         # todo return a plan
         return sum_rewards
 
+    def get_infeasible_action_value(self, curr_node):
+        if self.use_v_fcn:
+            return curr_node.parent.v_fcn[curr_node.parent_action]
+        else:
+            return 0
+
+    def get_leaf_value(self, curr_node, next_node, is_tree_action):
+        # the value of next_node, if the simulation should stop at it instead of descending
+        return None
+
     def update_ancestor_node_statistics(self, node, action, child_sum_rewards):
-        if node is None:
-            return
-        parent_reward_to_node = node.reward_history[action][0]
-        parent_sum_rewards = parent_reward_to_node + self.discount_rate * child_sum_rewards
-        node.update_node_statistics(action, parent_sum_rewards, parent_reward_to_node)
-        self.update_ancestor_node_statistics(node.parent, node.parent_action, parent_sum_rewards)
+        while node is not None:
+            parent_reward_to_node = node.get_reward(action)
+            child_sum_rewards = parent_reward_to_node + self.discount_rate * child_sum_rewards
+            node.update_node_statistics(action, child_sum_rewards, parent_reward_to_node)
+            node, action = node.parent, node.parent_action
 
     def apply_action(self, node, action):
         if node.is_operator_skeleton_node:
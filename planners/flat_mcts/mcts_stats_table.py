@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class MCTSStatsTable:
+    """
+    Action statistics of all the nodes of an MCTS tree. Each node owns a contiguous range of slots, one per action in
+    node.A, so the statistics of a node are slices of the arrays below and UCB is computed with array operations.
+
+    N_sa: number of visits of (n,a)
+    Q_sa: Q(n,a); is_q_set tells which of them have been set
+    R_sa: reward of (n,a). The reward of an edge is computed once, when its child node is created
+    sum_R: sum of the rewards of all the visits of (n,a)
+    prior: prior of (n,a), for the nodes that use one
+    """
+
+    fields = ['N_sa', 'Q_sa', 'is_q_set', 'R_sa', 'sum_R', 'prior']
+
+    def __init__(self, capacity=1024):
+        self.N_sa = np.zeros((capacity,), dtype=np.int64)
+        self.Q_sa = np.zeros((capacity,))
+        self.is_q_set = np.zeros((capacity,), dtype=bool)
+        self.R_sa = np.zeros((capacity,))
+        self.sum_R = np.zeros((capacity,))
+        self.prior = np.zeros((capacity,))
+        self.n_slots = 0
+
+    def ensure_capacity(self, n_slots):
+        capacity = len(self.N_sa)
+        if n_slots <= capacity:
+            return
+        while capacity < n_slots:
+            capacity *= 2
+        for field in self.fields:
+            old_array = getattr(self, field)
+            new_array = np.zeros((capacity,), dtype=old_array.dtype)
+            new_array[:len(old_array)] = old_array
+            setattr(self, field, new_array)
+
+    def allocate(self, n_slots):
+        begin = self.n_slots
+        self.ensure_capacity(begin + n_slots)
+        self.n_slots += n_slots
+        return begin
+
+    def reallocate(self, begin, n_used_slots, n_slots):
+        # moves a range to the end of the table; the old range is not reused
+        new_begin = self.allocate(n_slots)
+        for field in self.fields:
+            array = getattr(self, field)
+            array[new_begin:new_begin + n_used_slots] = array[begin:begin + n_used_slots]
+        return new_begin
+
+
+class ActionStatsView(object):
+    """
+    Dict-like view of one of the statistics of a node, keyed by the actions of the node. If is_set_field is given, only
+    the actions whose slot is set in it are keys.
+    """
+
+    def __init__(self, node, field, is_set_field=None):
+        self.node = node
+        self.field = field
+        self.is_set_field = is_set_field
+
+    def get_is_set(self):
+        if self.is_set_field is None:
+            return np.ones((len(self.node.A),), dtype=bool)
+        return self.node.get_stats(self.is_set_field)
+
+    def keys(self):
+        return [a for a, is_set in zip(self.node.A, self.get_is_set()) if is_set]
+
+    def values(self):
+        return self.node.get_stats(self.field)[self.get_is_set()].tolist()
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return int(np.sum(self.get_is_set()))
+
+    def __contains__(self, action):
+        if id(action) not in self.node.action_idxs:
+            return False
+        return self.is_set_field is None or getattr(self.node.stats_table, self.is_set_field)[self.node.get_slot(action)]
+
+    def __getitem__(self, action):
+        if action not in self:
+            raise KeyError(action)
+        return getattr(self.node.stats_table, self.field)[self.node.get_slot(action)]
+
+    def __setitem__(self, action, value):
+        slot = self.node.get_slot(action)
+        getattr(self.node.stats_table, self.field)[slot] = value
+        if self.is_set_field is not None:
+            getattr(self.node.stats_table, self.is_set_field)[slot] = True
+
+
+class RewardHistoryView(ActionStatsView):
+    # rewards of the visits of the tried actions
+    def __init__(self, node):
+        ActionStatsView.__init__(self, node, 'R_sa')
+
+    def get_is_set(self):
+        return self.node.get_stats('N_sa') > 0
+
+    def __contains__(self, action):
+        return id(action) in self.node.action_idxs and self.node.stats_table.N_sa[self.node.get_slot(action)] > 0
+
+    def __getitem__(self, action):
+        if action not in self:
+            raise KeyError(action)
+        slot = self.node.get_slot(action)
+        return [self.node.stats_table.R_sa[slot]] * self.node.stats_table.N_sa[slot]
+
+    def values(self):
+        return [self[a] for a in self.keys()]
+
+    def __setitem__(self, action, value):
+        raise TypeError('Reward history is updated through update_node_statistics')
@@ -1,12 +1,30 @@
+import heapq
 import numpy as np
 from gtamp_utils.utils import get_body_xytheta, set_obj_xytheta, set_robot_config
 from planners.heuristics import get_objects_to_move
+from planners.flat_mcts.mcts_stats_table import MCTSStatsTable
 
 class MCTSTree:
-    def __init__(self, exploration_parameters):
+    def __init__(self, exploration_parameters, discount_factor=1.0):
         self.nodes = []
+        self.node_set = set()
         self.exploration_parameters = exploration_parameters
         self.root = None
+        self.stats_table = MCTSStatsTable()  # action statistics of all the nodes
+
+        # The best trajectory is tracked as nodes are added. Leaves only ever become non-leaves, so the heaps below
+        # keep the entries of the nodes that have gained children, and drop them when they come to the top.
+        self.discount_factor = discount_factor
+        self.leaves = set()
+        self.hcounts = {}
+        self.rewards = {}  # node -> reward of the action from its parent
+        self.n_added_nodes = 0
+        self.insertion_order = {}
+        self.hcount_heap = []  # (hcount, insertion order, node) of all the nodes
+        self.init_node = None
+        self.init_subtree_depths = {}  # node in the subtree of init_node -> its depth below init_node
+        self.init_subtree_sum_rewards = {}  # node in the subtree of init_node -> discounted rewards from init_node
+        self.best_heap = []  # (-sum rewards, hcount, insertion order, node) of the nodes in the subtree of init_node
 
     def make_tree_picklable(self):
         for node in self.nodes:
@@ -29,11 +47,14 @@ class MCTSTree:
     def set_root_node(self, root_node):
         self.root = root_node
         self.nodes.append(root_node)
+        self.node_set.add(root_node)
+        self.track_node(root_node, None)
 
     def has_state(self, state):
         return len([n for n in self.nodes if np.all(n.state == state)]) > 0
 
-    def add_node(self, node, action, parent):
+    def add_node(self, node, action, parent, reward):
+        # reward is the reward of the action from parent to node
         node.parent = parent
         parent.children[action] = node
         """
@@ -42,10 +63,55 @@ class MCTSTree:
         else:
             parent.children[make_action_hashable(action)] = node
         """
-        if node not in self.nodes:
+        if node not in self.node_set:
             self.nodes.append(node)
+            self.node_set.add(node)
+            self.track_node(node, reward)
         node.idx = len(self.nodes)
 
+    def track_node(self, node, reward):
+        self.leaves.discard(node.parent)
+        self.leaves.add(node)
+        self.hcounts[node] = self.get_node_hcount(node)
+        self.rewards[node] = reward
+        self.insertion_order[node] = self.n_added_nodes
+        self.n_added_nodes += 1
+        heapq.heappush(self.hcount_heap, (self.hcounts[node], self.insertion_order[node], node))
+        if node.parent in self.init_subtree_depths:
+            self.add_to_init_subtree(node)
+
+    def add_to_init_subtree(self, node):
+        parent_depth = self.init_subtree_depths[node.parent]
+        self.init_subtree_depths[node] = parent_depth + 1
+        self.init_subtree_sum_rewards[node] = self.init_subtree_sum_rewards[node.parent] \
+            + np.power(self.discount_factor, parent_depth) * self.rewards[node]
+        heapq.heappush(self.best_heap, (-self.init_subtree_sum_rewards[node], self.hcounts[node],
+                                        self.insertion_order[node], node))
+
+    def get_init_node(self):
+        if self.init_node is not None and self.init_node.is_init_node:
+            return self.init_node
+        init_nodes = [n for n in self.nodes if n.is_init_node]
+        return init_nodes[0] if len(init_nodes) > 0 else self.root
+
+    def reset_init_subtree(self, init_node):
+        # called when the init node changes, which is rare
+        self.init_node = init_node
+        self.init_subtree_depths = {init_node: 0}
+        self.init_subtree_sum_rewards = {init_node: 0.}
+        self.best_heap = [(0., self.hcounts[init_node], self.insertion_order[init_node], init_node)]
+        frontier = [init_node]
+        while len(frontier) > 0:
+            node = frontier.pop()
+            for child in node.children.values():
+                self.add_to_init_subtree(child)
+                frontier.append(child)
+
+    def get_top_leaf_entry(self, heap):
+        while heap[0][-1] not in self.leaves:
+            heapq.heappop(heap)
+        return heap[0]
+
     def is_node_just_added(self, node):
         if node == self.root:
             return False
@@ -67,6 +133,20 @@ class MCTSTree:
         return [n for n in self.nodes if n.is_operator_skeleton_node]
 
     def get_best_trajectory_sum_rewards_and_node(self, discount_factor):
+        # Returns the largest discounted sum of rewards from the init node to a leaf below it, the smallest hcount of
+        # the leaves, and the leaf with the largest sum of rewards; ties go to the smaller hcount.
+        if discount_factor != self.discount_factor:
+            return self._slow_best(discount_factor)
+
+        init_node = self.get_init_node()
+        if init_node is not self.init_node:
+            self.reset_init_subtree(init_node)
+        neg_best_sum_rewards, _, _, best_node = self.get_top_leaf_entry(self.best_heap)
+        progress = self.get_top_leaf_entry(self.hcount_heap)[0]
+        return -neg_best_sum_rewards, progress, best_node
+
+    def _slow_best(self, discount_factor):
+        # scans all the leaves; kept to check the incremental version against
         sumR_list = []
         leaf_nodes_for_curr_init_state = []
         leaf_nodes = self.get_leaf_nodes()
@@ -4,13 +4,14 @@ from planners.flat_mcts.mcts_tree_node import TreeNode
 
 
 def upper_confidence_bound(n, n_sa):
-    return 2 * np.sqrt(np.log(n) / float(n_sa))
+    return 2 * np.sqrt(np.log(n) / np.asarray(n_sa, dtype=float))
 
 
 class ContinuousTreeNode(TreeNode):
     def __init__(self, state, operator_skeleton, ucb_parameter, depth, state_saver, is_operator_skeleton_node,
-                 is_init_node):
-        TreeNode.__init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node, is_init_node)
+                 is_init_node, stats_table=None):
+        TreeNode.__init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node, is_init_node,
+                          stats_table)
         self.operator_skeleton = operator_skeleton
         self.max_sum_rewards = {}
 
@@ -18,8 +19,7 @@ class ContinuousTreeNode(TreeNode):
         new_action = Operator(operator_type=self.operator_skeleton.type,
                               discrete_parameters=self.operator_skeleton.discrete_parameters,
                               continuous_parameters=action)
-        self.A.append(new_action)
-        self.N[new_action] = 0
+        self.add_action_slots([new_action])
 
     def is_reevaluation_step(self, widening_parameter, infeasible_rwd, use_progressive_widening, use_ucb):
         n_arms = len(self.A)
@@ -53,7 +53,7 @@ class ContinuousTreeNode(TreeNode):
 
     def get_never_evaluated_action(self):
         # get list of actions that do not have an associated Q values
-        no_evaled = [a for a in self.A if a not in self.Q.keys()]
+        no_evaled = [self.A[idx] for idx in np.flatnonzero(~self.get_stats('is_q_set'))]
         no_evaled_feasible = [a for a in no_evaled if a.continuous_parameters['base_pose'] is not None]
         if len(no_evaled_feasible) == 0:
             return np.random.choice(no_evaled)
@@ -61,36 +61,19 @@ class ContinuousTreeNode(TreeNode):
             return np.random.choice(no_evaled_feasible)
 
     def perform_ucb_over_actions(self, qinit=None):
-        best_value = -np.inf
-        never_executed_actions_exist = len(self.Q) != len(self.A)
+        never_executed_actions_exist = not np.all(self.get_stats('is_q_set'))
 
         if never_executed_actions_exist:
             best_action = self.get_never_evaluated_action()
         else:
-            best_action = self.Q.keys()[0]
-            for action, value in zip(self.Q.keys(), self.Q.values()):
-                if action.continuous_parameters['base_pose'] is None:
-                    continue
+            has_base_pose = np.array([a.continuous_parameters['base_pose'] is not None for a in self.A])
+            if not np.any(has_base_pose):
+                return self.A[0]
+            ucb_values = self.get_stats('Q_sa') \
+                         + self.ucb_parameter * upper_confidence_bound(self.Nvisited, self.get_stats('N_sa'))
+            ucb_values[~has_base_pose] = -np.inf
 
-                ucb_value = value + self.ucb_parameter * upper_confidence_bound(self.Nvisited, self.N[action])
-
-                # todo randomized tie-break
-                if ucb_value > best_value:
-                    best_action = action
-                    best_value = ucb_value
+            # todo randomized tie-break
+            best_action = self.A[np.argmax(ucb_values)]
 
         return best_action
-
-    def update_node_statistics(self, action, sum_rewards, reward):
-        self.Nvisited += 1
-
-        is_action_never_tried = self.N[action] == 0
-        if is_action_never_tried:
-            self.reward_history[action] = [reward]
-            self.Q[action] = sum_rewards
-            self.N[action] += 1
-        else:
-            self.reward_history[action].append(reward)
-            self.N[action] += 1
-            if sum_rewards > self.Q[action]:
-                self.Q[action] = sum_rewards
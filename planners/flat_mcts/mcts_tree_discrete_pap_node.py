@@ -40,14 +40,11 @@ class PaPDiscreteTreeNodeWithPriorQ(DiscreteTreeNode):
         is_action_never_tried = self.N[action] == 0
         if is_action_never_tried:
             self.max_sum_rewards[action] = sum_rewards
-            self.reward_history[action] = [reward]
         else:
             if sum_rewards > self.max_sum_rewards[action]:
                 self.max_sum_rewards[action] = sum_rewards
-            self.reward_history[action].append(reward)
 
-        self.Nvisited += 1
-        self.N[action] += 1
+        self.record_visit(action, reward)
         temperature_on_action = np.power(self.mix_weight, self.N[action])
         self.Q[action] = temperature_on_action*self.Q[action] + (1 - temperature_on_action)*self.max_sum_rewards[action]
 
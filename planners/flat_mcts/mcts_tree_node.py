@@ -1,15 +1,25 @@
+import math
 import numpy as np
+from planners.flat_mcts.mcts_stats_table import MCTSStatsTable, ActionStatsView, RewardHistoryView
 
-def upper_confidence_bound(n, n_sa):
-    return np.sqrt(2 * np.log(n + 1) / float(n_sa + 1))
 
+def upper_confidence_bound(n, n_sa):
+    # n is a count, so the log is taken with math instead of numpy, which is much slower on scalars
+    return np.sqrt(2 * math.log(n + 1) / (n_sa + 1.0))
 
 
 class TreeNode:
-    def __init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node, is_init_node):
+    def __init__(self, state, ucb_parameter, depth, state_saver, is_operator_skeleton_node, is_init_node,
+                 stats_table=None):
+        # N(n,a), Q(n,a) and the rewards are stored in the slots of this node in stats_table, shared by the tree
+        self.stats_table = MCTSStatsTable(capacity=1) if stats_table is None else stats_table
+        self.stats_begin = self.stats_table.allocate(0)
+        self.stats_capacity = 0
+        self.action_idxs = {}  # id(action) -> index of the action in self.A, so that Operators are not hashed
+
         self.Nvisited = 0
-        self.N = {}  # N(n,a)
-        self.Q = {}  # Q(n,a)
+        self.N = ActionStatsView(self, 'N_sa')  # N(n,a)
+        self.Q = ActionStatsView(self, 'Q_sa', 'is_q_set')  # Q(n,a)
         self.A = []  # traversed actions
 
         self.state = state
@@ -18,7 +28,7 @@ class TreeNode:
         self.parent_action = None
         self.sum_ancestor_action_rewards = 0  # for logging purpose
         self.sum_rewards_history = {}  # for debugging purpose
-        self.reward_history = {}  # for debugging purpose
+        self.reward_history = RewardHistoryView(self)  # for debugging purpose
         self.ucb_parameter = ucb_parameter
         self.parent_motion = None
         self.is_init_node = False
@@ -37,6 +47,32 @@ class TreeNode:
         self.idx = 1
         self.state = state
 
+    def __setstate__(self, state):
+        # the ids of the actions change when a pickled tree is loaded
+        self.__dict__.update(state)
+        self.action_idxs = {id(action): idx for idx, action in enumerate(self.A)}
+
+    def add_action_slots(self, actions):
+        n_slots = len(self.A) + len(actions)
+        if n_slots > self.stats_capacity:
+            # grows geometrically for the nodes that keep adding actions
+            new_capacity = max(n_slots, 2 * self.stats_capacity)
+            self.stats_begin = self.stats_table.reallocate(self.stats_begin, len(self.A), new_capacity)
+            self.stats_capacity = new_capacity
+        for action in actions:
+            self.action_idxs[id(action)] = len(self.A)
+            self.A.append(action)
+
+    def get_slot(self, action):
+        return self.stats_begin + self.action_idxs[id(action)]
+
+    def get_stats(self, field):
+        # statistics of the actions in self.A; a view into the table, valid until the next slots are allocated
+        return getattr(self.stats_table, field)[self.stats_begin:self.stats_begin + len(self.A)]
+
+    def get_reward(self, action):
+        return self.stats_table.R_sa[self.get_slot(action)]
+
     def set_objects_in_collision(self, objects_in_collision):
         self.objects_in_collision = objects_in_collision
 
@@ -48,7 +84,7 @@ class TreeNode:
 
     def get_never_evaluated_action(self):
         # get list of actions that do not have an associated Q values
-        no_evaled = [a for a in self.A if a not in self.Q.keys()]
+        no_evaled = [self.A[idx] for idx in np.flatnonzero(~self.get_stats('is_q_set'))]
         return np.random.choice(no_evaled)
 
     def is_descendent_of(self, node):
@@ -86,22 +122,16 @@ class TreeNode:
         return value + self.ucb_parameter * upper_confidence_bound(self.Nvisited, self.N[action])
 
     def get_action_with_highest_ucb_value(self, feasible_actions, feasible_q_values):
-        best_value = -np.inf
-        best_action = feasible_actions[0]
-
-        for action, value in zip(feasible_actions, feasible_q_values):
-            ucb_value = self.compute_ucb_value(value, action)
+        n_sa = np.array([self.N[action] for action in feasible_actions])
+        ucb_values = np.asarray(feasible_q_values, dtype=float) \
+                     + self.ucb_parameter * upper_confidence_bound(self.Nvisited, n_sa)
+        return feasible_actions[self.choose_idx_with_highest_value(ucb_values)]
 
-            if ucb_value > best_value:
-                best_action = action
-                best_value = ucb_value
-
-        best_actions = []
-        for action, value in zip(feasible_actions, feasible_q_values):
-            ucb_value = self.compute_ucb_value(value, action)
-            if ucb_value == best_value:
-                best_actions.append(action)
-        return best_actions[np.random.randint(len(best_actions))]
+    @staticmethod
+    def choose_idx_with_highest_value(values):
+        # random tie-break
+        best_idxs = (values == values.max()).nonzero()[0]
+        return best_idxs[np.random.randint(len(best_idxs))]
 
     def compute_ucb_values(self, feasible_actions, feasible_q_values):
         ucb_values = {action: self.compute_ucb_value(value, action)
@@ -112,16 +142,18 @@ class TreeNode:
         return action in self.children
         # return action in self.Q.keys()
 
-    def update_node_statistics(self, action, sum_rewards, reward):
+    def record_visit(self, action, reward):
+        slot = self.get_slot(action)
+        if self.stats_table.N_sa[slot] == 0:
+            self.stats_table.R_sa[slot] = reward
+        self.stats_table.N_sa[slot] += 1
+        self.stats_table.sum_R[slot] += reward
         self.Nvisited += 1
 
-        is_action_never_tried = self.N[action] == 0
-        if is_action_never_tried:
-            self.reward_history[action] = [reward]
-            self.Q[action] = sum_rewards
-            self.N[action] += 1
-        else:
-            self.reward_history[action].append(reward)
-            self.N[action] += 1
-            if sum_rewards > self.Q[action]:
-                self.Q[action] = sum_rewards
+    def update_node_statistics(self, action, sum_rewards, reward):
+        slot = self.get_slot(action)
+        is_action_never_tried = self.stats_table.N_sa[slot] == 0
+        if is_action_never_tried or sum_rewards > self.stats_table.Q_sa[slot]:
+            self.stats_table.Q_sa[slot] = sum_rewards
+            self.stats_table.is_q_set[slot] = True
+        self.record_visit(action, reward)
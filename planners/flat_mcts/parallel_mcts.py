@@ -0,0 +1,291 @@
+import multiprocessing
+import traceback
+import random
+import time
+import numpy as np
+import openravepy
+
+from trajectory_representation.operator import Operator
+
+
+def get_entity_name(entity):
+    return str(entity.GetName()) if hasattr(entity, 'GetName') else entity
+
+
+def quantize_continuous_parameters(parameters, resolution):
+    # numeric values of a (nested) continuous parameter dict, rounded to the resolution, in the order of sorted keys
+    if isinstance(parameters, dict):
+        return tuple((key, quantize_continuous_parameters(parameters[key], resolution))
+                     for key in sorted(parameters.keys()))
+    if parameters is None or isinstance(parameters, (bool, np.bool_, str, unicode)):
+        return parameters
+    try:
+        values = np.asarray(parameters, dtype=float).ravel()
+    except (TypeError, ValueError):
+        return None  # e.g. motions
+    return tuple(np.round(values / resolution).astype(int).tolist())
+
+
+def get_action_signature(action, resolution):
+    discrete_parameters = tuple((key, get_entity_name(action.discrete_parameters[key]))
+                                for key in sorted(action.discrete_parameters.keys()))
+    if action.is_skeleton:
+        continuous_parameters = None
+    else:
+        continuous_parameters = quantize_continuous_parameters(action.continuous_parameters, resolution)
+    return action.type, discrete_parameters, continuous_parameters
+
+
+def make_operator_picklable(action):
+    discrete_parameters = {key: get_entity_name(value) for key, value in action.discrete_parameters.items()}
+    picklable = Operator(action.type, discrete_parameters, action.continuous_parameters)
+    picklable.is_skeleton = action.is_skeleton
+    return picklable
+
+
+def get_shared_slots(planner, resolution):
+    # statistics key -> (node, action) of the root actions and of the actions of the root's children
+    root = planner.s0_node
+    slots = {}
+    for root_action in root.A:
+        root_signature = get_action_signature(root_action, resolution)
+        slots[(root_signature,)] = (root, root_action)
+        if root_action in root.children:
+            child = root.children[root_action]
+            for child_action in child.A:
+                slots[(root_signature, get_action_signature(child_action, resolution))] = (child, child_action)
+    return slots
+
+
+class MCTSWorkerState:
+    def __init__(self, planner, resolution):
+        self.planner = planner
+        self.resolution = resolution
+        self.virtual_visits = {}  # statistics key -> number of visits of the other workers added to N(n,a)
+
+    def get_own_stats(self):
+        # the visits and Q of this worker's own simulations, without the virtual visits of the other workers
+        stats = {}
+        for key, (node, action) in get_shared_slots(self.planner, self.resolution).items():
+            slot = node.get_slot(action)
+            n_own = node.stats_table.N_sa[slot] - self.virtual_visits.get(key, 0)
+            if n_own > 0:
+                stats[key] = (n_own, node.stats_table.Q_sa[slot])
+        return stats
+
+    def apply_other_stats(self, other_stats):
+        # Visits of the other workers become virtual visits of this worker, which steer its UCB away from the actions
+        # they have searched. Q stays this worker's own: the max Q of the others is of trajectories that are not in
+        # this worker's tree, and taking it made all the workers select the same actions, so that they took as many
+        # iterations to a solution as a single process on the synthetic problem of the tests. Only the actions this
+        # worker has tried itself are updated, so that the first visit of an action, which records its reward, is
+        # always a real one.
+        for key, (node, action) in get_shared_slots(self.planner, self.resolution).items():
+            if key not in other_stats:
+                continue
+            n_others, _ = other_stats[key]
+            slot = node.get_slot(action)
+            if node.stats_table.N_sa[slot] - self.virtual_visits.get(key, 0) <= 0:
+                continue
+            n_new_virtual_visits = n_others - self.virtual_visits.get(key, 0)
+            node.stats_table.N_sa[slot] += n_new_virtual_visits
+            node.Nvisited += n_new_virtual_visits
+            self.virtual_visits[key] = n_others
+
+    def get_best_result(self):
+        planner = self.planner
+        best_sum_rewards, progress, _ = planner.tree.get_best_trajectory_sum_rewards_and_node(planner.discount_rate)
+        plan, _ = planner.retrace_best_plan()
+        root = planner.s0_node
+        root_q_actions = root.Q.keys()
+        if len(root_q_actions) > 0:
+            best_root_action = root_q_actions[np.argmax(root.Q.values())]
+            best_root_signature = get_action_signature(best_root_action, self.resolution)
+        else:
+            best_root_signature = None
+        return {'sum_rewards': best_sum_rewards,
+                'progress': progress,
+                'found_solution': planner.found_solution,
+                'plan': [make_operator_picklable(a) for a in plan],
+                'best_root_signature': best_root_signature,
+                'n_nodes': len(planner.tree.get_discrete_nodes())}
+
+
+def run_mcts_worker(conn, create_planner, seed, n_iter_per_round, resolution):
+    try:
+        # gtamp_utils.utils assumes a single environment per process
+        openravepy.RaveDestroy()
+        planner = create_planner()
+        np.random.seed(seed)
+        random.seed(seed)
+        worker = MCTSWorkerState(planner, resolution)
+        while True:
+            command, argument = conn.recv()
+            if command == 'stop':
+                break
+            other_stats, max_time = argument
+            if planner.s0_node is not None:
+                worker.apply_other_stats(other_stats)
+            # resumes where the last round stopped, so the worker switches nodes as the serial search does
+            planner.search(n_iter=n_iter_per_round + 1, node_to_search_from=planner.node_to_search_from,
+                           max_time=max_time, n_iter_done=planner.n_iter_done)
+            conn.send(('ok', (worker.get_own_stats(), worker.get_best_result())))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def merge_stats(worker_stats):
+    # statistics key -> (total number of visits, max Q), as the serial backup keeps the max of the returns
+    merged_stats = {}
+    for stats in worker_stats:
+        for key, (n, q) in stats.items():
+            if key in merged_stats:
+                n_merged, merged_q = merged_stats[key]
+                merged_stats[key] = (n_merged + n, max(merged_q, q))
+            else:
+                merged_stats[key] = (n, q)
+    return merged_stats
+
+
+def get_other_stats(worker_stats, worker_idx):
+    # merged own stats of all the workers but worker_idx
+    return merge_stats([stats for idx, stats in enumerate(worker_stats) if idx != worker_idx])
+
+
+class ParallelMCTS:
+    """
+    Root-parallel MCTS. Each of n_workers forked processes creates its own problem environment and planner with
+    create_planner, and searches from the same root with its own seed. After every n_iter_per_round iterations, the
+    workers send the statistics of the root actions and of the actions of the root's children to the driver, keyed by
+    the discrete parameters and the quantized continuous parameters of the actions. Workers only send the statistics
+    of their own simulations. The driver merges them into the total visits and the max Q, as in the serial backup, and
+    sends every worker the merged statistics of the others; the worker adds their visits to its own as virtual visits.
+    merged_stats holds the merged statistics of all the workers after the last round. Each worker resumes its search
+    where its last round stopped, so it switches the node to search from every switch_frequency iterations, as the
+    serial search does. Rounds are synchronous, so a run is deterministic given the seed.
+
+    plan_selection is 'best_trajectory', the best trajectory found by any worker, or 'majority_vote', the best plan
+    among the workers whose best root action is the one chosen by most workers.
+    """
+
+    def __init__(self, create_planner, n_workers, seed=0, n_iter_per_round=10, plan_selection='best_trajectory',
+                 resolution=1e-2, shutdown_timeout=60):
+        assert plan_selection in ['best_trajectory', 'majority_vote'], 'Invalid plan selection'
+        self.create_planner = create_planner
+        self.n_workers = n_workers
+        self.seed = seed
+        self.n_iter_per_round = n_iter_per_round
+        self.plan_selection = plan_selection
+        self.resolution = resolution
+        self.shutdown_timeout = shutdown_timeout
+
+        self.workers = []
+        self.conns = []
+        self.search_time_to_reward = []
+        self.merged_stats = {}
+
+    def start_workers(self):
+        for worker_idx in range(self.n_workers):
+            conn, worker_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=run_mcts_worker,
+                                             args=(worker_conn, self.create_planner, self.seed + worker_idx,
+                                                   self.n_iter_per_round, self.resolution))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+            self.conns.append(conn)
+
+    def receive(self, worker_idx, timeout):
+        conn = self.conns[worker_idx]
+        try:
+            is_ready = conn.poll(timeout)
+        except IOError:
+            is_ready = True  # the worker has exited; the error it sent before, if any, can still be read
+        if not is_ready:
+            raise RuntimeError('MCTS worker %d timed out' % worker_idx)
+        try:
+            status, result = conn.recv()
+        except (EOFError, IOError):
+            raise RuntimeError('MCTS worker %d exited' % worker_idx)
+        if status == 'error':
+            raise RuntimeError('MCTS worker %d failed:\n%s' % (worker_idx, result))
+        return result
+
+    def run_round(self, worker_stats, max_time):
+        for worker_idx, conn in enumerate(self.conns):
+            if conn.poll():
+                continue  # workers only send replies, so this is the error of a failed worker, read by receive
+            try:
+                conn.send(('search', (get_other_stats(worker_stats, worker_idx), max_time)))
+            except (IOError, OSError):
+                pass  # the worker has exited, and receive reports why
+        results = [self.receive(worker_idx, max_time + self.shutdown_timeout) for worker_idx in range(self.n_workers)]
+        return [stats for stats, _ in results], [best for _, best in results]
+
+    def select_plan(self, best_results):
+        best_trajectory_result = max(best_results, key=lambda result: result['sum_rewards'])
+        if self.plan_selection == 'best_trajectory':
+            return best_trajectory_result['plan']
+
+        signatures = [result['best_root_signature'] for result in best_results
+                      if result['best_root_signature'] is not None]
+        if len(signatures) == 0:
+            return best_trajectory_result['plan']
+        voted_signature = max(signatures, key=signatures.count)  # ties go to the first worker
+        voted_results = [result for result in best_results if result['best_root_signature'] == voted_signature]
+        return max(voted_results, key=lambda result: result['sum_rewards'])['plan']
+
+    def search(self, max_time=np.inf, n_rounds=np.inf):
+        # returns the plan chosen with plan_selection; plan is [] if no worker has found a solution
+        stime = time.time()
+        self.start_workers()
+        try:
+            worker_stats = [{} for _ in range(self.n_workers)]
+            best_results = []
+            n_rounds_done = 0
+            while n_rounds_done < n_rounds:
+                remaining_time = max_time - (time.time() - stime)
+                if remaining_time <= 0:
+                    print "Time is up"
+                    break
+                worker_stats, best_results = self.run_round(worker_stats, remaining_time)
+                self.merged_stats = merge_stats(worker_stats)
+                n_rounds_done += 1
+
+                best_sum_rewards = max(result['sum_rewards'] for result in best_results)
+                progress = min(result['progress'] for result in best_results)
+                found_solution = any(result['found_solution'] for result in best_results)
+                # same columns as MCTS.search_time_to_reward; iterations are counted per worker
+                self.search_time_to_reward.append([time.time() - stime, n_rounds_done * self.n_iter_per_round,
+                                                   best_sum_rewards, progress, found_solution])
+                print 'Round %d best sum rewards %.2f' % (n_rounds_done, best_sum_rewards)
+                if found_solution:
+                    print "Solution found"
+                    break
+
+            if len(best_results) == 0 or not any(result['found_solution'] for result in best_results):
+                plan = []
+            else:
+                plan = self.select_plan([result for result in best_results if result['found_solution']])
+            self.n_nodes = sum(result['n_nodes'] for result in best_results)
+        finally:
+            self.close()
+        return self.search_time_to_reward, plan
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(('stop', None))
+            except (IOError, OSError):
+                pass  # the worker is gone
+        for worker in self.workers:
+            worker.join(self.shutdown_timeout)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        for conn in self.conns:
+            conn.close()
+        self.workers = []
+        self.conns = []
@@ -14,12 +14,23 @@ def get_goal_objs_not_in_goal_region(state, problem_env):
     return not_in_goal
 
 
-def get_objects_to_move(state, problem_env):
+def compute_occlusion_closure(state, problem_env):
+    """
+    Returns a dict with
+        objects_to_move: goal objects not in the goal region, and every object that is, transitively, in the way of
+                         picking one of them or of placing it to a region
+        goal_objs_not_in_goal_region
+        occluders: object to move -> objects in the way of picking it or of placing it to any region
+    """
     objects_to_move = set()
+    occluders = {}
     potential_obj_to_move_queue = Queue.Queue()
 
-    # Putting goal objects that are not in the goal region to objects_to_move set
-    goal_objs_not_in_goal_region = get_goal_objs_not_in_goal_region(state, problem_env)
+    # Putting goal objects that are not in the goal region to objects_to_move set. States record them when they are
+    # created, so that the result does not depend on the configuration the environment is in when this is called
+    goal_objs_not_in_goal_region = getattr(state, 'goal_objs_not_in_goal_region', None)
+    if goal_objs_not_in_goal_region is None:
+        goal_objs_not_in_goal_region = get_goal_objs_not_in_goal_region(state, problem_env)
     for entity in goal_objs_not_in_goal_region:
         potential_obj_to_move_queue.put(entity)
 
@@ -36,6 +47,7 @@ def get_objects_to_move(state, problem_env):
         obj_to_move = potential_obj_to_move_queue.get()
         if obj_to_move not in objects_to_move:
             objects_to_move.add(obj_to_move)
+            occluders[obj_to_move] = []
             for o2 in object_names:
                 # OccludesPre
                 is_o2_in_way_of_obj_to_move = state.binary_edges[(o2, obj_to_move)][1]
@@ -59,9 +71,19 @@ def get_objects_to_move(state, problem_env):
                     n_occludes_manip += 1
 
                 if is_o2_in_way_of_obj_to_move or is_o2_in_way_of_obj_to_move_to_any_region:
+                    occluders[obj_to_move].append(o2)
                     potential_obj_to_move_queue.put(o2)
     #print "n occludes pre %d n occludes manip %d" % (n_occludes_pre, n_occludes_manip)
-    return objects_to_move
+    return {
+        'objects_to_move': objects_to_move,
+        'goal_objs_not_in_goal_region': goal_objs_not_in_goal_region,
+        'occluders': occluders
+    }
+
+
+def get_objects_to_move(state, problem_env):
+    # computed once per state, and shared by every heuristic and tree node that evaluates it
+    return state.get_occlusion_closure()['objects_to_move']
 
 
 def compute_hcount(state, problem_env):
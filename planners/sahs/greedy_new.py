@@ -1,5 +1,4 @@
 import time
-import pickle
 import Queue
 import numpy as np
 from node import Node
@@ -10,14 +9,10 @@ from generators.TwoArmPaPGeneratory import TwoArmPaPGenerator
 from generators.one_arm_pap_uniform_generator import OneArmPaPUniformGenerator
 
 from trajectory_representation.operator import Operator
+from planners.transposition_table import StateFingerprint, get_transposition_table
 
 from helper import get_actions, compute_heuristic, get_state_class, update_search_queue
 
-prm_vertices, prm_edges = pickle.load(open('prm.pkl', 'rb'))
-prm_vertices = list(prm_vertices)  # TODO: needs to be a list rather than ndarray
-
-connected = np.array([len(s) >= 2 for s in prm_edges])
-prm_indices = {tuple(v): i for i, v in enumerate(prm_vertices)}
 DISABLE_COLLISIONS = False
 MAX_DISTANCE = 1.0
 counter = 1
@@ -66,6 +61,24 @@ def sample_continuous_parameters(abstract_action, abstract_state, abstract_node,
     return smpled_param
 
 
+def get_new_state(statecls, mover, goal, node, action):
+    # Returns the state that action from node reached, or None if the transposition table has it from a plan that is
+    # not longer than this one. A state already reached by a longer plan is reused rather than recomputed.
+    transposition_table = get_transposition_table()
+    if transposition_table is None:
+        return statecls(mover, goal, node.state, action)
+
+    fingerprint = StateFingerprint(utils.CustomStateSaver(mover.env), goal)
+    entry = transposition_table.get(fingerprint)
+    plan_length = node.depth
+    if entry is None:
+        entry = transposition_table.put(fingerprint, statecls(mover, goal, node.state, action))
+    elif entry.best_cost <= plan_length:
+        return None
+    entry.best_cost = plan_length
+    return entry.get_state(node.state)
+
+
 def search(mover, config, pap_model, goal_objs, goal_region_name, learned_smpler=None, reachability_clf=None):
     tt = time.time()
     goal_region = mover.placement_regions[goal_region_name]
@@ -81,6 +94,8 @@ def search(mover, config, pap_model, goal_objs, goal_region_name, learned_smpler
     state = statecls(mover, goal)
     [utils.set_color(o, [1, 0, 0]) for o in goal_objs]
     initnode = Node(None, None, state)
+    if get_transposition_table() is not None:
+        get_transposition_table().put(StateFingerprint(utils.CustomStateSaver(mover.env), goal), state).best_cost = 0
     actions = get_actions(mover, goal, config)
 
     nodes = [initnode]
@@ -148,8 +163,12 @@ def search(mover, config, pap_model, goal_objs, goal_region_name, learned_smpler
 
                 return nodes_to_goal, plan, iter, nodes
             else:
-                newstate = statecls(mover, goal, node.state, action)
-                print "New state computed"
+                newstate = get_new_state(statecls, mover, goal, node, action)
+                if newstate is None:
+                    print "Skipping a state already reached by a plan that is not longer"
+                    continue
+                print "New state computed. Predicates reused %d recomputed %d, pick paths reused %d" \
+                      % (newstate.n_predicates_reused, newstate.n_predicates_recomputed, newstate.n_pick_paths_reused)
                 newnode = Node(node, action, newstate)
                 newactions = get_actions(mover, goal, config)
                 update_search_queue(newstate, newactions, newnode, search_queue, pap_model, mover, config)
@@ -206,10 +225,11 @@ def search(mover, config, pap_model, goal_objs, goal_region_name, learned_smpler
                     plan = [nd.action for nd in nodes_to_goal[1:]] + [action]
                     return nodes_to_goal, plan, iter, nodes
                 else:
-                    newstate = statecls(mover, goal, node.state, action)
-                    newnode = Node(node, action, newstate)
-                    newactions = get_actions(mover, goal, config)
-                    update_search_queue(newstate, newactions, newnode, search_queue, pap_model, mover, config)
+                    newstate = get_new_state(statecls, mover, goal, node, action)
+                    if newstate is not None:
+                        newnode = Node(node, action, newstate)
+                        newactions = get_actions(mover, goal, config)
+                        update_search_queue(newstate, newactions, newnode, search_queue, pap_model, mover, config)
 
             if not success:
                 print('failed to execute action')
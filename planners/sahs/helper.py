@@ -1,4 +1,4 @@
-from learn.data_traj import extract_individual_example
+from learn.data_traj import extract_individual_example, extract_state_features
 from planners.heuristics import compute_hcount_with_action, compute_hcount, get_goal_objs_not_in_goal_region
 from trajectory_representation.shortest_path_pick_and_place_state import ShortestPathPaPState
 from trajectory_representation.one_arm_pap_state import OneArmPaPState
@@ -37,6 +37,40 @@ def compute_q_bonus(state, nodes, edges, actions, pap_model, problem_env):
     return q_bonus
 
 
+def compute_q_vals(pap_model, nodes, edges, a_raw_forms):
+    # one forward pass for all actions; the state's nodes and edges are repeated along the batch dimension
+    n_actions = len(a_raw_forms)
+    nodes = np.repeat(nodes[None, ...], n_actions, axis=0)
+    edges = np.repeat(edges[None, ...], n_actions, axis=0)
+    q_vals = pap_model.predict_with_raw_input_format(nodes, edges, np.array(a_raw_forms))
+    return np.asarray(q_vals).reshape((n_actions,))
+
+
+def compute_bonus_vals(q_vals):
+    return np.exp(np.where(np.abs(q_vals) > 10, q_vals / 100.0, q_vals))
+
+
+def compute_q_bonuses(state, nodes, edges, a_raw_forms, pap_model, problem_env):
+    # compute_q_bonus for each of a_raw_forms. Like compute_q_bonus, which got the applicable actions with
+    # get_actions, it draws one permutation of them per action and sums the other actions' bonuses in that order, so
+    # the random number stream of a seeded run is the same as with compute_q_bonus
+    entity_names = list(state.nodes.keys())[::-1]
+    all_a_raw_forms = np.array([convert_action_to_predictable_form(a, entity_names)
+                                for a in problem_env.get_applicable_ops()])
+    a_raw_forms = np.array(a_raw_forms)
+    q_vals = compute_q_vals(pap_model, nodes, edges, np.concatenate([all_a_raw_forms, a_raw_forms], axis=0))
+    bonus_vals_on_all_actions = compute_bonus_vals(q_vals[:len(all_a_raw_forms)])
+    bonus_vals = compute_bonus_vals(q_vals[len(all_a_raw_forms):])
+
+    is_same_action = np.all((all_a_raw_forms[None, ...] == a_raw_forms[:, None, ...]).reshape(
+        (len(a_raw_forms), len(all_a_raw_forms), -1)), axis=-1)
+    sum_bonus_vals_on_other_actions = np.zeros((len(a_raw_forms),))
+    for aidx in range(len(a_raw_forms)):
+        order = np.random.permutation(len(all_a_raw_forms))
+        sum_bonus_vals_on_other_actions[aidx] = np.sum(bonus_vals_on_all_actions[order][~is_same_action[aidx][order]])
+    return bonus_vals / (sum_bonus_vals_on_other_actions + bonus_vals)
+
+
 def get_state_class(domain):
     if domain == 'two_arm_mover':
         statecls = ShortestPathPaPState
@@ -55,7 +89,7 @@ def get_state_class(domain):
     return statecls
 
 
-def compute_heuristic(state, action, pap_model, problem_env, config):
+def get_target_object_and_region(action):
     is_two_arm_domain = 'two_arm_' in action.type
     if is_two_arm_domain:
         target_o = action.discrete_parameters['object']
@@ -63,18 +97,28 @@ def compute_heuristic(state, action, pap_model, problem_env, config):
     else:
         target_o = action.discrete_parameters['object'].GetName()
         target_r = action.discrete_parameters['place_region'].name
+    return target_o, target_r
 
-    nodes, edges, actions, _ = extract_individual_example(state, action)
-    nodes = nodes[..., 6:]
-
-    region_is_goal = state.nodes[target_r][8]
 
+def get_goal_objs_and_region(state, problem_env):
     if 'two_arm' in problem_env.name:
         goal_objs = [tmp_o for tmp_o in state.goal_entities if 'box' in tmp_o]
         goal_region = 'home_region'
     else:
         goal_objs = [tmp_o for tmp_o in state.goal_entities if 'region' not in tmp_o]
         goal_region = 'rectangular_packing_box1_region'
+    return goal_objs, goal_region
+
+
+def compute_heuristic(state, action, pap_model, problem_env, config):
+    target_o, target_r = get_target_object_and_region(action)
+
+    nodes, edges, actions, _ = extract_individual_example(state, action)
+    nodes = nodes[..., 6:]
+
+    region_is_goal = state.nodes[target_r][8]
+
+    goal_objs, goal_region = get_goal_objs_and_region(state, problem_env)
 
     h_option = config.h_option
 
@@ -87,17 +131,13 @@ def compute_heuristic(state, action, pap_model, problem_env, config):
     elif h_option == 'state_hcount':
         hval = compute_hcount(state, problem_env)
     elif h_option == 'qlearned_hcount_new_number_in_goal':
-        number_in_goal = compute_new_number_in_goal(state, goal_objs, goal_region)
+        number_in_goal = compute_new_number_in_goal(state)
         q_bonus = compute_q_bonus(state, nodes, edges, actions, pap_model, problem_env)
         hcount = compute_hcount(state, problem_env)
         obj_already_in_goal = state.binary_edges[(target_o, goal_region)][0]
         hval = -number_in_goal + obj_already_in_goal + hcount - config.mixrate * q_bonus
     elif h_option == 'qlearned_hcount_old_number_in_goal':
         number_in_goal = compute_number_in_goal(state, target_o, problem_env, region_is_goal)
-
-        nodes, edges, actions, _ = extract_individual_example(state, action)  # why do I call this again?
-        nodes = nodes[..., 6:]
-
         q_bonus = compute_q_bonus(state, nodes, edges, actions, pap_model, problem_env)
         hcount = compute_hcount(state, problem_env)
         obj_already_in_goal = state.binary_edges[(target_o, goal_region)][0]  # The target object is already in goal
@@ -109,7 +149,7 @@ def compute_heuristic(state, action, pap_model, problem_env, config):
         obj_already_in_goal = state.binary_edges[(target_o, goal_region)][0]
         hval = -number_in_goal - q_val_on_curr_a + obj_already_in_goal
     elif h_option == 'config.qlearned_new_number_in_goal':
-        number_in_goal = compute_new_number_in_goal(state, goal_objs, goal_region)
+        number_in_goal = compute_new_number_in_goal(state)
         q_val_on_curr_a = pap_model.predict_with_raw_input_format(nodes[None, ...], edges[None, ...],
                                                                   actions[None, ...])
         obj_already_in_goal = state.binary_edges[(target_o, goal_region)][0]
@@ -124,6 +164,53 @@ def compute_heuristic(state, action, pap_model, problem_env, config):
     return hval
 
 
+def compute_heuristics(state, actions, pap_model, problem_env, config):
+    """
+    Returns [compute_heuristic(state, a, pap_model, problem_env, config) for a in actions]. For the learned
+    heuristics, the state's features and hcount are computed once and the Q-values of all actions come from a
+    single forward pass.
+    """
+    h_option = config.h_option
+    uses_q_bonus = h_option in ['qlearned_hcount_new_number_in_goal', 'qlearned_hcount_old_number_in_goal']
+    uses_q_val = h_option in ['qlearned_old_number_in_goal', 'config.qlearned_new_number_in_goal',
+                              'config.pure_learned_q']
+    if len(actions) == 0 or not (uses_q_bonus or uses_q_val):
+        return [compute_heuristic(state, a, pap_model, problem_env, config) for a in actions]
+
+    nodes, edges, entity_names = extract_state_features(state)
+    nodes = nodes[..., 6:]
+    a_raw_forms = [convert_action_to_predictable_form(a, entity_names) for a in actions]
+    if uses_q_bonus:
+        q_bonuses = compute_q_bonuses(state, nodes, edges, a_raw_forms, pap_model, problem_env)
+        hcount = compute_hcount(state, problem_env)
+    else:
+        q_vals = compute_q_vals(pap_model, nodes, edges, a_raw_forms)
+
+    goal_objs, goal_region = get_goal_objs_and_region(state, problem_env)
+    uses_new_number_in_goal = h_option in ['qlearned_hcount_new_number_in_goal', 'config.qlearned_new_number_in_goal']
+    if uses_new_number_in_goal:
+        new_number_in_goal = compute_new_number_in_goal(state)  # it does not depend on the action
+    hvals = []
+    for aidx, action in enumerate(actions):
+        target_o, target_r = get_target_object_and_region(action)
+        region_is_goal = state.nodes[target_r][8]
+        if uses_new_number_in_goal:
+            number_in_goal = new_number_in_goal
+        elif h_option != 'config.pure_learned_q':
+            number_in_goal = compute_number_in_goal(state, target_o, problem_env, region_is_goal)
+
+        if uses_q_bonus:
+            obj_already_in_goal = state.binary_edges[(target_o, goal_region)][0]
+            hval = -number_in_goal + obj_already_in_goal + hcount - config.mixrate * q_bonuses[aidx]
+        elif h_option == 'config.pure_learned_q':
+            hval = -q_vals[aidx]
+        else:
+            obj_already_in_goal = state.binary_edges[(target_o, goal_region)][0]
+            hval = -number_in_goal - q_vals[aidx] + obj_already_in_goal
+        hvals.append(hval)
+    return hvals
+
+
 def compute_number_in_goal(state, target_o, problem_env, region_is_goal):
     number_in_goal = 0
     for i in state.nodes:
@@ -167,17 +254,17 @@ def count_pickable_goal_objs_and_placeable_to_goal_region_not_yet_in_goal_region
 
 def update_search_queue(state, actions, node, action_queue, pap_model, mover, config):
     print "Enqueuing..."
-    for a in actions:
-        hval = compute_heuristic(state, a, pap_model, mover, config)
-        if config.gather_planning_exp:
-            h_for_sampler_training = compute_hcount(state, mover)
-            num_in_goal = compute_new_number_in_goal(state)
-            # hcount recursively counts the number of objects obstructing the way to the goal objs not in the goal reigon
-            # This can potentially have error in estimating the cost-to-go, because even a single object not in a goal
-            # can have all objects in its way, since our motion planner is not optimal in MCR sense.
-            # So, I have to track the number of objects in goal.
-            node.h_for_sampler_training = h_for_sampler_training - num_in_goal
+    hvals = compute_heuristics(state, actions, pap_model, mover, config)
+    if config.gather_planning_exp:
+        h_for_sampler_training = compute_hcount(state, mover)
+        num_in_goal = compute_new_number_in_goal(state)
+        # hcount recursively counts the number of objects obstructing the way to the goal objs not in the goal reigon
+        # This can potentially have error in estimating the cost-to-go, because even a single object not in a goal
+        # can have all objects in its way, since our motion planner is not optimal in MCR sense.
+        # So, I have to track the number of objects in goal.
+        node.h_for_sampler_training = h_for_sampler_training - num_in_goal
 
+    for a, hval in zip(actions, hvals):
         discrete_params = (a.discrete_parameters['object'], a.discrete_parameters['place_region'])
         node.set_heuristic(discrete_params, hval)
         action_queue.put((hval, float('nan'), a, node))  # initial q
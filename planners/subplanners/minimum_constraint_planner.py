@@ -1,7 +1,38 @@
 from planners.subplanners.motion_planner import BaseMotionPlanner, ArmBaseMotionPlanner
+from gtamp_utils import utils
+from gtamp_utils.motion_planner import PRMGoal
+from gtamp_utils.prm_graph import get_prm_graph
+from gtamp_utils.prm_search import prm_minimum_constraint_search
+from gtamp_utils.prm_collision_map import PRMCollisionMap
+from gtamp_utils.collision_cache import get_collision_cache, compute_holding_state_hash
+from openravepy import DOFAffine
 import time
 
 
+class PRMCollisionsAtCurrentConfiguration:
+    """
+    PRM vertices in collision with each object, kept across MinimumConstraintPlanner instances. Only the objects that
+    moved since the last call, or all of them if the robot's holding state changed, are recomputed.
+    """
+
+    def __init__(self):
+        self.holding_state_hash = None
+        self.collides = {}  # (obj_name, rounded pose) -> set of PRM vertices, for the poses of the last call
+
+    def get(self, problem_env):
+        holding_state_hash = compute_holding_state_hash(problem_env.robot)
+        if holding_state_hash != self.holding_state_hash:
+            self.holding_state_hash = holding_state_hash
+            self.collides = {}
+        collision_map = PRMCollisionMap(problem_env, get_prm_graph().vertices, cache=get_collision_cache())
+        self.collides, current_collides = collision_map.compute_collisions(problem_env.objects,
+                                                                          parent_collides=self.collides)
+        return current_collides
+
+
+prm_collisions_at_current_configuration = PRMCollisionsAtCurrentConfiguration()
+
+
 class MinimumConstraintPlanner(BaseMotionPlanner, ArmBaseMotionPlanner):
     def __init__(self, problem_env, target_object, planning_algorithm):
         BaseMotionPlanner.__init__(self, problem_env, planning_algorithm)
@@ -10,6 +41,46 @@ class MinimumConstraintPlanner(BaseMotionPlanner, ArmBaseMotionPlanner):
         else:
             self.target_object = target_object
 
+    def compute_prm_collisions(self, cached_collisions):
+        # obj_name -> set of PRM vertices in collision, in the format of the states' current_collides
+        if cached_collisions is not None:
+            return cached_collisions
+        return prm_collisions_at_current_configuration.get(self.problem_env)
+
+    def compute_minimum_constraint_path(self, goal_configuration, cached_collisions=None):
+        """
+        One search over the PRM for the path through the fewest objects, with the target object as a hard obstacle.
+        Returns (path, names of the objects that the PRM part of the path passes through), or (None, None).
+        """
+        prm_graph = get_prm_graph()
+        self.problem_env.robot.SetActiveDOFs([], DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis, [0, 0, 1])
+        q_init = utils.get_body_xytheta(self.problem_env.robot).squeeze()
+        goal = PRMGoal(goal_configuration, prm_graph)
+        direct_path = goal.get_direct_path(q_init)
+        if direct_path is not None:
+            return direct_path, []
+        is_connected_to_goal, _ = goal.get_goal_test_and_heuristic()
+        if is_connected_to_goal is None:
+            return None, None
+
+        collisions = self.compute_prm_collisions(cached_collisions)
+        target_name = None if self.target_object is None else self.target_object.GetName()
+        obj_names = [obj_name for obj_name in collisions if obj_name != target_name]
+        vertex_object_masks = [0] * prm_graph.n_vertices
+        for obj_idx, obj_name in enumerate(obj_names):
+            for vertex in collisions[obj_name]:
+                vertex_object_masks[vertex] |= 1 << obj_idx
+        target_collisions = collisions[target_name] if target_name in collisions else set()
+
+        start = [idx for idx in prm_graph.get_vertices_close_to(q_init, xy_threshold=0.8, th_threshold=360.).tolist()
+                 if idx not in target_collisions]
+        vertex_path, object_mask = prm_minimum_constraint_search(start, is_connected_to_goal, vertex_object_masks,
+                                                                 lambda vertex: vertex in target_collisions, prm_graph)
+        if vertex_path is None:
+            return None, None
+        objs_in_way = [obj_name for obj_idx, obj_name in enumerate(obj_names) if object_mask & (1 << obj_idx)]
+        return goal.make_path(q_init, vertex_path), objs_in_way
+
     def approximate_minimal_collision_path(self, goal_configuration, path_ignoring_all_objects,
                                            collisions_in_path_ignoring_all_objects, cached_collisions):
         enabled_objects = {obj.GetName() for obj in self.problem_env.objects}
@@ -55,6 +126,11 @@ class MinimumConstraintPlanner(BaseMotionPlanner, ArmBaseMotionPlanner):
 
     def get_motion_plan(self, goal_configuration, region_name='entire_region', n_iterations=None,
                         cached_collisions=None):
+        if self.problem_env.name.find('one_arm') == -1 and self.algorithm == 'prm':
+            path, _ = self.compute_minimum_constraint_path(goal_configuration, cached_collisions)
+            if path is not None:
+                return path, 'HasSolution'
+
         path_ignoring_obstacles = self.compute_path_ignoring_obstacles(goal_configuration)
 
         naive_path_collisions = self.problem_env.get_objs_in_collision(path_ignoring_obstacles, 'entire_region')
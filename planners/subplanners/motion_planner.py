@@ -1,7 +1,7 @@
 from openravepy import DOFAffine
 from gtamp_utils.motion_planner import collision_fn, base_extend_fn, base_sample_fn, base_distance_fn, \
-    rrt_connect, prm_connect, rrt_region, arm_base_sample_fn, arm_base_distance_fn, \
-    arm_base_extend_fn
+    base_distances_fn, CollisionMemo, rrt_connect, prm_connect, prm_connect_to_goals, rrt_region, arm_base_sample_fn, \
+    arm_base_distance_fn, arm_base_extend_fn
 
 from gtamp_utils import utils
 
@@ -18,8 +18,11 @@ class BaseMotionPlanner(MotionPlanner):
     def __init__(self, problem_env, algorithm):
         MotionPlanner.__init__(self, problem_env)
         self.algorithm = algorithm
+        self.n_collision_checks = 0
+        self.n_saved_collision_checks = 0
 
-    def get_motion_plan(self, goal, region_name='entire_region', n_iterations=None, cached_collisions=None, source=''):
+    def get_motion_plan(self, goal, region_name='entire_region', n_iterations=None, cached_collisions=None, source='',
+                        collision_memo=None):
         self.problem_env.robot.SetActiveDOFs([], DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis, [0, 0, 1])
 
         if region_name == 'bridge_region':
@@ -30,6 +33,7 @@ class BaseMotionPlanner(MotionPlanner):
         region_x_extents = self.problem_env.problem_config[region_name + '_extents'][0]
         region_y_extents = self.problem_env.problem_config[region_name + '_extents'][1]
         d_fn = base_distance_fn(self.problem_env.robot, x_extents=region_x_extents, y_extents=region_y_extents)
+        batch_d_fn = base_distances_fn(self.problem_env.robot, x_extents=region_x_extents, y_extents=region_y_extents)
         s_fn = base_sample_fn(self.problem_env.robot, x_extents=region_x_extents, y_extents=region_y_extents,
                               x=region_x, y=region_y)
 
@@ -54,12 +58,23 @@ class BaseMotionPlanner(MotionPlanner):
             #assert cached_collisions is None
             if not isinstance(goal, list):
                 goal = [goal]
+            # shared by all of the restarts and goals below, and by the earlier calls that were given collision_memo
+            if collision_memo is None:
+                collision_memo = CollisionMemo(c_fn)
+            n_checks, n_saved_checks = collision_memo.n_checks, collision_memo.n_saved_checks
+            c_fn = collision_memo
             for n_iter in n_iterations:
                 #print n_iter
                 for g in goal:
-                    path = planning_algorithm(q_init, g, d_fn, s_fn, e_fn, c_fn, iterations=n_iter)
+                    path = planning_algorithm(q_init, g, d_fn, s_fn, e_fn, c_fn, iterations=n_iter,
+                                              distances=batch_d_fn)
                     if path is not None:
-                        return path, 'HasSolution'
+                        status = 'HasSolution'
+                        break
+                if path is not None:
+                    break
+            self.n_collision_checks += c_fn.n_checks - n_checks
+            self.n_saved_collision_checks += c_fn.n_saved_checks - n_saved_checks
         else:
             planning_algorithm = prm_connect
             path = planning_algorithm(q_init, goal, c_fn, source)
@@ -68,6 +83,21 @@ class BaseMotionPlanner(MotionPlanner):
 
         return path, status
 
+    def print_stats(self):
+        print "RRT collision checks %d, saved by memo %d" % (self.n_collision_checks, self.n_saved_collision_checks)
+
+    def get_motion_plans_to_goals(self, goals, cached_collisions):
+        # one PRM search tree from the current robot base pose answers all of the goals
+        assert self.algorithm == 'prm'
+        self.problem_env.robot.SetActiveDOFs([], DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis, [0, 0, 1])
+        c_fn = set()
+        for tmp in cached_collisions.values():
+            c_fn = c_fn.union(tmp)
+
+        q_init = utils.get_body_xytheta(self.problem_env.robot).squeeze()
+        paths = prm_connect_to_goals(q_init, goals, c_fn)
+        return [(path, 'NoSolution' if path is None else 'HasSolution') for path in paths]
+
 
 class ArmBaseMotionPlanner(MotionPlanner):
     def __init__(self, problem_env, algorithm):
@@ -0,0 +1,138 @@
+import copy
+import hashlib
+import collections
+import numpy as np
+
+transposition_table = None
+
+
+def get_transposition_table():
+    return transposition_table
+
+
+def set_transposition_table(table):
+    global transposition_table
+    transposition_table = table
+
+
+class StateFingerprint:
+    """
+    Abstract-state key of an environment configuration: the object and robot base poses of a CustomStateSaver, with x
+    and y rounded to xy_tolerance and theta to theta_tolerance, the held object and the goal entities. The robot base
+    pose is part of it because the reachability, the pick paths and the in-way predicates of a state depend on it, so
+    action sequences share a fingerprint only if they leave the objects at the same places and the robot at the same
+    base pose, e.g. placing A then B and B then A from the same standing pose in the goal region.
+    The tolerances default to the 1e-6 rounding of the object poses in the PRM collision keys, so that only placements
+    that restore to the same poses share a state, and with it the restore, the paths and the collisions of the state.
+    key is the 128-bit md5 digest of the rest, and two fingerprints are equal only if all of their fields are.
+    """
+
+    def __init__(self, state_saver, goal_entities, xy_tolerance=1e-6, theta_tolerance=1e-6):
+        object_names = sorted(name for name in state_saver.object_poses.keys() if name != state_saver.robot_name)
+        self.xy_tolerance = xy_tolerance
+        self.theta_tolerance = theta_tolerance
+        poses = np.zeros((len(object_names), 3), dtype=np.int64)
+        for idx, name in enumerate(object_names):
+            x, y, _, theta = np.asarray(state_saver.object_poses[name]).squeeze()
+            poses[idx] = self.quantize(x, y, theta)
+
+        self.object_names = tuple(object_names)
+        self.poses = poses
+        self.robot_pose = self.quantize(*np.asarray(state_saver.robot_base_pose).squeeze())
+        self.held_object = state_saver.held_object
+        self.goal_entities = tuple(sorted(goal_entities))
+
+        md5 = hashlib.md5()
+        md5.update(str(self.object_names))
+        md5.update(self.poses.tostring())
+        md5.update(self.robot_pose.tostring())
+        md5.update(str(self.held_object))
+        md5.update(str(self.goal_entities))
+        self.key = md5.hexdigest()
+
+    def quantize(self, x, y, theta):
+        n_theta_bins = int(np.round(2 * np.pi / self.theta_tolerance))
+        return np.array([np.round(x / self.xy_tolerance), np.round(y / self.xy_tolerance),
+                         np.round(np.mod(theta, 2 * np.pi) / self.theta_tolerance) % n_theta_bins], dtype=np.int64)
+
+    def __eq__(self, other):
+        # the pose arrays are compared in full, in case two different states share a key
+        return isinstance(other, StateFingerprint) and self.key == other.key \
+               and self.object_names == other.object_names and np.array_equal(self.poses, other.poses) \
+               and np.array_equal(self.robot_pose, other.robot_pose) \
+               and self.held_object == other.held_object and self.goal_entities == other.goal_entities
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+class TranspositionEntry:
+    def __init__(self, fingerprint, state):
+        self.fingerprint = fingerprint
+        self.state = state
+        self.n_visits = 1  # number of times the state has been reached
+        self.best_cost = np.inf  # smallest cost the state has been reached with, for the planners that track one
+
+    def get_state(self, parent_state):
+        # the state of the entry links to the parent it was computed from; a path through another parent gets a shallow
+        # copy that shares the predicates and paths, and links to that parent, which make_pklable and make_plannable
+        # follow
+        if getattr(self.state, 'parent_state', None) is parent_state:
+            return self.state
+        state = copy.copy(self.state)
+        state.parent_state = parent_state
+        return state
+
+
+class TranspositionTable:
+    """
+    Map from StateFingerprint to the abstract state computed for it, and the statistics shared by every path that
+    reaches it. At most max_entries states are kept; the least recently used ones are evicted.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()  # fingerprint key -> TranspositionEntry, least recently used first
+
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_collisions = 0
+        self.n_evictions = 0
+        self.max_n_entries = 0
+
+    def get(self, fingerprint):
+        # returns the entry of fingerprint, or None
+        entry = self.entries.get(fingerprint.key)
+        if entry is not None and entry.fingerprint != fingerprint:
+            self.n_collisions += 1
+            entry = None
+        if entry is None:
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        entry.n_visits += 1
+        del self.entries[fingerprint.key]
+        self.entries[fingerprint.key] = entry
+        return entry
+
+    def put(self, fingerprint, state):
+        entry = TranspositionEntry(fingerprint, state)
+        if fingerprint.key in self.entries:
+            del self.entries[fingerprint.key]
+        self.entries[fingerprint.key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.n_evictions += 1
+        self.max_n_entries = max(self.max_n_entries, len(self.entries))
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def print_stats(self):
+        n_queries = self.n_hits + self.n_misses
+        print "Transposition table hits %d / %d, %d entries (peak %d, %d evicted), %d hash collisions" \
+              % (self.n_hits, n_queries, len(self.entries), self.max_n_entries, self.n_evictions, self.n_collisions)
@@ -4,6 +4,7 @@ from torch.utils.data import Dataset
 import os
 import pickle
 import numpy as np
+from gtamp_utils.prm_graph import get_prm_graph
 from gtamp_utils import utils
 import torch
 
@@ -81,21 +82,14 @@ class ReachabilityDataset(Dataset):
 class GNNReachabilityDataset(ReachabilityDataset):
     def __init__(self, action_type):
         super(GNNReachabilityDataset, self).__init__(action_type)
-        self.prm_vertices, self.prm_edges = pickle.load(open('prm.pkl', 'r'))
+        prm_graph = get_prm_graph()
+        self.prm_vertices = prm_graph.vertices
         #self.prm_vertices = np.zeros((len(self.tmp_prm_vertices), 4))
         #for pidx, p in enumerate(self.tmp_prm_vertices):
         #    self.prm_vertices[pidx] = utils.encode_pose_with_sin_and_cos_angle(p)
         self.gnn_vertices = self.prm_vertices
         self.collisions = self.collisions.squeeze()
-
-        edges = [[], []]
-        for src_idx, _ in enumerate(self.prm_vertices):
-            neighbors = list(self.prm_edges[src_idx])
-            n_edges = len(neighbors)
-            edges[0] += [src_idx] * n_edges
-            edges[1] += neighbors
-            # How to make sure it is bidrectional?
-        self.edges = np.array(edges)
+        self.edges = prm_graph.get_edge_index()
 
     def __getitem__(self, idx):
         if type(idx) is int:
@@ -1,4 +1,6 @@
 import os
+import time
+import subprocess
 
 from multiprocessing.pool import ThreadPool  # dummy is nothing but multiprocessing but wrapper around threading
 from test_scripts.run_greedy import parse_arguments
@@ -17,6 +19,24 @@ def worker_p(config):
     os.system(command)
 
 
+def start_model_server(params):
+    # loads the models once for all of the run_greedy.py processes
+    command = ['python', './test_scripts/run_model_server.py']
+    for key, value in params.items():
+        if key == 'pidxs' or value is False or value is None:
+            continue
+        command.append('-' + str(key))
+        if value is not True:
+            command.append(str(value))
+    if os.path.exists(params['model_server']):
+        os.remove(params['model_server'])  # left by a server that was terminated
+    server = subprocess.Popen(command)
+    while not os.path.exists(params['model_server']):
+        assert server.poll() is None, 'Model server exited'
+        time.sleep(1)
+    return server
+
+
 def worker_wrapper_multi_input(multi_args):
     return worker_p(multi_args)
 
@@ -27,6 +47,10 @@ def main():
     pidx_begin = params.pidxs[0]
     pidx_end = params.pidxs[1]
     params = vars(params)
+    if params['model_server'] is not None:
+        model_server = start_model_server(params)
+    else:
+        model_server = None
     configs = []
     for pidx in range(pidx_begin, pidx_end):
         config = {}
@@ -35,7 +59,7 @@ def main():
             if key == 'pidxs':
                 continue
 
-            if value is False:
+            if value is False or value is None:
                 continue
             elif value is True:
                 config[key] = ""
@@ -46,6 +70,8 @@ def main():
     n_workers = 1 #multiprocessing.cpu_count()
     pool = ThreadPool(n_workers)
     results = pool.map(worker_wrapper_multi_input, configs)
+    if model_server is not None:
+        model_server.terminate()
 
 
 if __name__ == '__main__':
@@ -17,9 +17,16 @@ from planners.subplanners.motion_planner import BaseMotionPlanner
 from generators.learning.utils.model_creation_utils import create_policy
 from generators.reachability_predictor import ReachabilityPredictor
 from gtamp_utils import utils
+from gtamp_utils.collision_cache import PersistentCollisionCache, set_collision_cache
+from generators.feasibility_checkers.two_arm_ik_cache import TwoArmIKCache, set_two_arm_ik_cache, \
+    get_two_arm_ik_cache
+from generators.feasibility_checkers.parallel_feasibility_checker import ParallelPaPFeasibilityChecker, \
+    set_parallel_feasibility_checker, get_parallel_feasibility_checker
+from gtamp_utils.model_server import ModelClient, RemoteModel
 
 #from test_scripts.visualize_learned_sampler import create_policy
 from planners.sahs.greedy_new import search
+from planners.transposition_table import TranspositionTable, get_transposition_table, set_transposition_table
 from learn.pap_gnn import PaPGNN
 
 from test_reachability_clf import load_weights
@@ -115,6 +122,12 @@ def parse_arguments():
     parser.add_argument('-f', action='store_true', default=False)
     parser.add_argument('-problem_type', type=str, default='normal')  # was used for non-monotonic planning case
     parser.add_argument('-gather_planning_exp', action='store_true', default=False)  # sets the allowed time to infinite
+    parser.add_argument('-use_collision_cache', action='store_true', default=False)  # shares PRM collisions across runs
+    parser.add_argument('-use_two_arm_ik_cache', action='store_true', default=False)  # warm-starts from two_arm_ikcache.pkl
+    parser.add_argument('-n_feasibility_workers', type=int, default=0)  # processes for IK and collision checks of samples
+    parser.add_argument('-parallel_motion_planning', action='store_true', default=False)  # uses the same processes
+    parser.add_argument('-model_server', type=str, default=None)  # socket of run_model_server.py; skips model loading
+    parser.add_argument('-use_transposition_table', action='store_true', default=False)  # skips duplicate states
 
     # planning budget setup
     parser.add_argument('-num_node_limit', type=int, default=3000)
@@ -247,6 +260,45 @@ def get_learned_smpler(sampler_seed, epoch, algo):
     return policy
 
 
+def get_reachability_nets():
+    device = torch.device("cpu")
+    edges = pickle.load(open('prm_edges_for_reachability_gnn.pkl', 'r'))
+    pick_net = GNNReachabilityNet(edges, n_key_configs=618, device=device, n_msg_passing=0)
+    place_net = GNNReachabilityNet(edges, n_key_configs=618, device=device, n_msg_passing=0)
+    load_weights(pick_net, 24, 'pick', 1, 0, device)
+    load_weights(place_net, 35, 'place', 1, 0, device)
+    return pick_net, place_net
+
+
+def get_model_names(config):
+    model_names = []
+    if 'qlearned' in config.h_option:
+        model_names.append('pap_model')
+    if config.integrated or config.integrated_unregularized_sampler:
+        model_names += ['pick', 'place_loading', 'place_home']
+    if config.use_reachability_clf:
+        model_names += ['pick_net', 'place_net']
+    return model_names
+
+
+def load_models(problem_env, config):
+    # model name -> model, for the models used with config
+    model_names = get_model_names(config)
+    models = {}
+    if 'pap_model' in model_names:
+        models['pap_model'] = get_pap_gnn_model(problem_env, config)
+    if 'pick' in model_names:
+        models.update(get_learned_smpler(config.sampler_seed, config.sampler_epoch, config.sampler_algo))
+    if 'pick_net' in model_names:
+        models['pick_net'], models['place_net'] = get_reachability_nets()
+    return models
+
+
+def get_remote_models(config):
+    client = ModelClient(config.model_server)
+    return {model_name: RemoteModel(client, model_name) for model_name in get_model_names(config)}
+
+
 def make_pklable(plan):
     for p in plan:
         obj = p.discrete_parameters['object']
@@ -291,28 +343,32 @@ def main():
     goal_region = 'home_region'
     problem_env = get_problem_env(config, goal_region, goal_objs)
     set_problem_env_config(problem_env, config)
+    if config.use_collision_cache:
+        set_collision_cache(PersistentCollisionCache('./collision_cache.db'))
+    if config.use_two_arm_ik_cache:
+        set_two_arm_ik_cache(TwoArmIKCache('./two_arm_ikcache.pkl'))
+    if config.use_transposition_table:
+        set_transposition_table(TranspositionTable())
+    if config.n_feasibility_workers > 0 and config.domain == 'two_arm_mover':
+        set_parallel_feasibility_checker(ParallelPaPFeasibilityChecker(problem_env, config.n_feasibility_workers,
+                                                                       config.parallel_motion_planning))
     if config.v:
         utils.viewer()
 
-    is_use_gnn = 'qlearned' in config.h_option
-    if is_use_gnn:
-        pap_model = get_pap_gnn_model(problem_env, config)
+    if config.model_server is not None:
+        models = get_remote_models(config)
     else:
-        pap_model = None
+        models = load_models(problem_env, config)
+    pap_model = models.get('pap_model')
 
-    if config.integrated or config.integrated_unregularized_sampler:
-        smpler = get_learned_smpler(config.sampler_seed, config.sampler_epoch, config.sampler_algo)
+    if 'pick' in models:
+        smpler = {'pick': models['pick'], 'place_loading': models['place_loading'],
+                  'place_home': models['place_home']}
     else:
         smpler = None
 
-    if config.use_reachability_clf:
-        device = torch.device("cpu")
-        edges = pickle.load(open('prm_edges_for_reachability_gnn.pkl', 'r'))
-        pick_net = GNNReachabilityNet(edges, n_key_configs=618, device=device, n_msg_passing=0)
-        place_net = GNNReachabilityNet(edges, n_key_configs=618, device=device, n_msg_passing=0)
-        load_weights(pick_net, 24, 'pick', 1, 0, device)
-        load_weights(place_net, 35, 'place', 1, 0, device)
-        reachability_predictor = ReachabilityPredictor(pick_net, place_net)
+    if 'pick_net' in models:
+        reachability_predictor = ReachabilityPredictor(models['pick_net'], models['place_net'])
     else:
         reachability_predictor = None
 
@@ -322,6 +378,14 @@ def main():
                                                    reachability_predictor)
     tottime = time.time() - t
     success = plan is not None
+    problem_env.motion_planner.print_stats()
+    if config.use_two_arm_ik_cache:
+        get_two_arm_ik_cache().print_stats()
+        get_two_arm_ik_cache().save()
+    if get_transposition_table() is not None:
+        get_transposition_table().print_stats()
+    if get_parallel_feasibility_checker() is not None:
+        get_parallel_feasibility_checker().close()
     plan_length = len(plan) if success else 0
     if success and config.domain == 'one_arm_mover':
         make_pklable(plan)
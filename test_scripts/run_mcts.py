@@ -15,6 +15,7 @@ from gtamp_problem_environments.reward_functions.reward_function import GenericR
 from gtamp_problem_environments.reward_functions.packing_problem.reward_function import ShapedRewardFunction
 from planners.flat_mcts.mcts import MCTS
 from planners.flat_mcts.mcts_with_leaf_strategy import MCTSWithLeafStrategy
+from planners.flat_mcts.parallel_mcts import ParallelMCTS
 from planners.heuristics import compute_hcount_with_action, get_objects_to_move
 
 
@@ -87,6 +88,10 @@ def parse_mover_problem_parameters():
     parser.add_argument('-f', action='store_true', default=False)  # what was this?
     parser.add_argument('-sampling_strategy', type=str, default='uniform')
     parser.add_argument('-use_shaped_reward', action='store_true', default=False)
+    parser.add_argument('-n_mcts_workers', type=int, default=0)  # root-parallel search with this many processes
+    parser.add_argument('-n_iter_per_merge', type=int, default=10)  # iterations between statistic merges
+    parser.add_argument('-plan_selection', type=str, default='best_trajectory')  # or majority_vote
+    parser.add_argument('-use_transposition_table', action='store_true', default=False)  # shares states across paths
 
     parameters = parser.parse_args()
     return parameters
@@ -144,11 +149,7 @@ def load_learned_q(config, problem_env):
     return pap_model
 
 
-def main():
-    parameters = parse_mover_problem_parameters()
-    filename = 'pidx_%d_planner_seed_%d.pkl' % (parameters.pidx, parameters.planner_seed)
-    save_dir = make_and_get_save_dir(parameters, filename)
-
+def create_planner(parameters):
     set_seed(parameters.pidx)
     problem_env = PaPMoverEnv(parameters.pidx)
 
@@ -183,11 +184,32 @@ def main():
         planner = MCTSWithLeafStrategy(parameters, problem_env, goal_entities, v_fcn, learned_q)
     else:
         raise NotImplementedError
+    return planner
+
 
-    set_seed(parameters.planner_seed)
-    search_time_to_reward, plan = planner.search(max_time=parameters.timelimit)
+def main():
+    parameters = parse_mover_problem_parameters()
+    filename = 'pidx_%d_planner_seed_%d.pkl' % (parameters.pidx, parameters.planner_seed)
+    save_dir = make_and_get_save_dir(parameters, filename)
+
+    if parameters.n_mcts_workers > 0:
+        # each worker creates its own environment and planner
+        planner = ParallelMCTS(lambda: create_planner(parameters), parameters.n_mcts_workers,
+                               seed=parameters.planner_seed, n_iter_per_round=parameters.n_iter_per_merge,
+                               plan_selection=parameters.plan_selection)
+        search_time_to_reward, plan = planner.search(max_time=parameters.timelimit)
+        n_nodes = planner.n_nodes
+    else:
+        planner = create_planner(parameters)
+        set_seed(parameters.planner_seed)
+        search_time_to_reward, plan = planner.search(max_time=parameters.timelimit)
+        n_nodes = len(planner.tree.get_discrete_nodes())
+        if planner.transposition_table is not None:
+            planner.transposition_table.print_stats()
+        if planner.learned_q_value_cache is not None:
+            planner.learned_q_value_cache.print_stats()
     pickle.dump({"search_time_to_reward": search_time_to_reward, 'plan': plan,
-                 'n_nodes': len(planner.tree.get_discrete_nodes())}, open(save_dir+filename, 'wb'))
+                 'n_nodes': n_nodes}, open(save_dir+filename, 'wb'))
 
 
 if __name__ == '__main__':
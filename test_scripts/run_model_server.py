@@ -0,0 +1,28 @@
+import sys
+
+from test_scripts.run_greedy import parse_arguments, get_problem_env, load_models
+from gtamp_utils.model_server import ModelServer, DEFAULT_ADDRESS
+
+
+def main():
+    # Takes the same arguments as run_greedy.py, and loads the models that run_greedy.py would load with them.
+    # Planners connect with run_greedy.py -model_server <address>.
+    config = parse_arguments()
+    address = config.model_server if config.model_server is not None else DEFAULT_ADDRESS
+
+    goal_objs = ['square_packing_box1', 'square_packing_box2', 'rectangular_packing_box3', 'rectangular_packing_box4']
+    problem_env = get_problem_env(config, 'home_region', goal_objs)  # for the entity names of the Q-function
+    models = load_models(problem_env, config)
+    if len(models) == 0:
+        print "No models to serve with the given arguments"
+        sys.exit(-1)
+
+    server = ModelServer(models, address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print "Served %d requests with %d model calls" % (server.n_requests, server.n_calls)
+
+
+if __name__ == '__main__':
+    main()
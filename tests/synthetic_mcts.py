@@ -0,0 +1,254 @@
+import os
+import sys
+import time
+import contextlib
+import numpy as np
+
+from gtamp_utils import utils
+from planners.flat_mcts.mcts import MCTS
+from trajectory_representation.operator import Operator
+
+REGIONS = ['loading_region', 'home_region']
+GOAL_REGION = 'home_region'
+
+
+def get_object_names(n_objects):
+    return ['obj%d' % idx for idx in range(n_objects)]
+
+
+class SyntheticState:
+    # stands in for ShortestPathPaPState; the objects are either in the goal region or not
+    def __init__(self, problem_env, objects_in_goal_region):
+        self.problem_env = problem_env
+        self.objects_in_goal_region = objects_in_goal_region
+        self.goal_entities = problem_env.object_names + [GOAL_REGION]
+        # geometric features, then IsObj, IsRoom, IsGoal, IsReachable and IsHoldingGoalEntity
+        self.nodes = {o: list(np.random.rand(6)) + [True, False, True, True, False] for o in problem_env.object_names}
+        self.nodes.update({r: [0] * 6 + [False, True, r == GOAL_REGION, True, False] for r in REGIONS})
+        # InRegion and PlaceFree
+        self.binary_edges = {(o, r): [o in objects_in_goal_region and r == GOAL_REGION, 1]
+                             for o in problem_env.object_names for r in REGIONS}
+        # PlaceInWay
+        self.ternary_edges = {(o, other, r): [0] for o in problem_env.object_names
+                              for other in problem_env.object_names for r in REGIONS}
+
+    def is_entity_reachable(self, obj_name):
+        return True
+
+    def get_occlusion_closure(self):
+        return {'objects_to_move': [o for o in self.problem_env.object_names if o not in self.objects_in_goal_region]}
+
+
+class SyntheticStateSaver:
+    # stands in for CustomStateSaver, which create_node calls on problem_env.env
+    def __init__(self, problem_env):
+        self.objects_in_goal_region = problem_env.objects_in_goal_region
+
+
+class SyntheticRewardFunction:
+    goal_reward = 10
+    infeasible_reward = -2
+
+    def __init__(self, problem_env):
+        self.problem_env = problem_env
+
+    def is_goal_reached(self):
+        return self.problem_env.is_goal_reached()
+
+    def __call__(self, curr_state, next_state, action, depth):
+        if next_state is None:
+            return self.infeasible_reward
+        if action.is_skeleton:
+            return 0
+        return -1 + action.continuous_parameters['x']
+
+
+class SyntheticMoverEnv:
+    """
+    Mover problem without geometry. A placement in the goal region succeeds if its continuous parameter x is above
+    0.4, and a sample is feasible with probability p_feasible. Each sample takes step_time seconds, which stands in
+    for its motion planning.
+    """
+    name = 'two_arm_mover'
+
+    def __init__(self, n_objects=4, p_feasible=0.8, step_time=0.):
+        self.object_names = get_object_names(n_objects)
+        self.p_feasible = p_feasible
+        self.step_time = step_time
+        self.objects_in_goal_region = frozenset()
+        self.env = self
+        self.robot = None
+        self.reward_function = SyntheticRewardFunction(self)
+
+    def reset_to_init_state(self, node):
+        self.objects_in_goal_region = node.state_saver.objects_in_goal_region
+
+    def is_goal_reached(self):
+        return len(self.objects_in_goal_region) == len(self.object_names)
+
+    def get_applicable_ops(self, parent_op=None):
+        return [Operator('two_arm_pick_two_arm_place', {'object': o, 'region': r})
+                for o in self.object_names for r in REGIONS]
+
+    def apply_operator_skeleton(self, state, operator_skeleton):
+        return True
+
+    def apply_operator_instance(self, state, operator_instance, check_reachability=True):
+        if self.step_time > 0:
+            time.sleep(self.step_time)
+        if not operator_instance.continuous_parameters['is_feasible']:
+            return False
+        if operator_instance.discrete_parameters['region'] == GOAL_REGION \
+                and operator_instance.continuous_parameters['x'] > 0.4:
+            self.objects_in_goal_region = self.objects_in_goal_region | {operator_instance.discrete_parameters['object']}
+        return True
+
+
+class SyntheticParameters:
+    def __init__(self, planning_horizon=8, use_transposition_table=False, switch_frequency=100000):
+        self.widening_parameter = 0.5
+        self.ucb_parameter = 1.0
+        self.timelimit = np.inf
+        self.n_motion_plan_trials = 1
+        self.use_ucb = True
+        self.pw = True
+        self.n_feasibility_checks = 1
+        self.use_learned_q = False
+        self.use_shaped_reward = False
+        self.planning_horizon = planning_horizon
+        self.sampling_strategy = 'uniform'
+        self.explr_p = 0.3
+        self.switch_frequency = switch_frequency
+        self.use_transposition_table = use_transposition_table
+
+
+class SyntheticLearnedQ:
+    # learned q of the predicates of a state, which counts its forward passes; each forward pass takes
+    # forward_pass_time, as a call into the network does
+    def __init__(self, forward_pass_time=0.):
+        self.n_predictions = 0
+        self.forward_pass_time = forward_pass_time
+
+    def compute_q_value(self, state, op_skeleton):
+        obj_name = op_skeleton.discrete_parameters['object']
+        region_name = op_skeleton.discrete_parameters['region']
+        return float(region_name == GOAL_REGION) - state.binary_edges[(obj_name, region_name)][0] \
+            + 0.1 * int(obj_name[3:])
+
+    def predict(self, state, op_skeleton):
+        time.sleep(self.forward_pass_time)
+        return self.compute_q_value(state, op_skeleton)
+
+    def predict_batch(self, state, op_skeletons):
+        self.n_predictions += 1
+        time.sleep(self.forward_pass_time)
+        return np.array([self.compute_q_value(state, op_skeleton) for op_skeleton in op_skeletons])
+
+
+class SyntheticMCTS(MCTS):
+    # samples the continuous parameters from np.random instead of running a generator, and searches for all of n_iter
+    # unless stop_at_solution
+    def __init__(self, parameters, problem_env, learned_q=None, stop_at_solution=False):
+        MCTS.__init__(self, parameters, problem_env, problem_env.object_names + [GOAL_REGION], None, learned_q)
+        self.chosen_actions = []
+        self.stop_at_solution = stop_at_solution
+
+    def compute_state(self, parent_node, parent_action):
+        return SyntheticState(self.problem_env, self.problem_env.objects_in_goal_region)
+
+    def create_sampling_agent(self, node):
+        return 'synthetic'
+
+    def sample_continuous_parameters(self, node):
+        return {'is_feasible': np.random.rand() < self.problem_env.p_feasible, 'base_pose': 1, 'x': np.random.rand()}
+
+    def choose_action(self, curr_node):
+        action = MCTS.choose_action(self, curr_node)
+        self.chosen_actions.append(get_action_key(action))
+        return action
+
+    def is_optimal_solution_found(self):
+        return self.stop_at_solution and self.found_solution
+
+
+class RecursiveMCTS(SyntheticMCTS):
+    # MCTS.simulate and update_ancestor_node_statistics as they were before they became loops
+    def simulate(self, curr_node, node_to_search_from, depth, new_traj):
+        if self.problem_env.reward_function.is_goal_reached():
+            if not curr_node.is_goal_and_already_visited:
+                self.found_solution = True
+                curr_node.is_goal_node = True
+                self.update_goal_node_statistics(curr_node, self.problem_env.reward_function.goal_reward)
+            return self.problem_env.reward_function.goal_reward
+
+        if depth == self.planning_horizon:
+            return 0
+
+        action = self.choose_action(curr_node)
+        is_action_feasible = self.apply_action(curr_node, action)
+
+        if not curr_node.is_action_tried(action):
+            next_node = self.create_node(action, depth + 1, curr_node, not is_action_feasible)
+            reward = self.problem_env.reward_function(curr_node.state, next_node.state, action, depth)
+            self.tree.add_node(next_node, action, curr_node, reward)
+            next_node.parent_action_reward = reward
+            next_node.sum_ancestor_action_rewards = next_node.parent.sum_ancestor_action_rewards + reward
+        else:
+            next_node = curr_node.children[action]
+            reward = next_node.parent_action_reward
+
+        if not is_action_feasible:
+            sum_rewards = reward
+        else:
+            sum_rewards = reward + self.discount_rate * self.simulate(next_node, node_to_search_from, depth + 1,
+                                                                      new_traj)
+
+        curr_node.update_node_statistics(action, sum_rewards, reward)
+        if curr_node == node_to_search_from and curr_node.parent is not None:
+            self.update_ancestor_node_statistics(curr_node.parent, curr_node.parent_action, sum_rewards)
+        return sum_rewards
+
+    def update_ancestor_node_statistics(self, node, action, child_sum_rewards):
+        if node is None:
+            return
+        parent_reward_to_node = node.get_reward(action)
+        parent_sum_rewards = parent_reward_to_node + self.discount_rate * child_sum_rewards
+        node.update_node_statistics(action, parent_sum_rewards, parent_reward_to_node)
+        self.update_ancestor_node_statistics(node.parent, node.parent_action, parent_sum_rewards)
+
+
+def get_action_key(action):
+    x = None if action.is_skeleton else round(action.continuous_parameters['x'], 9)
+    return action.discrete_parameters['object'], action.discrete_parameters['region'], x
+
+
+def get_q_table(planner):
+    # (depth, parent action keys) -> sorted (action key, N, Q) of the node, for comparing the trees of two runs
+    table = {}
+    for node in planner.tree.nodes:
+        path = []
+        curr_node = node
+        while curr_node.parent is not None:
+            path.append(get_action_key(curr_node.parent_action))
+            curr_node = curr_node.parent
+        table[tuple(path[::-1])] = sorted((get_action_key(a), node.N[a], node.Q[a]) for a in node.Q.keys())
+    return table
+
+
+def use_synthetic_state_saver(test_case):
+    # MCTS.create_node saves the openrave environment of the problem
+    original_state_saver = utils.CustomStateSaver
+    utils.CustomStateSaver = SyntheticStateSaver
+    test_case.addCleanup(setattr, utils, 'CustomStateSaver', original_state_saver)
+
+
+@contextlib.contextmanager
+def suppressed_stdout():
+    # the planners print every simulation step
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
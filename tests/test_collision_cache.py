@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from gtamp_utils import collision_cache
+from gtamp_utils.collision_cache import PersistentCollisionCache
+
+
+class FakeClock:
+    # stands in for the time module, one second per call
+    def __init__(self):
+        self.now = 0.
+
+    def time(self):
+        self.now += 1.
+        return self.now
+
+
+class TestPersistentCollisionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        prm_file = os.path.join(self.tmp_dir, 'prm.pkl')
+        with open(prm_file, 'wb') as f:
+            f.write('prm')
+        original_time = collision_cache.time
+        collision_cache.time = FakeClock()
+        self.addCleanup(setattr, collision_cache, 'time', original_time)
+        self.cache = PersistentCollisionCache(os.path.join(self.tmp_dir, 'collision_cache.db'), prm_file,
+                                              max_entries=3, eviction_period=4)
+        self.addCleanup(self.cache.close)
+
+    def get_last_used(self, key):
+        return self.cache.connection.execute('SELECT last_used FROM collisions WHERE key=?', (key,)).fetchone()[0]
+
+    def test_reads_do_not_write(self):
+        bitset = np.array([1, 2, 3], dtype=np.uint8)
+        self.cache.put('a', bitset)
+        last_used = self.get_last_used('a')
+        n_changes = self.cache.connection.total_changes
+        for _ in range(3):
+            self.assertTrue(np.array_equal(self.cache.get('a'), bitset))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.connection.total_changes, n_changes + 1)
+        # the fourth read flushed the last read time of a in one write
+        self.assertGreater(self.get_last_used('a'), last_used)
+        self.assertEqual(self.cache.last_used, {})
+
+    def test_evicts_least_recently_read(self):
+        self.cache.put('a', [1])
+        self.cache.put('b', [2])
+        self.cache.get('a')
+        self.cache.put('c', [3])
+        self.cache.put('d', [4])
+        # the eviction flushes the read of a first, so b is the least recently used
+        keys = set(row[0] for row in self.cache.connection.execute('SELECT key FROM collisions'))
+        self.assertEqual(keys, {'a', 'c', 'd'})
+        self.cache.put('e', [5])
+        self.cache.get('c')
+        self.cache.close()
+        self.cache.connection = collision_cache.sqlite3.connect(self.cache.db_path)
+        self.assertGreater(self.get_last_used('c'), self.get_last_used('e'))
+
+
+if __name__ == '__main__':
+    unittest.main()
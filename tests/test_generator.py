@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+
+from generators.generator import Generator
+from tests.synthetic_mcts import suppressed_stdout
+
+
+class CountingSampler:
+    # hands out 0, 1, 2, ..., like the index of a learned sampler
+    def __init__(self):
+        self.curr_smpl_idx = 0
+
+    def sample(self):
+        sample = np.array([float(self.curr_smpl_idx)])
+        self.curr_smpl_idx += 1
+        return sample
+
+
+class EveryThirdFeasibilityChecker:
+    # the samples whose index is divisible by 3 are feasible
+    def __init__(self):
+        self.feasible_pick = []
+        self.checked_samples = []
+
+    def check_feasibility(self, operator_skeleton, parameters):
+        self.checked_samples.append(int(parameters[0]))
+        if int(parameters[0]) % 3 == 0:
+            return {'pick': {'action_parameters': parameters}, 'place': {'action_parameters': parameters}}, \
+                   'HasSolution'
+        return None, 'PickFailed'
+
+
+class CountingGenerator(Generator):
+    def __init__(self, n_parameters_to_try_motion_planning, n_samples_per_batch):
+        Generator.__init__(self, None, None, CountingSampler(), n_parameters_to_try_motion_planning, 1, None)
+        self.n_samples_per_batch = n_samples_per_batch
+
+    def get_feasibility_checker(self):
+        return EveryThirdFeasibilityChecker()
+
+    def get_n_samples_per_batch(self, n_parameters_to_find):
+        if self.n_samples_per_batch is None:
+            return Generator.get_n_samples_per_batch(self, n_parameters_to_find)
+        return self.n_samples_per_batch  # as the parallel feasibility checker asks for
+
+
+class TestGenerator(unittest.TestCase):
+    def test_every_drawn_sample_is_tried_in_order(self):
+        for n_samples_per_batch in [None, 7]:
+            generator = CountingGenerator(4, n_samples_per_batch)
+            for _ in range(3):
+                with suppressed_stdout():
+                    feasible_op_parameters, status = generator.sample_feasible_op_parameters()
+                self.assertEqual(status, 'HasSolution')
+                self.assertEqual(len(feasible_op_parameters), 4)
+            n_drawn = generator.sampler.curr_smpl_idx
+            n_tried = len(generator.tried_samples)
+            # 12 feasible samples, and the infeasible ones between them
+            self.assertEqual(n_tried, 34)
+            self.assertEqual(n_tried + len(generator.pending_samples), n_drawn)
+            self.assertEqual([int(sample[0]) for sample in generator.tried_samples], range(n_tried))
+            self.assertEqual(generator.tried_sample_labels, [-1 if idx % 3 == 0 else -3 for idx in range(n_tried)])
+            if n_samples_per_batch is None:
+                # none is drawn ahead, so the sampler is called exactly as often as one sample at a time would
+                self.assertEqual(n_drawn, n_tried)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import time
+import unittest
+import numpy as np
+
+from planners.flat_mcts.discrete_node_with_prior_q import LearnedQValueCache, alpha_zero_ucb, get_state_fingerprint, \
+    softmax
+from tests.synthetic_mcts import SyntheticMCTS, SyntheticMoverEnv, SyntheticParameters, SyntheticLearnedQ, \
+    SyntheticState, use_synthetic_state_saver, suppressed_stdout
+
+
+FORWARD_PASS_TIME = 1e-4  # below the time of a call into the network
+
+
+def select_with_per_action_predict(node):
+    # selection as it was before the priors were batched and cached: a forward pass per action on every selection
+    init_q_values = [node.learned_q.predict(node.state, a) for a in node.A]
+    exp_sum = np.sum([np.exp(q) for q in init_q_values])
+    action_ucb_values = []
+    for action, value, learned_value in zip(node.A, node.get_stats('Q_sa'), init_q_values):
+        q_bonus = np.exp(learned_value) / float(exp_sum)
+        action_ucb_values.append(value + q_bonus + node.ucb_parameter * alpha_zero_ucb(node.Nvisited, node.N[action]))
+    boolean_idxs_with_highest_ucb = (np.max(action_ucb_values) == action_ucb_values).squeeze()
+    best_action_idx = np.random.randint(np.sum(boolean_idxs_with_highest_ucb))
+    return np.array(node.A)[boolean_idxs_with_highest_ucb][best_action_idx]
+
+
+def get_selections_per_sec(nodes, select, n_rounds):
+    stime = time.time()
+    for _ in range(n_rounds):
+        for node in nodes:
+            select(node)
+    return n_rounds * len(nodes) / (time.time() - stime)
+
+
+class TestLearnedQValueCache(unittest.TestCase):
+    def setUp(self):
+        use_synthetic_state_saver(self)
+
+    def test_one_prediction_per_state(self):
+        np.random.seed(0)
+        learned_q = SyntheticLearnedQ()
+        planner = SyntheticMCTS(SyntheticParameters(), SyntheticMoverEnv(), learned_q=learned_q)
+        with suppressed_stdout():
+            planner.search(n_iter=200)
+
+        nodes = [node for node in planner.tree.get_discrete_nodes() if node.state is not None]
+        fingerprints = set(get_state_fingerprint(node.state) for node in nodes)
+        # the nodes of a state differ in their geometric features, and yet share one prediction
+        self.assertGreater(len(nodes), len(fingerprints))
+        self.assertEqual(learned_q.n_predictions, len(fingerprints))
+        self.assertEqual(planner.learned_q_value_cache.n_misses, len(fingerprints))
+        for node in nodes:
+            q_values = [learned_q.predict(node.state, a) for a in node.A]
+            self.assertTrue(np.allclose(node.get_stats('prior'), softmax(np.array(q_values))))
+
+    def test_selections_per_sec(self):
+        np.random.seed(0)
+        learned_q = SyntheticLearnedQ()
+        planner = SyntheticMCTS(SyntheticParameters(), SyntheticMoverEnv(), learned_q=learned_q)
+        with suppressed_stdout():
+            planner.search(n_iter=200)
+        nodes = [node for node in planner.tree.get_discrete_nodes() if node.state is not None]
+
+        learned_q.forward_pass_time = FORWARD_PASS_TIME
+        n_predictions = learned_q.n_predictions
+        n_rounds = 2
+        per_action_rate = get_selections_per_sec(nodes, select_with_per_action_predict, n_rounds)
+        cached_rate = get_selections_per_sec(nodes, lambda node: node.perform_ucb_over_actions(), n_rounds)
+        # the priors are computed once per state, so selections do not call the learned q
+        self.assertEqual(learned_q.n_predictions, n_predictions)
+        self.assertGreaterEqual(cached_rate / per_action_rate, 5.,
+                                'selections/sec: %.1f per-action predict, %.1f cached priors'
+                                % (per_action_rate, cached_rate))
+
+    def test_evicts_least_recently_used_states(self):
+        problem_env = SyntheticMoverEnv(n_objects=2)
+        actions = problem_env.get_applicable_ops()
+        learned_q = SyntheticLearnedQ()
+        cache = LearnedQValueCache(max_entries=2)
+        states = [SyntheticState(problem_env, frozenset(objects)) for objects in [[], ['obj0'], ['obj1']]]
+
+        def get(state):
+            return cache.get(state, actions, lambda: learned_q.predict_batch(state, actions))
+
+        get(states[0])
+        get(states[1])
+        get(states[0])
+        get(states[2])
+        self.assertEqual(len(cache.q_values), 2)
+        self.assertEqual(learned_q.n_predictions, 3)
+        get(states[0])
+        self.assertEqual(learned_q.n_predictions, 3)
+        get(states[1])
+        self.assertEqual(learned_q.n_predictions, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import sys
+import time
+import unittest
+import numpy as np
+
+from planners.flat_mcts.mcts_stats_table import MCTSStatsTable
+from planners.flat_mcts.mcts_tree_discrete_node import DiscreteTreeNode
+from trajectory_representation.operator import Operator
+from tests.synthetic_mcts import SyntheticMCTS, RecursiveMCTS, SyntheticMoverEnv, SyntheticParameters, get_q_table, \
+    use_synthetic_state_saver, suppressed_stdout
+
+BRANCHING = 20  # about the number of actions of a discrete node in the mover domain
+TREE_DEPTH = 4  # 168421 nodes
+REWARD = 0.1
+
+
+def upper_confidence_bound(n, n_sa):
+    return np.sqrt(2 * np.log(n + 1) / float(n_sa + 1))
+
+
+class DictStatsNode:
+    # node statistics as they were before MCTSStatsTable: dicts keyed by the actions, and UCB over a Python loop
+    def __init__(self, actions, ucb_parameter):
+        self.A = actions
+        self.N = {a: 0 for a in actions}
+        self.Q = {a: 0. for a in actions}
+        self.reward_history = {}
+        self.Nvisited = 0
+        self.children = {}
+        self.ucb_parameter = ucb_parameter
+
+    def compute_ucb_value(self, value, action):
+        return value + self.ucb_parameter * upper_confidence_bound(self.Nvisited, self.N[action])
+
+    def perform_ucb_over_actions(self):
+        best_value = -np.inf
+        for action in self.A:
+            best_value = max(best_value, self.compute_ucb_value(self.Q[action], action))
+        best_actions = [a for a in self.A if self.compute_ucb_value(self.Q[a], a) == best_value]
+        return best_actions[np.random.randint(len(best_actions))]
+
+    def update_node_statistics(self, action, sum_rewards, reward):
+        self.Nvisited += 1
+        if self.N[action] == 0:
+            self.reward_history[action] = [reward]
+            self.Q[action] = sum_rewards
+        else:
+            self.reward_history[action].append(reward)
+            if sum_rewards > self.Q[action]:
+                self.Q[action] = sum_rewards
+        self.N[action] += 1
+
+
+def build_tree(create_node):
+    root = create_node(0)
+    frontier = [root]
+    n_nodes = 1
+    for depth in range(1, TREE_DEPTH + 1):
+        next_frontier = []
+        for node in frontier:
+            for action in node.A:
+                child = create_node(depth)
+                node.children[action] = child
+                next_frontier.append(child)
+        n_nodes += len(next_frontier)
+        frontier = next_frontier
+    return root, n_nodes
+
+
+def create_actions(depth):
+    if depth == TREE_DEPTH:
+        return []
+    return [Operator('two_arm_pick_two_arm_place', {'object': 'obj%d' % idx, 'region': 'home_region'})
+            for idx in range(BRANCHING)]
+
+
+def select_and_back_up_iteratively(root):
+    node = root
+    path = []
+    while len(node.A) > 0:
+        action = node.perform_ucb_over_actions()
+        path.append((node, action))
+        node = node.children[action]
+    sum_rewards = 0
+    for node, action in reversed(path):
+        sum_rewards = REWARD + sum_rewards
+        node.update_node_statistics(action, sum_rewards, REWARD)
+    return [action for _, action in path]
+
+
+def select_and_back_up_recursively(node, path):
+    if len(node.A) == 0:
+        return 0
+    action = node.perform_ucb_over_actions()
+    path.append(action)
+    sum_rewards = REWARD + select_and_back_up_recursively(node.children[action], path)
+    node.update_node_statistics(action, sum_rewards, REWARD)
+    return sum_rewards
+
+
+class TestMCTSSimulate(unittest.TestCase):
+    def setUp(self):
+        use_synthetic_state_saver(self)
+
+    def search(self, planner_class, seed, n_iter, parameters, problem_env):
+        np.random.seed(seed)
+        planner = planner_class(parameters, problem_env)
+        with suppressed_stdout():
+            planner.search(n_iter=n_iter)
+        return planner
+
+    def test_same_actions_and_q_as_recursive_simulate(self):
+        for seed in range(3):
+            iterative = self.search(SyntheticMCTS, seed, 300, SyntheticParameters(), SyntheticMoverEnv())
+            recursive = self.search(RecursiveMCTS, seed, 300, SyntheticParameters(), SyntheticMoverEnv())
+            self.assertEqual(iterative.chosen_actions, recursive.chosen_actions)
+            self.assertEqual(get_q_table(iterative), get_q_table(recursive))
+
+    def test_depth_200_search(self):
+        # with far more objects than the horizon can move, the first simulation descends to the planning horizon
+        parameters = SyntheticParameters(planning_horizon=200)
+        problem_env = SyntheticMoverEnv(n_objects=150, p_feasible=1.)
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(150)
+        try:
+            planner = self.search(SyntheticMCTS, 0, 3, parameters, problem_env)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+        self.assertEqual(max(node.depth for node in planner.tree.nodes), 200)
+
+    def test_select_and_back_up_speedup(self):
+        stats_table = MCTSStatsTable()
+        array_root, n_nodes = build_tree(lambda depth: DiscreteTreeNode(None, 1.0, depth, None, True, False,
+                                                                        create_actions(depth), None, stats_table))
+        dict_root, _ = build_tree(lambda depth: DictStatsNode(create_actions(depth), 1.0))
+        self.assertGreaterEqual(n_nodes, 10 ** 5)
+
+        n_iterations = 2000
+        np.random.seed(0)
+        stime = time.time()
+        array_paths = [select_and_back_up_iteratively(array_root) for _ in range(n_iterations)]
+        array_time = time.time() - stime
+
+        np.random.seed(0)
+        dict_paths = []
+        stime = time.time()
+        for _ in range(n_iterations):
+            dict_paths.append([])
+            select_and_back_up_recursively(dict_root, dict_paths[-1])
+        dict_time = time.time() - stime
+
+        # both descend the same way, since the UCB values and the tie-breaks are the same
+        self.assertEqual([[a.discrete_parameters['object'] for a in path] for path in array_paths],
+                         [[a.discrete_parameters['object'] for a in path] for path in dict_paths])
+        self.assertGreaterEqual(dict_time / array_time, 5.)
+
+
+if __name__ == '__main__':
+    unittest.main()
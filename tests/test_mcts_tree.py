@@ -0,0 +1,107 @@
+import random
+import time
+import unittest
+import numpy as np
+
+from planners.flat_mcts.mcts_tree import MCTSTree
+from planners.flat_mcts.mcts_tree_node import TreeNode
+
+
+class HCountState:
+    # a state with hcount objects to move
+    problem_env = None
+
+    def __init__(self, hcount):
+        self.hcount = hcount
+
+    def get_occlusion_closure(self):
+        return {'objects_to_move': range(self.hcount)}
+
+
+def is_below_init_node(node):
+    while node is not None and not node.is_init_node:
+        node = node.parent
+    return node is not None
+
+
+def get_sum_rewards_from_init_node(node):
+    sum_rewards = 0.
+    while not node.is_init_node:
+        sum_rewards += node.parent.get_reward(node.parent_action)
+        node = node.parent
+    return sum_rewards
+
+
+class RandomTreeBuilder:
+    # grows a tree one random node at a time, mostly below the recently added nodes, as MCTS does
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.tree = MCTSTree(1.0, 1.0)
+        root = TreeNode(HCountState(5), 1., 0, None, True, True, stats_table=self.tree.stats_table)
+        self.tree.set_root_node(root)
+        self.feasible_nodes = [root]
+
+    def add_random_node(self):
+        if self.random.random() < .7:
+            parent = self.random.choice(self.feasible_nodes[-50:])
+        else:
+            parent = self.random.choice(self.feasible_nodes)
+        action = object()
+        parent.add_action_slots([action])
+        is_infeasible = self.random.random() < .1
+        state = None if is_infeasible else HCountState(self.random.randint(0, 5))
+        child = TreeNode(state, 1., parent.depth + 1, None, True, False, stats_table=self.tree.stats_table)
+        child.parent_action = action
+        reward = float(self.random.choice([-1, 0, 1, 2]))
+        self.tree.add_node(child, action, parent, reward)
+        parent.update_node_statistics(action, reward, reward)
+        if not is_infeasible:
+            self.feasible_nodes.append(child)
+
+    def switch_init_node(self):
+        for node in self.tree.nodes:
+            node.is_init_node = False
+        self.random.choice(self.feasible_nodes).is_init_node = True
+
+
+class TestMCTSTree(unittest.TestCase):
+    def test_best_trajectory_agrees_with_slow_best(self):
+        for seed in range(3):
+            builder = RandomTreeBuilder(seed)
+            tree = builder.tree
+            for _ in range(800):
+                builder.add_random_node()
+                if builder.random.random() < .01:
+                    builder.switch_init_node()
+
+                best_sum_rewards, progress, best_node = tree.get_best_trajectory_sum_rewards_and_node(1.0)
+                slow_best_sum_rewards, slow_progress, slow_best_node = tree._slow_best(1.0)
+                self.assertEqual(best_sum_rewards, slow_best_sum_rewards)
+                self.assertEqual(progress, slow_progress)
+
+                leaves = [node for node in tree.get_leaf_nodes() if is_below_init_node(node)]
+                self.assertIn(best_node, leaves)
+                self.assertEqual(get_sum_rewards_from_init_node(best_node), best_sum_rewards)
+                # ties go to the smaller hcount
+                self.assertEqual(tree.hcounts[best_node],
+                                 min(tree.hcounts[leaf] for leaf in leaves
+                                     if get_sum_rewards_from_init_node(leaf) == best_sum_rewards))
+                if tree.root.is_init_node:
+                    # _slow_best picks its node among all of the leaves, which is only right below the root
+                    self.assertEqual(get_sum_rewards_from_init_node(slow_best_node), best_sum_rewards)
+
+    def test_best_trajectory_overhead_is_flat(self):
+        builder = RandomTreeBuilder(0)
+        query_times = []
+        for _ in range(10 ** 5):
+            builder.add_random_node()
+            stime = time.time()
+            builder.tree.get_best_trajectory_sum_rewards_and_node(1.0)
+            query_times.append(time.time() - stime)
+        early_query_time = np.mean(query_times[1000:2000])
+        late_query_time = np.mean(query_times[-1000:])
+        self.assertLess(late_query_time, 3 * early_query_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import time
+import multiprocessing
+import unittest
+import numpy as np
+
+from planners.flat_mcts.parallel_mcts import ParallelMCTS, MCTSWorkerState, get_shared_slots
+from tests.synthetic_mcts import SyntheticMCTS, SyntheticMoverEnv, SyntheticParameters, get_action_key, \
+    use_synthetic_state_saver, suppressed_stdout
+
+STEP_TIME = 0.01  # seconds per sample, which stands in for motion planning
+SWITCH_FREQUENCY = 50  # the defaults of run_mcts.py
+N_ITER_PER_MERGE = 10
+
+
+def create_synthetic_planner():
+    return SyntheticMCTS(SyntheticParameters(), SyntheticMoverEnv())
+
+
+def create_timed_planner():
+    return SyntheticMCTS(SyntheticParameters(switch_frequency=SWITCH_FREQUENCY),
+                         SyntheticMoverEnv(step_time=STEP_TIME), stop_at_solution=True)
+
+
+def create_failing_planner():
+    raise ValueError('No problem environment')
+
+
+class HangingPlanner:
+    s0_node = None
+
+    def search(self, n_iter, node_to_search_from, max_time):
+        time.sleep(60)
+
+
+class TestParallelMCTS(unittest.TestCase):
+    def setUp(self):
+        use_synthetic_state_saver(self)
+
+    def search(self, seed):
+        planner = ParallelMCTS(create_synthetic_planner, 3, seed=seed, n_iter_per_round=10)
+        with suppressed_stdout():
+            search_time_to_reward, plan = planner.search(max_time=600, n_rounds=10)
+        return search_time_to_reward, plan
+
+    def test_deterministic_given_the_seed(self):
+        search_time_to_reward, plan = self.search(0)
+        same_seed_search_time_to_reward, same_seed_plan = self.search(0)
+        # [time, iteration, best sum rewards, progress, found solution], as in MCTS
+        self.assertTrue(all(len(row) == 5 for row in search_time_to_reward))
+        self.assertEqual([row[1:] for row in search_time_to_reward],
+                         [row[1:] for row in same_seed_search_time_to_reward])
+        self.assertEqual([get_action_key(a) for a in plan], [get_action_key(a) for a in same_seed_plan])
+
+    def test_own_stats_leave_out_the_virtual_visits(self):
+        np.random.seed(0)
+        planner = create_synthetic_planner()
+        with suppressed_stdout():
+            planner.search(n_iter=30)
+        worker = MCTSWorkerState(planner, 1e-2)
+        own_stats = worker.get_own_stats()
+        self.assertGreater(len(own_stats), 0)
+
+        worker.apply_other_stats({key: (5, q + 100.) for key, (n, q) in own_stats.items()})
+        self.assertEqual(worker.get_own_stats(), own_stats)
+        for key, (node, action) in get_shared_slots(planner, 1e-2).items():
+            if key in own_stats:
+                self.assertEqual(node.N[action], own_stats[key][0] + 5)
+                self.assertEqual(node.Q[action], own_stats[key][1])
+
+    def test_resumes_the_search_across_rounds(self):
+        # a round of the worker is the serial search split up, including the switches of the node to search from
+        np.random.seed(0)
+        serial = SyntheticMCTS(SyntheticParameters(switch_frequency=SWITCH_FREQUENCY), SyntheticMoverEnv())
+        with suppressed_stdout():
+            serial.search(n_iter=121)
+        np.random.seed(0)
+        rounds = SyntheticMCTS(SyntheticParameters(switch_frequency=SWITCH_FREQUENCY), SyntheticMoverEnv())
+        with suppressed_stdout():
+            for _ in range(12):
+                rounds.search(n_iter=N_ITER_PER_MERGE + 1, node_to_search_from=rounds.node_to_search_from,
+                              n_iter_done=rounds.n_iter_done)
+        self.assertEqual(rounds.n_iter_done, 120)
+        self.assertEqual(rounds.chosen_actions, serial.chosen_actions)
+        self.assertIsNot(rounds.node_to_search_from, rounds.s0_node)
+        self.assertEqual(rounds.node_to_search_from.depth, serial.node_to_search_from.depth)
+
+    def test_faster_to_a_solution_than_serial(self):
+        # wall-clock seconds to the first solution, over the same seeds
+        serial_time = 0
+        parallel_time = 0
+        for seed in range(5):
+            np.random.seed(seed)
+            stime = time.time()
+            serial = create_timed_planner()
+            with suppressed_stdout():
+                serial.search(max_time=600)
+            serial_time += time.time() - stime
+            self.assertTrue(serial.found_solution)
+
+            stime = time.time()
+            planner = ParallelMCTS(create_timed_planner, 4, seed=seed, n_iter_per_round=N_ITER_PER_MERGE)
+            with suppressed_stdout():
+                _, plan = planner.search(max_time=600)
+            parallel_time += time.time() - stime
+            self.assertGreater(len(plan), 0)
+        self.assertLess(parallel_time, serial_time,
+                        'Serial %.2fs, 4 workers %.2fs to a solution' % (serial_time, parallel_time))
+
+    def test_shutdown_on_worker_exception(self):
+        planner = ParallelMCTS(create_failing_planner, 2, shutdown_timeout=5)
+        with self.assertRaises(RuntimeError) as context:
+            with suppressed_stdout():
+                planner.search(max_time=60)
+        self.assertIn('ValueError', str(context.exception))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_shutdown_on_worker_timeout(self):
+        planner = ParallelMCTS(HangingPlanner, 2, shutdown_timeout=1)
+        stime = time.time()
+        with self.assertRaises(RuntimeError):
+            planner.search(max_time=1)
+        self.assertLess(time.time() - stime, 30)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import numpy as np
+
+from planners.heuristics import compute_occlusion_closure
+from planners.sahs.helper import compute_heuristic, compute_heuristics
+from trajectory_representation.operator import Operator
+
+H_OPTIONS = ['hcount', 'hcount_old_number_in_goal', 'state_hcount', 'qlearned_hcount_new_number_in_goal',
+             'qlearned_hcount_old_number_in_goal', 'qlearned_old_number_in_goal', 'config.qlearned_new_number_in_goal',
+             'config.pure_learned_q']
+REGIONS = ['home_region', 'loading_region']
+
+
+class FakeRegion:
+    def __init__(self, object_names):
+        self.object_names = object_names
+
+    def contains(self, aabb):
+        return aabb in self.object_names
+
+
+class FakeBody:
+    def __init__(self, name):
+        self.name = name
+
+    def ComputeAABB(self):
+        return self.name
+
+
+class FakeEnv:
+    def GetKinBody(self, name):
+        return FakeBody(name)
+
+
+class FakeMover:
+    # two-arm mover whose home region holds objects_in_home
+    name = 'two_arm_mover'
+
+    def __init__(self, object_names, objects_in_home):
+        self.object_names = object_names
+        self.entity_names = object_names + REGIONS
+        self.env = FakeEnv()
+        self.regions = {'home_region': FakeRegion(objects_in_home),
+                        'loading_region': FakeRegion([o for o in object_names if o not in objects_in_home])}
+
+    def get_applicable_ops(self):
+        return [Operator('two_arm_pick_two_arm_place', {'object': o, 'place_region': r, 'two_arm_place_object': o,
+                                                        'two_arm_place_region': r})
+                for o in self.object_names for r in REGIONS]
+
+
+class FakeState:
+    # random predicates over the objects of the mover
+    def __init__(self, problem_env, goal_entities, random_state):
+        self.problem_env = problem_env
+        self.goal_entities = goal_entities
+        entity_names = problem_env.entity_names
+        # geometric features, then IsObj, IsRoom, IsGoal, IsReachable and IsHoldingGoalEntity
+        self.nodes = {e: list(random_state.rand(6)) + [int('region' not in e), int('region' in e),
+                                                        int(e in goal_entities), random_state.randint(2), 0]
+                      for e in entity_names}
+        # InRegion, PreFree and ManipFree
+        self.binary_edges = {(a, b): [int(b == 'home_region' and a in problem_env.regions['home_region'].object_names),
+                                      int(random_state.rand() < .2), random_state.randint(2)]
+                             for a in entity_names for b in entity_names}
+        # PlaceInWay
+        self.ternary_edges = {(a, b, r): [int(random_state.rand() < .1)]
+                              for a in entity_names for b in entity_names for r in REGIONS}
+
+    def get_occlusion_closure(self):
+        return compute_occlusion_closure(self, self.problem_env)
+
+
+class FakePapModel:
+    # a linear Q of the action and of the node features
+    def __init__(self, random_state, n_entities):
+        self.action_weights = random_state.randn(n_entities * len(REGIONS)) * 5
+        self.random_state = random_state
+
+    def predict_with_raw_input_format(self, nodes, edges, actions):
+        batch_size = len(actions)
+        return np.dot(actions.reshape((batch_size, -1)), self.action_weights) \
+            + 0.01 * nodes.reshape((batch_size, -1)).sum(axis=-1)
+
+
+class FakeConfig:
+    mixrate = 0.5
+
+    def __init__(self, h_option):
+        self.h_option = h_option
+
+
+class TestHeuristics(unittest.TestCase):
+    def test_batched_heuristics_match_per_action_heuristics(self):
+        random_state = np.random.RandomState(0)
+        object_names = ['square_packing_box%d' % idx for idx in range(4)] + ['rectangular_packing_box1']
+        for trial in range(3):
+            mover = FakeMover(object_names, object_names[:trial])
+            state = FakeState(mover, object_names[:2] + ['home_region'], random_state)
+            pap_model = FakePapModel(random_state, len(mover.entity_names))
+            actions = mover.get_applicable_ops()
+            for h_option in H_OPTIONS:
+                config = FakeConfig(h_option)
+                np.random.seed(trial)
+                hvals = [np.squeeze(compute_heuristic(state, a, pap_model, mover, config)) for a in actions]
+                next_random_number = np.random.rand()
+                np.random.seed(trial)
+                batched_hvals = compute_heuristics(state, actions, pap_model, mover, config)
+                self.assertEqual(len(batched_hvals), len(actions))
+                self.assertTrue(np.allclose(hvals, np.squeeze(batched_hvals), atol=1e-9), h_option)
+                # both draw the same random numbers, so seeded searches do not change
+                self.assertEqual(np.random.rand(), next_random_number, h_option)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import collections
+import unittest
+import numpy as np
+
+from gtamp_utils import utils
+from planners.sahs import greedy_new
+from planners.sahs.node import Node
+from planners.transposition_table import StateFingerprint, TranspositionTable, set_transposition_table
+from trajectory_representation.operator import Operator
+
+GOAL_REGION = 'home_region'
+# the robot places from one standing pose per region
+STANDING_POSES = {'home_region': [0., 9., 0.], 'loading_region': [0., -1., np.pi]}
+
+
+class GridMoverEnv:
+    # objects on a grid, each with one placement per region
+    def __init__(self, n_objects):
+        self.object_names = ['obj%d' % idx for idx in range(n_objects)]
+        self.object_regions = {o: 'loading_region' for o in self.object_names}
+        self.robot_base_pose = [0., -1., 0.]
+
+    def get_object_pose(self, obj_name):
+        idx = self.object_names.index(obj_name)
+        if self.object_regions[obj_name] == GOAL_REGION:
+            return [idx, 10., 0., np.pi / 2]
+        return [idx, 0., 0., 0.]
+
+    def place(self, obj_name, region_name):
+        self.object_regions[obj_name] = region_name
+        self.robot_base_pose = STANDING_POSES[region_name]
+
+
+class GridStateSaver:
+    # stands in for CustomStateSaver
+    def __init__(self, env):
+        self.robot_name = 'pr2'
+        self.object_poses = {o: np.array(env.get_object_pose(o)) for o in env.object_names}
+        self.object_poses[self.robot_name] = np.array(env.robot_base_pose + [0.])
+        self.robot_base_pose = np.array([env.robot_base_pose])
+        self.held_object = None
+
+
+class GridMover:
+    # stands in for the mover problem of the greedy search
+    def __init__(self, n_objects):
+        self.env = GridMoverEnv(n_objects)
+
+    def get_fingerprint(self, goal):
+        return StateFingerprint(GridStateSaver(self.env), goal)
+
+
+class CountingState:
+    # abstract state of the grid, which counts how many have been computed
+    n_computed = 0
+
+    def __init__(self, mover, goal, parent_state=None, parent_action=None):
+        CountingState.n_computed += 1
+        self.parent_state = parent_state
+        self.object_regions = dict(mover.env.object_regions)
+        self.robot_base_pose = mover.env.robot_base_pose
+
+    def restore(self, mover):
+        mover.env.object_regions = dict(self.object_regions)
+        mover.env.robot_base_pose = self.robot_base_pose
+
+
+def get_pap(obj_name, region_name):
+    return Operator('two_arm_pick_two_arm_place', {'object': obj_name, 'place_region': region_name})
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def setUp(self):
+        original_state_saver = utils.CustomStateSaver
+        utils.CustomStateSaver = GridStateSaver
+        self.addCleanup(setattr, utils, 'CustomStateSaver', original_state_saver)
+        self.addCleanup(set_transposition_table, None)
+        CountingState.n_computed = 0
+
+    def test_commuting_sequences_share_a_fingerprint(self):
+        goal = ['obj0', 'obj1', GOAL_REGION]
+        a_then_b = GridMover(3)
+        a_then_b.env.place('obj0', GOAL_REGION)
+        a_then_b.env.place('obj1', GOAL_REGION)
+        b_then_a = GridMover(3)
+        b_then_a.env.place('obj1', GOAL_REGION)
+        b_then_a.env.place('obj0', GOAL_REGION)
+        self.assertEqual(a_then_b.get_fingerprint(goal), b_then_a.get_fingerprint(goal))
+        self.assertEqual(a_then_b.get_fingerprint(goal).key, b_then_a.get_fingerprint(goal).key)
+
+        # the robot base pose is part of the state, even if the objects are at the same places
+        b_then_a.env.robot_base_pose = STANDING_POSES['loading_region']
+        self.assertNotEqual(a_then_b.get_fingerprint(goal), b_then_a.get_fingerprint(goal))
+
+        # the robot base pose is rounded to the same tolerances as the object poses
+        b_then_a.env.robot_base_pose = [1e-8, 9. - 1e-8, 2 * np.pi - 1e-8]
+        self.assertEqual(a_then_b.get_fingerprint(goal), b_then_a.get_fingerprint(goal))
+
+        # poses a millimeter apart restore to different configurations, so they are different states
+        b_then_a.env.robot_base_pose = [1e-3, 9., 0.]
+        self.assertNotEqual(a_then_b.get_fingerprint(goal), b_then_a.get_fingerprint(goal))
+
+    def test_greedy_computes_each_state_once(self):
+        n_objects = 4
+        self.assertEqual(self.expand_all(n_objects, use_transposition_table=False), 4 + 4 * 3 + 4 * 3 * 2 + 4 * 3 * 2)
+        # one state per subset of the objects in the goal region, as they are all placed from the same standing pose
+        self.assertEqual(self.expand_all(n_objects, use_transposition_table=True), 2 ** n_objects - 1)
+
+    def expand_all(self, n_objects, use_transposition_table):
+        # expands every placement in the goal region breadth first, as greedy_new.search does when the heuristic ties
+        CountingState.n_computed = 0
+        mover = GridMover(n_objects)
+        goal = mover.env.object_names + [GOAL_REGION]
+        set_transposition_table(TranspositionTable() if use_transposition_table else None)
+        init_node = Node(None, None, CountingState(mover, goal))
+        if use_transposition_table:
+            greedy_new.get_transposition_table().put(mover.get_fingerprint(goal), init_node.state).best_cost = 0
+
+        queue = collections.deque((init_node, get_pap(o, GOAL_REGION)) for o in mover.env.object_names)
+        n_expanded = 0
+        while len(queue) > 0:
+            node, action = queue.popleft()
+            node.state.restore(mover)
+            mover.env.place(action.discrete_parameters['object'], action.discrete_parameters['place_region'])
+            new_state = greedy_new.get_new_state(CountingState, mover, goal, node, action)
+            if new_state is None:
+                continue
+            # a reused state links to the parent of this path
+            self.assertIs(new_state.parent_state, node.state)
+            n_expanded += 1
+            new_node = Node(node, action, new_state)
+            queue.extend((new_node, get_pap(o, GOAL_REGION)) for o in mover.env.object_names
+                         if new_state.object_regions[o] != GOAL_REGION)
+        self.assertEqual(CountingState.n_computed - 1, n_expanded)
+        return n_expanded
+
+    def test_key_collision_is_a_miss(self):
+        goal = ['obj0', GOAL_REGION]
+        mover = GridMover(2)
+        fingerprint = mover.get_fingerprint(goal)
+        mover.env.place('obj0', GOAL_REGION)
+        other_fingerprint = mover.get_fingerprint(goal)
+        other_fingerprint.key = fingerprint.key
+        self.assertNotEqual(fingerprint, other_fingerprint)
+
+        table = TranspositionTable()
+        state = CountingState(mover, goal)
+        table.put(fingerprint, state)
+        self.assertIsNone(table.get(other_fingerprint))
+        self.assertEqual(table.n_collisions, 1)
+        self.assertIs(table.get(fingerprint).state, state)
+
+        other_state = CountingState(mover, goal)
+        table.put(other_fingerprint, other_state)
+        self.assertEqual(len(table), 1)
+        self.assertIsNone(table.get(fingerprint))
+        self.assertIs(table.get(other_fingerprint).state, other_state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 from gtamp_utils import utils
+from gtamp_utils.prm_graph import get_prm_graph
 import numpy as np
-import pickle
 
 
 class ConcreteNodeState:
@@ -33,7 +33,7 @@ class ConcreteNodeState:
 
     def get_key_configs(self, given_konfs):
         if given_konfs is None:
-            key_configs = pickle.load(open('prm.pkl', 'r'))[0]
+            key_configs = get_prm_graph().vertices
             #key_configs = np.delete(key_configs, [415, 586, 615, 618, 619], axis=0)
         else:
             key_configs = given_konfs
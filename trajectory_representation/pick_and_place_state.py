@@ -2,8 +2,11 @@ from trajectory_representation.state import State
 from gtamp_utils.utils import CustomStateSaver, get_body_xytheta, set_robot_config, set_obj_xytheta
 
 from gtamp_utils.utils import visualize_path, two_arm_pick_object
+from gtamp_utils.prm_collision_map import PRMCollisionMap
+from gtamp_utils.collision_cache import get_collision_cache
+from gtamp_utils.prm_graph import get_prm_graph
 from manipulation.bodies.bodies import set_color
-import pickle
+from planners.heuristics import get_goal_objs_not_in_goal_region
 
 
 class PaPState(State):
@@ -20,6 +23,11 @@ class PaPState(State):
             obj.GetName(): get_body_xytheta(obj)
             for obj in problem_env.objects
         }
+        # the occlusion closure starts from these; they are read off the environment while it is in this state
+        if any('region' in entity for entity in goal_entities):
+            self.goal_objs_not_in_goal_region = get_goal_objs_not_in_goal_region(self, problem_env)
+        else:
+            self.goal_objs_not_in_goal_region = None
 
         self.use_prm = problem_env.name.find('two_arm') != -1
 
@@ -39,57 +47,15 @@ class PaPState(State):
         self.ternary_edges = None
         self.binary_edges = None
         self.nodes = None
+        self.occlusion_closure = None
 
-        self.prm_vertices, self.prm_edges = pickle.load(open('./prm.pkl', 'rb'))
+        self.prm_vertices = get_prm_graph().vertices
 
     def update_collisions_at_prm_vertices(self, parent_collides):
-        # global prm_vertices
-        # global prm_edges
-
-        # if prm_vertices is None or prm_edges is None:
-        #    prm_vertices, prm_edges = pickle.load(open('./prm.pkl', 'rb'))
-
-        is_robot_holding = len(self.problem_env.robot.GetGrabbed()) > 0
-
-        def in_collision(q, obj):
-            set_robot_config(q, self.problem_env.robot)
-            if is_robot_holding:
-                # note:
-                # openrave bug: when an object is held, it won't check the held_obj and given object collision unless
-                #               collision on robot is first checked. So, we have to check it twice
-                col = self.problem_env.env.CheckCollision(self.problem_env.robot)
-                col = self.problem_env.env.CheckCollision(self.problem_env.robot, obj)
-            else:
-                col = self.problem_env.env.CheckCollision(self.problem_env.robot, obj)
-            return col
-
-        obj_name_to_pose = {
-            obj.GetName(): tuple(get_body_xytheta(obj)[0].round(6))
-            for obj in self.problem_env.objects
-        }
-
-        collisions_at_all_obj_pose_pairs = {}
-        old_q = get_body_xytheta(self.problem_env.robot)
-        for obj in self.problem_env.objects:
-            obj_name_pose_tuple = (obj.GetName(), obj_name_to_pose[obj.GetName()])
-            collisions_with_obj_did_not_change = parent_collides is not None and \
-                                                 obj_name_pose_tuple in parent_collides
-            if collisions_with_obj_did_not_change:
-                collisions_at_all_obj_pose_pairs[obj_name_pose_tuple] = parent_collides[obj_name_pose_tuple]
-            else:
-                prm_vertices_in_collision_with_obj = {i for i, q in enumerate(self.prm_vertices) if
-                                                      in_collision(q, obj)}
-                collisions_at_all_obj_pose_pairs[obj_name_pose_tuple] = prm_vertices_in_collision_with_obj
-        set_robot_config(old_q, self.problem_env.robot)
-
         # what's the diff between collides and curr collides?
         # collides include entire set of obj and obj name pose tuple
-        collisions_at_current_obj_pose_pairs = {
-            obj.GetName(): collisions_at_all_obj_pose_pairs[(obj.GetName(), obj_name_to_pose[obj.GetName()])]
-            for obj in self.problem_env.objects
-        }
-
-        return collisions_at_all_obj_pose_pairs, collisions_at_current_obj_pose_pairs
+        collision_map = PRMCollisionMap(self.problem_env, self.prm_vertices, cache=get_collision_cache())
+        return collision_map.compute_collisions(self.problem_env.objects, parent_collides)
 
     def get_nodes(self):
         nodes = {}
@@ -4,7 +4,8 @@ from generators.uniform import UniformPaPGenerator
 from trajectory_representation.operator import Operator
 from gtamp_utils.utils import get_place_domain, set_robot_config, CustomStateSaver, get_body_xytheta, visualize_path, \
     are_base_confs_close_enough
-from gtamp_utils.motion_planner import find_prm_path, init_prm
+from gtamp_utils.motion_planner import find_prm_path
+from gtamp_utils.prm_graph import get_prm_graph
 
 import numpy as np
 
@@ -55,8 +56,8 @@ class IsReachable(UnaryPredicate):
         if self.problem_env.name.find('one_arm') != -1:
             return
 
-        init_prm()
-        from gtamp_utils.motion_planner import prm_vertices
+        prm_graph = get_prm_graph()
+        prm_vertices = prm_graph.vertices
 
         entities = [
                        obj.GetName()
@@ -65,10 +66,7 @@ class IsReachable(UnaryPredicate):
 
         baseconf, = get_body_xytheta(self.problem_env.robot)
 
-        start = {
-            i for i, q in enumerate(prm_vertices)
-            if are_base_confs_close_enough(baseconf, q, xy_threshold=.8, th_threshold=50)
-        }
+        start = set(prm_graph.get_vertices_close_to(baseconf, xy_threshold=.8, th_threshold=50).tolist())
         holding = len(self.problem_env.robot.GetGrabbed()) > 0
         goal_states = [
             None if entity in self.problem_env.regions else
@@ -77,13 +75,16 @@ class IsReachable(UnaryPredicate):
                 Operator('two_arm_pick', {'object': self.problem_env.env.GetKinBody(entity)}), n_pick_configs=10)
             for entity in entities
         ]
+        goal_vertices = [
+            None if entity in self.problem_env.regions else
+            set(prm_graph.get_vertices_close_to(goal_states[j] if goal_states[j] is not None else [],
+                                                xy_threshold=.8, th_threshold=50).tolist())
+            for j, entity in enumerate(entities)
+        ]
         goal_fns = [
-            (lambda i: self.problem_env.regions[entity].contains_point(prm_vertices[i]))
+            (lambda i, entity=entity: self.problem_env.regions[entity].contains_point(prm_vertices[i]))
             if entity in self.problem_env.regions else
-            (lambda i: any(
-                are_base_confs_close_enough(q, prm_vertices[i], xy_threshold=.8, th_threshold=50)
-                for q in (goal_states[j] if goal_states[j] is not None else [])
-            ))
+            (lambda i, j=j: i in goal_vertices[j])
             for j, entity in enumerate(entities)
         ]
         heuristic = lambda i: 0
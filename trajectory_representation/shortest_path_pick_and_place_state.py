@@ -13,6 +13,13 @@ from pick_and_place_state import PaPState
 
 import numpy as np
 import time
+import collections
+
+MAX_MEMOIZED_PICK_PATHS = 1000
+
+
+def get_config_key(config):
+    return tuple(np.asarray(config, dtype=float).squeeze().round(6).tolist())
 
 
 class ShortestPathPaPState(PaPState):
@@ -23,6 +30,16 @@ class ShortestPathPaPState(PaPState):
         self.parent_ternary_predicates = {}
         self.parent_binary_predicates = {}
         self.goal_entities = goal_entities
+        self.robot_base_pose = get_body_xytheta(problem_env.robot).squeeze()
+        # number of edge predicates copied from the parent state vs. evaluated in this state
+        self.n_predicates_reused = 0
+        self.n_predicates_recomputed = 0
+        self.n_pick_paths_reused = 0
+        # (robot base pose, pick config) -> pick path, shared by all the states that descend from the same root
+        if parent_state is not None and getattr(parent_state, 'pick_path_memo', None) is not None:
+            self.pick_path_memo = parent_state.pick_path_memo
+        else:
+            self.pick_path_memo = collections.OrderedDict()
         if parent_state is not None:
             moved_obj_type = type(parent_action.discrete_parameters['object'])
             if moved_obj_type == str or moved_obj_type == unicode:
@@ -77,6 +94,8 @@ class ShortestPathPaPState(PaPState):
                                        use_shortest_path=True)
         self.in_region = InRegion(self.problem_env)
         self.is_holding_goal_entity = IsHoldingGoalEntity(self.problem_env, goal_entities)
+        if parent_state is not None:
+            self.reuse_objs_in_collision_along_parent_paths(parent_state, moved_obj)
 
         self.nodes = self.get_nodes()
         self.binary_edges = self.get_binary_edges()
@@ -84,6 +103,8 @@ class ShortestPathPaPState(PaPState):
 
     def initialize_parent_predicates(self, moved_obj, parent_state, parent_action):
         assert parent_action is not None
+        # these are candidates for reuse; get_binary_edge_features and get_ternary_edge_features decide whether the
+        # paths they depend on are still the ones the parent evaluated them on
 
         self.parent_ternary_predicates = {
             (a, b, r): v
@@ -136,20 +157,35 @@ class ShortestPathPaPState(PaPState):
 
     def set_cached_pick_paths(self, parent_state, moved_obj):
         motion_planner = BaseMotionPlanner(self.problem_env, 'prm')
-        for obj, op_instance in self.pick_used.items():
-            motion_plan_goals = op_instance.continuous_parameters['q_goal']
-            assert len(motion_plan_goals) > 0
-            self.cached_pick_paths[obj] = None
+        objs = list(self.pick_used.keys())
+        motion_plan_goals = [self.pick_used[obj].continuous_parameters['q_goal'] for obj in objs]
+        assert all(len(goals) > 0 for goals in motion_plan_goals)
 
-            path, status = motion_planner.get_motion_plan(motion_plan_goals, cached_collisions=self.collides)
+        # the reachability of every object is read off of a single PRM search tree from the current robot pose
+        plans = motion_planner.get_motion_plans_to_goals(motion_plan_goals, cached_collisions=self.collides)
+        for obj, (_, status) in zip(objs, plans):
             if status == 'HasSolution':
                 self.reachable_entities.append(obj)
-            else:
-                path, _ = motion_planner.get_motion_plan(motion_plan_goals, cached_collisions={})
+
+        # the cached pick paths themselves are collision-free paths that ignore the objects. So they only depend on
+        # the robot pose they start from and the pick config, and are memoized on those for the whole search. The
+        # objects in collision along a path shared with the parent are re-checked only for the moved object, in
+        # reuse_objs_in_collision_along_parent_paths
+        start_key = get_config_key(self.robot_base_pose)
+        for obj, goals in zip(objs, motion_plan_goals):
+            op_instance = self.pick_used[obj]
+            self.cached_pick_paths[obj] = None
+            memo_key = (start_key, get_config_key(goals[0]))
+            if memo_key in self.pick_path_memo:
+                self.n_pick_paths_reused += 1
+                path = self.pick_path_memo[memo_key]
+                self.cached_pick_paths[obj] = path
+                op_instance.low_level_motion = path
+                continue
             [t.Enable(False) for t in self.problem_env.objects]
             rrt_motion_planner = BaseMotionPlanner(self.problem_env, 'rrt')
             for _ in range(100):
-                path, status = rrt_motion_planner.get_motion_plan(motion_plan_goals[0])
+                path, status = rrt_motion_planner.get_motion_plan(goals[0])
                 if status == 'HasSolution':
                     break
             [t.Enable(True) for t in self.problem_env.objects]
@@ -161,42 +197,93 @@ class ShortestPathPaPState(PaPState):
 
             self.cached_pick_paths[obj] = path
             op_instance.low_level_motion = path
+            self.pick_path_memo[memo_key] = path
+            if len(self.pick_path_memo) > MAX_MEMOIZED_PICK_PATHS:
+                self.pick_path_memo.popitem(last=False)
+
+    def make_pklable(self):
+        # the memo is shared by the states of a search rather than part of one
+        self.pick_path_memo = None
+        PaPState.make_pklable(self)
 
     def set_cached_place_paths(self, parent_state, moved_obj):
         motion_planner = BaseMotionPlanner(self.problem_env, 'prm')
-        for region_name, region in self.problem_env.regions.items():
-            if region.name == 'entire_region':
-                continue
-            for obj, pick_path in self.cached_pick_paths.items():
-                self.cached_place_paths[(obj, region_name)] = None
-                parent_state_has_cached_path_for_obj \
-                    = parent_state is not None and obj in parent_state.cached_place_paths and obj != moved_obj
-                cached_path_is_shortest_path = parent_state is not None and \
-                                               not (obj, region_name) in parent_state.reachable_regions_while_holding
-
-                saver = CustomStateSaver(self.problem_env.env)
-                # todo use the pick that has the least number of collisions
-                pick_used = self.pick_used[obj]
-                pick_used.execute()
+        regions = [(region_name, region) for region_name, region in self.problem_env.regions.items()
+                   if region.name != 'entire_region']
+        if self.holding_collides is not None:
+            collides = self.holding_collides
+        else:
+            # note: self.collides is computed without holding the object.
+            collides = self.collides
+
+        for obj, pick_path in self.cached_pick_paths.items():
+            saver = CustomStateSaver(self.problem_env.env)
+            # todo use the pick that has the least number of collisions
+            pick_used = self.pick_used[obj]
+            pick_used.execute()
+
+            regions_to_plan_to = []
+            for region_name, region in regions:
                 if region.contains(self.problem_env.env.GetKinBody(obj).ComputeAABB()):
-                    path = [get_body_xytheta(self.problem_env.robot).squeeze()]
+                    self.cached_place_paths[(obj, region_name)] = [get_body_xytheta(self.problem_env.robot).squeeze()]
                     self.reachable_regions_while_holding.append((obj, region_name))
                 else:
-                    if self.holding_collides is not None:
-                        path, status = motion_planner.get_motion_plan(region, cached_collisions=self.holding_collides)
-                    else:
-                        # note: self.collides is computed without holding the object.
-                        path, status = motion_planner.get_motion_plan(region, cached_collisions=self.collides)
-                    if status == 'HasSolution':
-                        self.reachable_regions_while_holding.append((obj, region_name))
+                    regions_to_plan_to.append((region_name, region))
+
+            # all regions are planned to from a single search tree rooted at the pick configuration
+            plans = motion_planner.get_motion_plans_to_goals([region for _, region in regions_to_plan_to],
+                                                             cached_collisions=collides)
+            plans_ignoring_collisions = None
+            for region_idx, (region_name, region) in enumerate(regions_to_plan_to):
+                path, status = plans[region_idx]
+                if status == 'HasSolution':
+                    self.reachable_regions_while_holding.append((obj, region_name))
+                else:
+                    # the path that ignores collisions only depends on the pick config of obj
+                    parent_state_has_cached_path_for_obj \
+                        = parent_state is not None and (obj, region_name) in parent_state.cached_place_paths \
+                          and obj != moved_obj
+                    cached_path_is_shortest_path = parent_state is not None and \
+                                                   not (obj, region_name) in parent_state.reachable_regions_while_holding
+                    if parent_state_has_cached_path_for_obj and cached_path_is_shortest_path:
+                        path = parent_state.cached_place_paths[(obj, region_name)]
                     else:
-                        if parent_state_has_cached_path_for_obj and cached_path_is_shortest_path:
-                            path = parent_state.cached_place_paths[(obj, region_name)]
-                        else:
-                            path, _ = motion_planner.get_motion_plan(region, cached_collisions={})
-                saver.Restore()
+                        if plans_ignoring_collisions is None:
+                            plans_ignoring_collisions = motion_planner.get_motion_plans_to_goals(
+                                [region for _, region in regions_to_plan_to], cached_collisions={})
+                        path, _ = plans_ignoring_collisions[region_idx]
                 # assert path is not None
                 self.cached_place_paths[(obj, region_name)] = path
+            saver.Restore()
+
+    def get_objs_in_collision_given_parent(self, path, parent_objs_in_collision, moved_obj, holding_obj=None):
+        # along a path that did not change, only the moved object can have entered or left the swept volume
+        objs_in_collision = [o for o in parent_objs_in_collision if o != moved_obj]
+        saver = CustomStateSaver(self.problem_env.env)
+        if holding_obj is not None:
+            self.pick_used[holding_obj].execute()
+        moved_obj_body = self.problem_env.env.GetKinBody(moved_obj)
+        if len(self.problem_env.get_objs_in_collision(path, 'entire_region', objs=[moved_obj_body])) > 0:
+            objs_in_collision.append(moved_obj)
+        saver.Restore()
+        return objs_in_collision
+
+    def reuse_objs_in_collision_along_parent_paths(self, parent_state, moved_obj):
+        # seeds the in-way predicates with the objects in collision along the paths that are shared with the parent
+        for b, path in self.cached_pick_paths.items():
+            parent_has_same_path = b in parent_state.cached_pick_paths and path is parent_state.cached_pick_paths[b]
+            if parent_has_same_path and b in parent_state.pick_in_way.mc_to_entity:
+                self.pick_in_way.mc_to_entity[b] = self.get_objs_in_collision_given_parent(
+                    path, parent_state.pick_in_way.mc_to_entity[b], moved_obj)
+                self.pick_in_way.mc_path_to_entity[b] = path
+
+        for (a, r), path in self.cached_place_paths.items():
+            parent_has_same_path = (a, r) in parent_state.cached_place_paths \
+                                   and path is parent_state.cached_place_paths[(a, r)]
+            if parent_has_same_path and (a, r) in parent_state.place_in_way.mc_to_entity:
+                self.place_in_way.mc_to_entity[(a, r)] = self.get_objs_in_collision_given_parent(
+                    path, parent_state.place_in_way.mc_to_entity[(a, r)], moved_obj, holding_obj=a)
+                self.place_in_way.mc_path_to_entity[(a, r)] = path
 
     def get_binary_edges(self):
         self.pick_in_way.set_pick_used(self.pick_used)
@@ -257,10 +344,17 @@ class ShortestPathPaPState(PaPState):
         ]
 
     def get_ternary_edge_features(self, a, b, r):
-        if (a, b, r) in self.parent_ternary_predicates:
+        key = (a, r)
+        is_reachability_unchanged = self.parent_state is not None and \
+                                    (key in self.reachable_regions_while_holding) == \
+                                    (key in self.parent_state.reachable_regions_while_holding)
+        is_place_path_unchanged = self.parent_state is not None and key in self.cached_place_paths and \
+                                  self.cached_place_paths[key] is self.parent_state.cached_place_paths.get(key)
+        if (a, b, r) in self.parent_ternary_predicates and is_reachability_unchanged and is_place_path_unchanged:
+            self.n_predicates_reused += 1
             return self.parent_ternary_predicates[(a, b, r)]
         else:
-            key = (a, r)
+            self.n_predicates_recomputed += 1
             if key in self.cached_place_paths:
                 cached_path = self.cached_place_paths[key]
             else:
@@ -281,18 +375,23 @@ class ShortestPathPaPState(PaPState):
         else:
             cached_path = self.cached_pick_paths[b]
 
-        """
-        if (a, b) in self.parent_binary_predicates:
-            # we can only do below if the robot configuration didn't change much
-            is_a_in_pick_path_of_b = self.parent_binary_predicates[(a, b)][1]
+        is_pick_path_unchanged = self.parent_state is not None and \
+                                 cached_path is self.parent_state.cached_pick_paths.get(b)
+        if (a, b) in self.parent_binary_predicates and is_pick_path_unchanged:
+            # neither a nor b moved, and the pick path to b is the one the parent evaluated
+            self.n_predicates_reused += 1
+            is_a_in_b, is_a_in_pick_path_of_b = self.parent_binary_predicates[(a, b)][0:2]
         else:
+            self.n_predicates_recomputed += 1
+            if (a, b) in self.parent_binary_predicates:
+                # in-region only depends on where a and b are
+                is_a_in_b = self.parent_binary_predicates[(a, b)][0]
+            else:
+                is_a_in_b = self.in_region(a, b)
             is_a_in_pick_path_of_b = self.pick_in_way(a, b, cached_path=cached_path)
-        """
-
-        is_a_in_pick_path_of_b = self.pick_in_way(a, b, cached_path=cached_path)
 
         return [
-            self.in_region(a, b),
+            is_a_in_b,
             is_a_in_pick_path_of_b,
             is_place_in_b_reachable_while_holding_a
         ]
@@ -5,6 +5,7 @@ from predicates.is_reachable import IsReachable
 from predicates.is_holding_goal_entity import IsHoldingGoalEntity
 from predicates.in_way import InWay
 from predicates.in_region import InRegion
+from planners.heuristics import compute_occlusion_closure
 
 import copy
 import pickle
@@ -135,6 +136,12 @@ class State(AbstractState):
                 src_dest_pairs_in_way_to_goal.append(src_dest_pair)
         return src_dest_pairs_in_way_to_goal
 
+    def get_occlusion_closure(self):
+        # the edges of a state do not change once it is constructed, so this is computed on first use and kept
+        if getattr(self, 'occlusion_closure', None) is None:
+            self.occlusion_closure = compute_occlusion_closure(self, self.problem_env)
+        return self.occlusion_closure
+
     def update_collisions_at_prm_vertices(self, parent_state):
         global prm_vertices
         global prm_edges
@@ -3,6 +3,7 @@ from gtamp_utils.utils import grab_obj, release_obj, set_robot_config, \
 
 from gtamp_utils import utils
 from gtamp_utils import utils
+from gtamp_utils.swept_footprint import BaseSweptFootprint
 from trajectory_representation.operator import Operator
 from openravepy import DOFAffine
 from manipulation.bodies.bodies import get_color, set_color
@@ -17,10 +18,12 @@ class SweptVolume:
             self.objects = []
             self.op_instances = []
             self.swept_volumes = []
+            self.footprints = {}
         else:
             self.objects = [o for o in parent_swept_volume.objects]
             self.op_instances = [o for o in parent_swept_volume.op_instances]
             self.swept_volumes = [v for v in parent_swept_volume.swept_volumes]
+            self.footprints = parent_swept_volume.footprints  # the volumes are shared with the parent
 
     def add_swept_volume(self, operator_instance):
         target_object = operator_instance.discrete_parameters['object']
@@ -38,11 +41,24 @@ class SweptVolume:
             self.robot.SetActiveDOFs(manip.GetArmIndices(), DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis, [0, 0, 1])
         assert len(config) == self.robot.GetActiveDOF(), 'Robot active dof should match the path'
 
+    def get_footprint(self, vol):
+        # footprints are keyed by the volume, and recomputed if the arms or the held object have changed
+        local_box = BaseSweptFootprint.compute_local_box(self.robot)
+        key = id(vol)
+        if key not in self.footprints or self.footprints[key][0] is not vol \
+                or not np.allclose(self.footprints[key][1].local_box, local_box):
+            self.footprints[key] = (vol, BaseSweptFootprint(self.robot, vol, local_box))
+        return self.footprints[key][1]
+
     def is_collision_in_single_volume(self, vol, obj):
         # this is asking if the new object placement will collide with previous swept volumes
         self.set_active_dofs_based_on_config_dim(vol[0])
         before = self.problem_env.robot.GetActiveDOFValues() # I guess this doesn't matter?
-        for config in vol:
+        if len(vol[0]) == 3:
+            may_collide = self.get_footprint(vol).get_configs_overlapping(obj)
+        else:
+            may_collide = [True] * len(vol)
+        for config in [config for config, config_may_collide in zip(vol, may_collide) if config_may_collide]:
             #set_robot_config(config, self.problem_env.robot)
             # todo I need to set it to the right configurations
             utils.set_active_config(config, self.robot)
@@ -73,6 +89,7 @@ class SweptVolume:
         self.objects = []
         self.op_instances = []
         self.swept_volumes = []
+        self.footprints = {}
 
 
 class PickSweptVolume(SweptVolume):